@@ -0,0 +1,178 @@
+import json, multiprocessing, statistics, threading, time, urllib.error, urllib.request
+from collections import Counter
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+# Names seeded users are drawn from, repeating like real ones so the planner sees realistic statistics
+FIRST_NAMES = [
+    'Maria', 'James', 'Anna', 'John', 'Sofia', 'David', 'Emma', 'Michael', 'Olivia', 'Daniel',
+    'Lucia', 'Thomas', 'Elena', 'Pierre', 'Yuki', 'Ahmed', 'Fatima', 'Ivan', 'Chen', 'Priya',
+]
+LAST_NAMES = [
+    'Garcia', 'Smith', 'Muller', 'Rossi', 'Novak', 'Kim', 'Nguyen', 'Silva', 'Kowalski', 'Dubois',
+    'Ivanov', 'Tanaka', 'Khan', 'Cohen', 'Jensen', 'Horvat', 'Popescu', 'Costa', 'Berg', 'Patel',
+]
+
+
+def percentiles(latencies: list) -> dict:
+    """Returns the p50, p95 and p99 of ``latencies``, given in seconds, in milliseconds."""
+    if len(latencies) < 2:
+        latency = latencies[0] * 1000 if latencies else 0.0
+        return {'p50': latency, 'p95': latency, 'p99': latency}
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {'p50': cuts[49] * 1000, 'p95': cuts[94] * 1000, 'p99': cuts[98] * 1000}
+
+
+def timed(function, repeat: int) -> list:
+    """Calls ``function`` ``repeat`` times and returns the duration of each call in seconds."""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def seed_users(total: int, batch_size: int = 10000) -> int:
+    """
+    Creates users until the table holds ``total``, for development
+    databases, then analyzes the table. Returns the number of users the
+    table was short of.
+    """
+    User = get_user_model()
+    existing = User.objects.count()
+    password = make_password(None)
+    for start in range(existing, total, batch_size):
+        User.objects.bulk_create(
+            (
+                User(
+                    email=f'seed{index}@example.com',
+                    first_name=FIRST_NAMES[index % len(FIRST_NAMES)],
+                    last_name=LAST_NAMES[index // len(FIRST_NAMES) % len(LAST_NAMES)],
+                    password=password,
+                )
+                for index in range(start, min(start + batch_size, total))
+            ),
+            ignore_conflicts=True,
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {User._meta.db_table}')
+    return max(total - existing, 0)
+
+
+def get_view(view, path: str, params: dict, user):
+    """Serves a GET of the ``view`` callable in process as ``user``, rendering the response like the server."""
+    host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+    request = APIRequestFactory().get(path, params, HTTP_HOST=host)
+    force_authenticate(request, user)
+    response = view(request)
+    response.render()
+    return response
+
+
+def in_processes(function, args: tuple, workers: int) -> list:
+    """
+    Runs ``function(*args)`` in ``workers`` forked processes at once, like
+    gunicorn workers sharing the configured cache and database, and returns
+    their results. Arguments are inherited through the fork, only the
+    results have to be picklable.
+    """
+    if workers == 1:
+        return [function(*args)]
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [context.Process(target=lambda: results.put(function(*args))) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return collected
+
+
+def request(url: str, method: str = 'GET', headers: dict = None, data: dict = None, timeout: float = 30) -> tuple:
+    """Sends one HTTP request and returns its status code and body, 0 if no response came."""
+    body = json.dumps(data).encode() if data is not None else None
+    headers = {'Content-Type': 'application/json', **(headers or {})} if body is not None else headers or {}
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, body, headers, method=method), timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except OSError:
+        return 0, b''
+
+
+class Load:
+    """
+    Sends requests from ``concurrency`` threads, each waiting for its
+    response before the next, for ``duration`` seconds or until ``stop``.
+    Status codes are counted and latencies recorded as they complete.
+    """
+
+    def __init__(self, url: str, concurrency: int, method: str = 'GET', headers: dict = None, data: dict = None):
+        self.url = url
+        self.concurrency = concurrency
+        self.method = method
+        self.headers = headers
+        self.data = data
+        self.statuses = Counter()
+        self.latencies = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.threads = []
+        self.elapsed = 0.0
+
+    def send(self):
+        while not self.stopped.is_set():
+            started = time.perf_counter()
+            status, _ = request(self.url, self.method, self.headers, self.data)
+            latency = time.perf_counter() - started
+            with self.lock:
+                self.statuses[status] += 1
+                self.latencies.append(latency)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.threads = [threading.Thread(target=self.send, daemon=True) for _ in range(self.concurrency)]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def run(self, duration: float):
+        self.start()
+        time.sleep(duration)
+        return self.stop()
+
+    @property
+    def throughput(self) -> float:
+        return len(self.latencies) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def errors(self) -> int:
+        return sum(count for status, count in self.statuses.items() if not 200 <= status < 300)
+
+
+def login(server: str, email: str, password: str):
+    """Returns an access token of the user from ``LoginAPIView``, or None if the login failed."""
+    status, body = request(f'{server}/api/v1/login', 'POST', data={'email': email, 'password': password})
+    return json.loads(body)['access'] if status == 200 else None
+
+
+def report(name: str, load: Load) -> str:
+    """Formats a row of the results of ``load`` below the ``REPORT_HEADER`` columns."""
+    cuts = percentiles(load.latencies)
+    return f"{name:<16} {load.throughput:>10.1f} {cuts['p50']:>9.1f} {cuts['p95']:>9.1f} {cuts['p99']:>9.1f} {load.errors:>7}"
+
+
+REPORT_HEADER = f"{'':<16} {'requests/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
@@ -0,0 +1,142 @@
+import logging, threading, time
+from queue import Empty
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from redis.exceptions import ConnectionError, TimeoutError
+from core import metrics
+
+logger = logging.getLogger()
+
+_missing = object()
+
+class InstrumentedCacheMixin:
+    """Reports the hits and misses of ``get`` and ``get_many`` to ``core.metrics``."""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version=version)
+        metrics.record_cache(value is not _missing, value is _missing)
+        return default if value is _missing else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = super().get_many(keys, version=version)
+        metrics.record_cache(len(values), len(keys) - len(values))
+        return values
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+class FallbackRedisCache(InstrumentedCacheMixin, RedisCache):
+    """
+    Redis cache backend that degrades to process-local memory while Redis is
+    unreachable.
+
+    After a connection error or timeout every call is served by a local
+    ``LocMemCache`` for ``FALLBACK_RETRY_INTERVAL`` seconds, then Redis is
+    tried again. Rate limits and cooldowns are per worker while degraded,
+    which is preferable to failing every request. Keys deleted meanwhile
+    are deleted from Redis before it serves anything again, so it does not
+    hand out the entries they invalidated.
+
+    A pool with every connection busy only sends the call at hand to the
+    local cache, Redis itself is still up.
+    """
+
+    def __init__(self, server, params):
+        options = dict(params.get('OPTIONS', {}))
+        self.retry_interval = float(options.pop('FALLBACK_RETRY_INTERVAL', 30))
+        super().__init__(server, {**params, 'OPTIONS': options})
+
+        fallback_params = {key: value for key, value in params.items() if key != 'OPTIONS'}
+        self._fallback = InstrumentedLocMemCache(f'fallback-{server}', fallback_params)
+        self._down_until = 0.0
+        # Keys deleted without reaching Redis, by version
+        self._deferred_deletes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def mark_unavailable(self, exc) -> None:
+        self._down_until = time.monotonic() + self.retry_interval
+        logger.warning("Redis cache unavailable, using local memory for %ss: %s", self.retry_interval, exc)
+
+    def connection_error(self, exc) -> None:
+        """Handles a connection error or timeout talking to Redis."""
+        # BlockingConnectionPool raises ConnectionError while handling queue.Empty when no connection frees up in time
+        if isinstance(exc, ConnectionError) and isinstance(exc.__context__, Empty):
+            logger.info("Redis connection pool exhausted, using local memory for this call")
+        else:
+            self.mark_unavailable(exc)
+
+    def defer_deletes(self, keys, version=None) -> None:
+        with self._lock:
+            self._deferred_deletes.setdefault(version, set()).update(keys)
+
+    def replay_deletes(self) -> None:
+        """Deletes from Redis the keys deleted while it could not be reached."""
+        if not self._deferred_deletes:
+            return
+        with self._lock:
+            deferred, self._deferred_deletes = self._deferred_deletes, {}
+        try:
+            for version, keys in deferred.items():
+                super().delete_many(list(keys), version=version)
+        except Exception:
+            for version, keys in deferred.items():
+                self.defer_deletes(keys, version)
+            raise
+
+    def get_client(self, key=None, *, write=False):
+        """Returns a pooled Redis client, or None while Redis is marked unavailable."""
+        if not self.available:
+            return None
+        return self._cache.get_client(key, write=write)
+
+    def _call(self, method, *args, deleted=(), **kwargs):
+        if self.available:
+            try:
+                self.replay_deletes()
+                return getattr(super(), method)(*args, **kwargs)
+            except (ConnectionError, TimeoutError) as exc:
+                self.connection_error(exc)
+        if deleted:
+            self.defer_deletes(deleted, kwargs.get('version'))
+        return getattr(self._fallback, method)(*args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        return self._call('add', *args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        return self._call('get', *args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        return self._call('set', *args, **kwargs)
+
+    def touch(self, *args, **kwargs):
+        return self._call('touch', *args, **kwargs)
+
+    def delete(self, key, version=None):
+        return self._call('delete', key, version=version, deleted=[key])
+
+    def get_many(self, *args, **kwargs):
+        # A single MGET round trip regardless of the number of keys
+        return self._call('get_many', *args, **kwargs)
+
+    def set_many(self, *args, **kwargs):
+        # MSET plus the expirations, sent as one pipeline
+        return self._call('set_many', *args, **kwargs)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        return self._call('delete_many', keys, version=version, deleted=keys)
+
+    def has_key(self, *args, **kwargs):
+        return self._call('has_key', *args, **kwargs)
+
+    def incr(self, *args, **kwargs):
+        return self._call('incr', *args, **kwargs)
+
+    def clear(self):
+        return self._call('clear')
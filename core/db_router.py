@@ -0,0 +1,143 @@
+import logging, os, random, threading, time
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger()
+
+# Seconds a replica may trail the primary before reads stop going to it
+REPLICA_MAX_LAG = float(os.getenv("DATABASE_REPLICA_MAX_LAG", 2))
+REPLICA_CHECK_INTERVAL = float(os.getenv("DATABASE_REPLICA_CHECK_INTERVAL", 5))
+# Seconds the reads of a user stay on the primary after they changed something
+REPLICA_STICKY_SECONDS = int(os.getenv("DATABASE_REPLICA_STICKY_SECONDS", 5))
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# A replica that replayed everything it received is current, however long ago
+# the last transaction was, but only while its WAL receiver is streaming: one
+# cut off from the primary has nothing left to receive either. Otherwise it is
+# as far behind as its last replay, NULL if it never replayed anything. The
+# status is only visible with pg_read_all_stats; the row alone shows the
+# receiver is running.
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+            AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE COALESCE(status, 'streaming') = 'streaming') THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+def sticky_key(user_id) -> str:
+    return f'db_sticky_{user_id}'
+
+
+class ReplicaMonitor:
+    """
+    Tracks which replicas are fit to serve reads. Each replica's lag is
+    measured at most every ``REPLICA_CHECK_INTERVAL`` seconds per worker,
+    by the request that needs it; a replica that lags more than
+    ``REPLICA_MAX_LAG`` seconds or cannot be reached is skipped until the
+    next check.
+    """
+
+    def __init__(self):
+        self.checked_at = {}
+        self.healthy = {}
+        self.lock = threading.Lock()
+
+    def pick(self) -> str:
+        replicas = [alias for alias in settings.DATABASE_REPLICAS if self.is_healthy(alias)]
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def is_healthy(self, alias: str) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            due = now - self.checked_at.get(alias, float('-inf')) >= REPLICA_CHECK_INTERVAL
+            if due:
+                self.checked_at[alias] = now
+        if due:
+            self.healthy[alias] = self.check(alias)
+        return self.healthy.get(alias, False)
+
+    def check(self, alias: str) -> bool:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except DatabaseError as e:
+            logger.warning("Replica %s is unreachable, reading from the primary: %s", alias, e)
+            return False
+        if lag is None:
+            logger.warning("Replica %s is not streaming and has replayed nothing yet, reading from the primary", alias)
+            return False
+        if lag > REPLICA_MAX_LAG:
+            logger.warning("Replica %s lags %.1fs behind the primary, reading from the primary", alias, lag)
+            return False
+        return True
+
+
+monitor = ReplicaMonitor()
+
+
+class ReadRouting:
+    """
+    Where the reads of the request being served go, reached through
+    ``current``. The choice is made lazily, on the first query issued once
+    the user is authenticated, so a user who recently wrote keeps reading
+    from the primary.
+    """
+    __slots__ = ('request', 'enabled', 'sticky', 'replica')
+
+    def __init__(self, request):
+        self.request = request
+        self.enabled = request.method in SAFE_METHODS
+        self.sticky = None
+        self.replica = None
+
+    def alias(self) -> str:
+        if not self.enabled or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if self.sticky is None:
+            # request.user is the anonymous user until DRF authenticated the request
+            user = getattr(self.request, 'user', None)
+            if user is not None and user.is_authenticated:
+                self.sticky = bool(cache.get(sticky_key(user.pk)))
+        if self.sticky:
+            return DEFAULT_DB_ALIAS
+        if self.replica is None:
+            self.replica = monitor.pick()
+        return self.replica
+
+
+current = ContextVar('read_routing', default=None)
+
+
+def mark_sticky(user_id) -> None:
+    """Sends the reads of ``user_id`` to the primary until replicas caught up with their write."""
+    cache.set(sticky_key(user_id), True, REPLICA_STICKY_SECONDS)
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of safe requests to a replica and everything else to
+    the primary. Reads outside a request, such as management commands,
+    stay on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = current.get()
+        return routing.alias() if routing is not None else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Explicit, otherwise saving an instance read from a replica would write to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
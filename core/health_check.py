@@ -2,42 +2,178 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.db import connections
-from django.db.utils import OperationalError
-import psutil
-from datetime import datetime
+from django.http import HttpResponse
+from django.db.utils import DatabaseError
+from collections import deque
+from datetime import datetime, timezone
+import hmac, logging, os, psutil, threading, time
+from core import metrics
+
+logger = logging.getLogger()
+
+SAMPLE_INTERVAL = float(os.getenv("HEALTH_SAMPLE_INTERVAL", 5))
+SAMPLE_HISTORY = int(os.getenv("HEALTH_SAMPLE_HISTORY", 60))
+# Bearer token the scraper must send to read the metrics, public when unset
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+class HealthSampler:
+    """
+    Samples CPU, memory, database latency and the request rate of the
+    current worker on a background thread.
+
+    Readings are kept in a ring buffer of the last ``SAMPLE_HISTORY``
+    samples, so the health endpoints only read memory and never block on
+    psutil or Postgres themselves.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, history: int = SAMPLE_HISTORY):
+        self.interval = interval
+        self.samples = deque(maxlen=history)
+        self.requests = 0
+        self.process = psutil.Process()
+        self.pid = None
+        self.started_at = None
+        self.lock = threading.Lock()
+
+    def start(self) -> None:
+        # Threads do not survive a fork, so every worker starts its own sampler
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.started_at = time.time()
+            self.requests = 0
+            self.samples.clear()
+            threading.Thread(target=self.run, name='health-sampler', daemon=True).start()
+
+    def count_request(self) -> None:
+        with self.lock:
+            self.requests += 1
+
+    def run(self) -> None:
+        # The first call only sets the baseline cpu_percent measures against
+        psutil.cpu_percent(interval=None)
+        self.process.cpu_percent(interval=None)
+        while True:
+            try:
+                self.samples.append(self.sample())
+            except Exception as e:
+                logger.exception("Health sampling failed: %s", e)
+            time.sleep(self.interval)
+
+    def sample(self) -> dict:
+        request_total = self.requests
+        previous = self.samples[-1] if self.samples else None
+        now = time.time()
+        memory = psutil.virtual_memory()
+        return {
+            'time': now,
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'memory_total': memory.total,
+            'memory_available': memory.available,
+            'memory_percent': memory.percent,
+            'worker_cpu_percent': self.process.cpu_percent(interval=None),
+            'worker_memory': self.process.memory_info().rss,
+            'requests': request_total,
+            'request_rate': (request_total - previous['requests']) / (now - previous['time']) if previous else 0.0,
+            'database': self.check_database(),
+        }
+
+    def check_database(self) -> dict:
+        # This thread has its own connection, reused between samples unless pooled
+        connection = connections['default']
+        started = time.perf_counter()
+        try:
+            connection.close_if_unusable_or_obsolete()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            latency = time.perf_counter() - started
+            # Hands a pooled connection back, keeps a persistent one
+            connection.close_if_unusable_or_obsolete()
+            return {'connected': True, 'latency_ms': round(latency * 1000, 2)}
+        except DatabaseError as e:
+            connection.close()
+            return {'connected': False, 'error': str(e).strip()}
+
+    def latest(self):
+        return self.samples[-1] if self.samples else None
+
+    def is_stale(self, sample) -> bool:
+        return time.time() - sample['time'] > self.interval * 3
+
+sampler = HealthSampler()
+
+class LiveView(APIView):
+    authentication_classes = []
+    throttle_classes = []
+
+    def get(self, request):
+        return Response({'status': 'alive'}, status=status.HTTP_200_OK)
+
+class ReadyView(APIView):
+    authentication_classes = []
+    throttle_classes = []
+
+    def get(self, request):
+        sample = sampler.latest()
+        if sample is None:
+            return Response({'status': 'starting'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if sampler.is_stale(sample) or not sample['database']['connected']:
+            return Response({'status': 'unready'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({'status': 'ready'}, status=status.HTTP_200_OK)
 
 class HealthCheckView(APIView):
+    authentication_classes = []
+    throttle_classes = []
+
     def get(self, request):
+        sample = sampler.latest()
+        if sample is None:
+            return Response({'status': 'starting'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
         health_status = {
             'status': 'healthy',
-            'timestamp': datetime.now(),
-            'database': self.check_database(),
-            'memory_usage': self.get_memory_usage(),
-            'cpu_usage': self.get_cpu_usage(),
+            'timestamp': datetime.fromtimestamp(sample['time'], tz=timezone.utc),
+            'database': self.get_database(sample),
+            'memory_usage': self.get_memory_usage(sample),
+            'cpu_usage': f"{sample['cpu_percent']}%",
+            'worker': self.get_worker(sample),
         }
-        if not all(health_status.values()):
+        if sampler.is_stale(sample) or not sample['database']['connected']:
             health_status['status'] = 'unhealthy'
             return Response(health_status, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         return Response(health_status, status=status.HTTP_200_OK)
 
-    def check_database(self):
-        try:
-            connections['default'].cursor()
-            return True
-        except OperationalError:
-            return False
+    def get_database(self, sample):
+        latencies = [sample['database']['latency_ms'] for sample in sampler.samples if sample['database']['connected']]
+        return {
+            **sample['database'],
+            'average_latency_ms': round(sum(latencies) / len(latencies), 2) if latencies else None,
+            'max_latency_ms': max(latencies, default=None),
+        }
 
-    def get_memory_usage(self):
-        memory = psutil.virtual_memory()
+    def get_memory_usage(self, sample):
         return {
-            'total': self.format_bytes(memory.total),
-            'available': self.format_bytes(memory.available),
-            'percent': f"{memory.percent}%",
-            'limit': self.format_bytes(psutil.virtual_memory().total)
+            'total': self.format_bytes(sample['memory_total']),
+            'available': self.format_bytes(sample['memory_available']),
+            'percent': f"{sample['memory_percent']}%",
+            'limit': self.format_bytes(sample['memory_total'])
         }
 
-    def get_cpu_usage(self):
-        return f"{psutil.cpu_percent(interval=1)}%"
+    def get_worker(self, sample):
+        samples = list(sampler.samples)
+        window = samples[-1]['time'] - samples[0]['time']
+        return {
+            'pid': sampler.pid,
+            'uptime': round(time.time() - sampler.started_at),
+            'cpu_percent': sample['worker_cpu_percent'],
+            'memory': self.format_bytes(sample['worker_memory']),
+            'requests': sample['requests'],
+            'request_rate': round(sample['request_rate'], 2),
+            'average_request_rate': round((samples[-1]['requests'] - samples[0]['requests']) / window, 2) if window else None,
+        }
 
     def format_bytes(self, bytes):
         for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
@@ -45,3 +181,17 @@ class HealthCheckView(APIView):
                 return f"{bytes:.2f} {unit}"
             bytes /= 1024
         return f"{bytes:.2f} PB"
+
+class MetricsView(APIView):
+    """
+    Prometheus text exposition of the metrics of the worker that serves the
+    scrape; every gunicorn worker keeps its own. Requires
+    ``Authorization: Bearer <METRICS_TOKEN>`` when ``METRICS_TOKEN`` is set.
+    """
+    authentication_classes = []
+    throttle_classes = []
+
+    def get(self, request):
+        if METRICS_TOKEN and not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {METRICS_TOKEN}'.encode()):
+            return Response({"detail": "Invalid metrics token."}, status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,145 @@
+import copy, json, logging, os, queue, threading
+from datetime import date, datetime, timedelta, timezone
+from logging.handlers import QueueHandler
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including `extra` fields."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class AsyncDailyFileHandler(QueueHandler):
+    """
+    Logging handler that never touches the disk on the calling thread.
+
+    Records are put on a bounded in-memory queue; a writer thread formats
+    them and appends them in batches to ``<directory>/<date>.log``, moving
+    to a new file when the date changes and deleting files older than
+    ``retention_days``. Files are only ever appended to, never renamed, so
+    every gunicorn worker can share the directory. When the queue is full
+    records are dropped rather than blocking the request.
+    """
+
+    def __init__(self, directory, retention_days=14, batch_size=500, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.directory = directory
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.stream = None
+        self.stream_date = None
+        self.thread = None
+        self.pid = None
+        os.makedirs(directory, exist_ok=True)
+
+    def prepare(self, record):
+        # Arguments and tracebacks are rendered now, while they are still valid
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record):
+        # The writer thread does not survive a fork, each worker starts its own
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.thread = threading.Thread(target=self.run, name='log-writer', daemon=True)
+                    self.thread.start()
+                    self.pid = os.getpid()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            self.write([record for record in batch if record is not None])
+            if stop:
+                return
+
+    def write(self, records):
+        lines = {}
+        for record in records:
+            try:
+                day = date.fromtimestamp(record.created)
+                lines.setdefault(day, []).append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            lines.setdefault(date.today(), []).append(json.dumps({
+                'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+                'level': 'WARNING',
+                'message': f"Log queue full, dropped {dropped} records",
+            }))
+        for day, day_lines in sorted(lines.items()):
+            try:
+                self.get_stream(day).write('\n'.join(day_lines) + '\n')
+                self.stream.flush()
+            except OSError:
+                if records:
+                    self.handleError(records[0])
+
+    def get_stream(self, day):
+        if self.stream_date != day:
+            if self.stream is not None:
+                self.stream.close()
+            self.stream = open(os.path.join(self.directory, f'{day}.log'), 'a', encoding='utf-8')
+            self.stream_date = day
+            self.remove_expired(day)
+        return self.stream
+
+    def remove_expired(self, today):
+        oldest = today - timedelta(days=self.retention_days)
+        for name in os.listdir(self.directory):
+            try:
+                expired = date.fromisoformat(name.removesuffix('.log')) < oldest
+            except ValueError:
+                continue
+            if expired:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        # Flush what is queued before the interpreter exits
+        if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=5)
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        super().close()
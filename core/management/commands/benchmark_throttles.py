@@ -0,0 +1,91 @@
+import time, uuid
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.throttling import ScopedRateThrottle
+from core.benchmark import in_processes
+from core.throttling import GCRAThrottle
+from friends.views import bulk_limit, cooldown_key
+
+
+def check_throttle(throttle_class, scope, rate, clients, count):
+    view = type('BenchmarkView', (), {'throttle_scope': scope})()
+    throttle = throttle_class()
+    throttle.THROTTLE_RATES = {scope: rate}
+    allowed = 0
+    started = time.perf_counter()
+    for index in range(count):
+        allowed += throttle.allow_request(clients[index % len(clients)], view)
+    return time.perf_counter() - started, allowed
+
+
+def check_cooldowns(batches, count):
+    # Single keys are looked up like FriendRequestAPIView, batches like BulkFriendRequestAPIView
+    hits = 0
+    started = time.perf_counter()
+    for index in range(count):
+        keys = batches[index % len(batches)]
+        if len(keys) == 1:
+            hits += cache.get(keys[0]) is not None
+        else:
+            hits += len(cache.get_many(keys))
+    return time.perf_counter() - started, hits
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the checks per second of GCRAThrottle against DRF's ScopedRateThrottle, and of the "
+        "friend request cooldown lookups, on the configured cache"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help="Checks per throttle and scenario")
+        parser.add_argument('--clients', type=int, default=1000, help="Distinct IP addresses of the under-limit scenario")
+        parser.add_argument('--rate', default='1000/minute', help="Rate of the benchmarked scope")
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help="Processes checking at once, like gunicorn workers; a shared cache allows the rate once across all of them",
+        )
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        requests = []
+        for index in range(options['clients']):
+            request = Request(factory.get('/', REMOTE_ADDR=f'10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}'))
+            request.user = AnonymousUser()
+            requests.append(request)
+        scenarios = [
+            # Many clients each well under their limit, the common case
+            ('under limit', requests),
+            # One client over its limit, whose history is as long as the rate allows
+            ('over limit', requests[:1]),
+        ]
+        workers = options['workers']
+        count = options['requests'] // workers
+
+        self.stdout.write(f"{'throttle':<20} {'scenario':<12} {'checks/s':>10} {'allowed':>8}")
+        for throttle_class in (ScopedRateThrottle, GCRAThrottle):
+            for name, clients in scenarios:
+                rate, allowed = self.run(throttle_class, clients, options['rate'], count, workers)
+                self.stdout.write(f"{throttle_class.__name__:<20} {name:<12} {rate:>10.0f} {allowed:>8}")
+
+        # Half of the pairs are on cooldown, as after a wave of rejections
+        keys = [cooldown_key(0, receiver_id) for receiver_id in range(options['clients'])]
+        cache.set_many(dict.fromkeys(keys[::2], True), 300)
+        self.stdout.write(f"\n{'cooldown lookup':<20} {'keys':>12} {'checks/s':>10} {'hits':>8}")
+        for size in (1, bulk_limit()):
+            batches = [keys[start:start + size] for start in range(0, len(keys), size)]
+            results = in_processes(check_cooldowns, (batches, count), workers)
+            rate = count * workers / max(elapsed for elapsed, _ in results)
+            self.stdout.write(f"{'cache.get' if size == 1 else 'cache.get_many':<20} {size:>12} {rate:>10.0f} {sum(hits for _, hits in results):>8}")
+        cache.delete_many(keys)
+
+    def run(self, throttle_class, clients, rate, count, workers):
+        scope = f'benchmark_{uuid.uuid4().hex}'
+        throttle = throttle_class()
+        throttle.THROTTLE_RATES = {scope: rate}
+        results = in_processes(check_throttle, (throttle_class, scope, rate, clients, count), workers)
+        cache.delete_many([throttle.cache_format % {'scope': scope, 'ident': throttle.get_ident(request)} for request in clients])
+        return count * workers / max(elapsed for elapsed, _ in results), sum(allowed for _, allowed in results)
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from core.benchmark import REPORT_HEADER, Load, login, report, request
+
+
+class Command(BaseCommand):
+    help = (
+        "Load tests an endpoint of a running server, reporting requests/s and latency percentiles at each "
+        "concurrency. Run it once per server setup to compare them, such as sync workers against uvicorn "
+        "workers with ASYNC_VIEWS=True at I/O-bound concurrency, or DATABASE_CONN_MAX_AGE=0 against persistent "
+        "or pooled connections with the same GUNICORN_WORKERS"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', default='http://localhost:8000', help="Base URL of the server")
+        parser.add_argument('--path', default='/api/v1/friends', help="Endpoint requested with GET")
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 64], help="Clients sending requests at once")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds spent at each concurrency")
+        parser.add_argument('--email', help="User to log in as")
+        parser.add_argument('--password', help="Password of --email")
+        parser.add_argument('--token', help="Access token to use instead of logging in")
+        parser.add_argument(
+            '--count-connections', action='store_true',
+            help="Also report the connections open on the configured database after each concurrency, which pooling keeps bounded",
+        )
+
+    def handle(self, *args, **options):
+        server = options['server'].rstrip('/')
+        token = options['token']
+        if token is None and options['email']:
+            token = login(server, options['email'], options['password'] or '')
+            if token is None:
+                raise CommandError(f"Could not log in as {options['email']}.")
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+
+        url = server + options['path']
+        status, _ = request(url, headers=headers)
+        if status != 200:
+            raise CommandError(f"GET {url} answered {status or 'nothing'}, expected 200.")
+
+        header = REPORT_HEADER.replace(' ' * 16, f"{'concurrency':<16}", 1)
+        self.stdout.write(header + (f" {'connections':>11}" if options['count_connections'] else ''))
+        for concurrency in options['concurrency']:
+            row = report(str(concurrency), Load(url, concurrency, headers=headers).run(options['duration']))
+            if options['count_connections']:
+                row += f" {self.connections_open():>11}"
+            self.stdout.write(row)
+
+    def connections_open(self) -> int:
+        # Counted before the server closes idle ones, leaving out this command's own
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND pid <> pg_backend_pid()")
+            return cursor.fetchone()[0]
@@ -0,0 +1,190 @@
+import logging, os, threading, time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+# Seconds collected gauges are served from memory before collectors run again
+COLLECT_INTERVAL = float(os.getenv("METRICS_COLLECT_INTERVAL", 15))
+
+logger = logging.getLogger()
+
+
+class RequestMetrics:
+    """Counters of the request being served, reached through ``current``."""
+    __slots__ = ('queries', 'db_time', 'cache_hits', 'cache_misses', 'render_started', 'render_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.render_started = None
+        self.render_time = 0.0
+
+
+# Context variables follow a request into sync_to_async threads, so async
+# views are measured the same way as sync ones
+current = ContextVar('request_metrics', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """``connection.execute_wrapper`` hook timing every query of a measured request."""
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def record_cache(hits: int, misses: int) -> None:
+    metrics = current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+class Histogram:
+    """Cumulative Prometheus histogram kept in the memory of the worker."""
+
+    def __init__(self, name: str, documentation: str, labels: tuple, buckets: tuple):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.series.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self.series[labels] = (counts, total + value)
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self.series.items()]
+        for labels, counts, total in sorted(series):
+            label_text = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: int = 1) -> None:
+        if amount:
+            with self.lock:
+                self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self.lock:
+            series = sorted(self.series.items())
+        for labels, value in series:
+            label_text = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, labels))
+            lines.append(f'{self.name}{{{label_text}}} {value}')
+        return lines
+
+
+class Gauge:
+    """Gauge whose series are replaced as a whole, typically by a collector."""
+
+    def __init__(self, name: str, documentation: str, labels: tuple):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def replace(self, series: dict) -> None:
+        with self.lock:
+            self.series = dict(series)
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        with self.lock:
+            series = sorted(self.series.items())
+        for labels, value in series:
+            label_text = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, labels))
+            lines.append(f'{self.name}{{{label_text}}} {value}' if label_text else f'{self.name} {value}')
+        return lines
+
+
+request_duration = Histogram('http_request_duration_seconds', 'Time spent serving the request.', ('view', 'method', 'status'), DURATION_BUCKETS)
+request_queries = Histogram('http_request_queries', 'SQL queries issued by the request.', ('view', 'method'), QUERY_BUCKETS)
+request_db_time = Histogram('http_request_db_seconds', 'Time spent waiting on SQL queries.', ('view', 'method'), DURATION_BUCKETS)
+request_render_time = Histogram('http_response_render_seconds', 'Time spent rendering the response body.', ('view', 'method'), DURATION_BUCKETS)
+cache_requests = Counter('cache_requests_total', 'Cache lookups by result.', ('view', 'result'))
+
+REGISTRY = [request_duration, request_queries, request_db_time, request_render_time, cache_requests]
+
+# Callables refreshing gauges of the registry right before it is rendered,
+# at most every COLLECT_INTERVAL seconds per worker however often it is scraped
+COLLECTORS = []
+collected_at = float('-inf')
+collect_lock = threading.Lock()
+
+
+def register(*metrics, collector=None) -> None:
+    REGISTRY.extend(metrics)
+    if collector is not None:
+        COLLECTORS.append(collector)
+
+
+def collect() -> None:
+    global collected_at
+    now = time.monotonic()
+    with collect_lock:
+        if now - collected_at < COLLECT_INTERVAL:
+            return
+        collected_at = now
+    for collector in COLLECTORS:
+        try:
+            collector()
+        except Exception as e:
+            # The previous readings are served rather than failing the scrape
+            logger.warning("Collecting metrics with %s failed: %s", collector.__qualname__, e)
+
+
+def render() -> str:
+    collect()
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+def observe(view: str, method: str, status: int, duration: float, metrics: RequestMetrics) -> None:
+    request_duration.observe((view, method, str(status)), duration)
+    request_queries.observe((view, method), metrics.queries)
+    request_db_time.observe((view, method), metrics.db_time)
+    request_render_time.observe((view, method), metrics.render_time)
+    cache_requests.inc((view, 'hit'), metrics.cache_hits)
+    cache_requests.inc((view, 'miss'), metrics.cache_misses)
+
+
+def server_timing(duration: float, metrics: RequestMetrics) -> str:
+    return ', '.join([
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+        f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"',
+        f'render;dur={metrics.render_time * 1000:.1f}',
+        f'total;dur={duration * 1000:.1f}',
+    ])
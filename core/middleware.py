@@ -0,0 +1,153 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from core import db_router, metrics
+from core.health_check import sampler
+
+class HealthSamplerMiddleware:
+    """
+    Counts the requests the worker serves, so the health endpoints can
+    report a per-worker request rate. Gunicorn workers start the health
+    sampler as they boot (gunicorn.conf.py); under other servers it starts
+    with the first request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        self.count(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self.count(request)
+        return await self.get_response(request)
+
+    def count(self, request):
+        # A no-op once started, rather than at import so it runs in the worker process, after the fork
+        sampler.start()
+        sampler.count_request()
+
+def instrument_connection(sender, connection, **kwargs):
+    if metrics.record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.record_query)
+
+class MetricsMiddleware:
+    """
+    Measures every request: SQL query count and time through an
+    ``execute_wrapper`` installed on each database connection, cache hits
+    and misses, response rendering time and the total duration.
+
+    The figures are returned in a ``Server-Timing`` header and recorded in
+    the histograms served by ``/metrics``, labelled by URL name.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        connection_created.connect(instrument_connection, dispatch_uid='metrics_instrument_connection')
+        for connection in connections.all(initialized_only=True):
+            instrument_connection(None, connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.current.set(request_metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, request_metrics, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.current.set(request_metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, request_metrics, time.perf_counter() - started)
+
+    def process_template_response(self, request, response):
+        # Called right before DRF renders the response body
+        request_metrics = metrics.current.get()
+        if request_metrics is not None:
+            request_metrics.render_started = time.perf_counter()
+        return response
+
+    def finish(self, request, response, request_metrics, duration):
+        if request_metrics.render_started is not None:
+            request_metrics.render_time = time.perf_counter() - request_metrics.render_started
+        match = request.resolver_match
+        view = (match.view_name or match.route) if match else 'unmatched'
+        metrics.observe(view, request.method, response.status_code, duration, request_metrics)
+        response['Server-Timing'] = metrics.server_timing(duration, request_metrics)
+        return response
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets ``ReplicaRouter`` send the reads of GET, HEAD and OPTIONS requests
+    to a replica. Views that write on a safe method opt out with
+    ``replica_reads = False``. After a successful write the user's reads
+    stick to the primary for ``DATABASE_REPLICA_STICKY_SECONDS``, so they
+    see their own changes.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        routing = db_router.ReadRouting(request)
+        token = db_router.current.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.current.reset(token)
+        return self.finish(request, response, routing)
+
+    async def __acall__(self, request):
+        routing = db_router.ReadRouting(request)
+        token = db_router.current.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_router.current.reset(token)
+        return self.finish(request, response, routing)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = db_router.current.get()
+        if routing is not None and not getattr(getattr(view_func, 'view_class', None), 'replica_reads', True):
+            routing.enabled = False
+        return None
+
+    def finish(self, request, response, routing):
+        user = getattr(request, 'user', None)
+        if not routing.enabled and response.status_code < 400 and user is not None and user.is_authenticated:
+            db_router.mark_sticky(user.pk)
+        return response
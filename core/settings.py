@@ -1,6 +1,7 @@
 import json, os
 from pathlib import Path
-from datetime import timedelta, datetime
+from urllib.parse import quote
+from datetime import timedelta
 from utils.env import unsafe_get_env
 
 # Setup environment variables
@@ -24,14 +25,19 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
 
+    'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'friends.apps.FriendsConfig',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.HealthSamplerMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,8 +67,21 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'core.wsgi.application'
 
+# Serve the hot read endpoints with native async views, only useful under ASGI workers
+ASYNC_VIEWS = (os.getenv("ASYNC_VIEWS") == 'True')
+
+
+# Served by uvicorn workers (see gunicorn.conf.py), or by async views which need them
+SERVES_ASGI = ASYNC_VIEWS or os.getenv("GUNICORN_WORKER_CLASS", "sync").startswith('uvicorn')
+
 
 # Database
+# "persistent" keeps one health-checked connection per worker thread for
+# DATABASE_CONN_MAX_AGE seconds, "pool" shares a psycopg connection pool
+# between the threads of a worker and "pgbouncer" suits PgBouncer in
+# transaction pooling mode
+DATABASE_CONNECTION_MODE = os.getenv("DATABASE_CONNECTION_MODE", "pool" if SERVES_ASGI else "persistent")
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -71,9 +90,99 @@ DATABASES = {
         'PASSWORD': unsafe_get_env("POSTGRES_PASSWORD"),
         'HOST': unsafe_get_env("POSTGRES_HOST"),
         'PORT': unsafe_get_env("POSTGRES_PORT"),
+        'CONN_MAX_AGE': int(os.getenv("DATABASE_CONN_MAX_AGE", 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # psycopg prepares a statement once it ran this many times on a
+            # connection, so the repeated friend queries skip parsing and planning
+            'prepare_threshold': int(os.getenv("DATABASE_PREPARE_THRESHOLD", 5)),
+        },
     }
 }
 
+if DATABASE_CONNECTION_MODE == 'pool':
+    # Pooled connections are returned after each request instead of kept
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv("DATABASE_POOL_MIN_SIZE", 2)),
+        'max_size': int(os.getenv("DATABASE_POOL_MAX_SIZE", 10)),
+        # Seconds a request waits for a free connection before failing
+        'timeout': float(os.getenv("DATABASE_POOL_TIMEOUT", 10)),
+    }
+elif DATABASE_CONNECTION_MODE == 'persistent' and SERVES_ASGI:
+    # Under ASGI each request runs its queries on an executor thread of its
+    # own, so connections kept per thread are never reused and pile up
+    # until POSTGRES_MAX_CONNECTIONS; they are closed after each request
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+elif DATABASE_CONNECTION_MODE == 'pgbouncer':
+    # Transaction pooling hands every transaction a different server connection,
+    # so nothing may outlive a transaction: no server-side cursors, and no
+    # prepared statements unless PgBouncer tracks them (max_prepared_statements)
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+    if os.getenv("PGBOUNCER_PREPARED_STATEMENTS") != 'True':
+        DATABASES['default']['OPTIONS']['prepare_threshold'] = None
+
+# Streaming replicas as comma separated host[:port], safe requests read from
+# them and everything else goes to the primary (see core.db_router)
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.getenv("POSTGRES_REPLICA_HOSTS", "").split(',')), start=1):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter'] if DATABASE_REPLICAS else []
+
+
+# Cache
+# Shared by every worker so throttles and friend request cooldowns hold across processes and hosts
+REDIS_HOST = os.getenv("REDIS_HOST")
+if REDIS_HOST:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.FallbackRedisCache',
+            'LOCATION': 'redis://:{password}@{host}:{port}/{db}'.format(
+                password=quote(os.getenv("REDIS_PASSWORD", ""), safe=""),
+                host=REDIS_HOST,
+                port=os.getenv("REDIS_PORT", 6379),
+                db=os.getenv("REDIS_DB", 0),
+            ),
+            'KEY_PREFIX': os.getenv("CACHE_KEY_PREFIX", "social-network"),
+            'OPTIONS': {
+                'pool_class': 'redis.BlockingConnectionPool',
+                'max_connections': int(os.getenv("REDIS_POOL_SIZE", 20)),
+                # Seconds a request waits for a free pooled connection
+                'timeout': float(os.getenv("REDIS_POOL_TIMEOUT", 0.5)),
+                'socket_timeout': float(os.getenv("REDIS_SOCKET_TIMEOUT", 0.25)),
+                'socket_connect_timeout': float(os.getenv("REDIS_CONNECT_TIMEOUT", 0.25)),
+                'health_check_interval': 30,
+                'FALLBACK_RETRY_INTERVAL': float(os.getenv("REDIS_FALLBACK_RETRY_INTERVAL", 30)),
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.InstrumentedLocMemCache',
+        }
+    }
+
+
+# Password hashing, PBKDF2 iterations are set by PASSWORD_HASHING_ITERATIONS
+# https://docs.djangoproject.com/en/5.1/topics/auth/passwords/
+
+PASSWORD_HASHERS = [
+    'users.hashing.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -119,6 +228,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom Settings 
 AUTH_USER_MODEL = "users.AppUser"
 # APPEND_SLASH=False
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -131,19 +242,22 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'core.log.JSONFormatter',
+        },
     },
     'handlers': {
         'file': {
-            'level': 'DEBUG',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', f'{datetime.now().date()}.log'),
-            'formatter': 'verbose',
+            'class': 'core.log.AsyncDailyFileHandler',
+            'directory': os.path.join(BASE_DIR, 'logs'),
+            'retention_days': int(os.getenv("LOG_RETENTION_DAYS", 14)),
+            'formatter': 'json',
         },
     },
     'loggers': {
         '': {
             'handlers': ['file'],
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'propagate': True,
         },
     },
@@ -152,14 +266,20 @@ LOGGING = {
 # DRF Configs
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': [
+        'utils.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.ScopedRateThrottle',
+        'core.throttling.GCRAThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'auth': unsafe_get_env("AUTH_RATELIMIT"),
-        'friend_request': unsafe_get_env("FRIEND_REQUEST_RATELIMIT")
+        'friend_request': unsafe_get_env("FRIEND_REQUEST_RATELIMIT"),
+        # Optional, also limits authenticated users per IP address
+        'friend_request_ip': os.getenv("FRIEND_REQUEST_IP_RATELIMIT"),
     }
 }
 
@@ -0,0 +1,331 @@
+from queue import Empty
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.contrib.auth.models import AnonymousUser
+from django.urls import reverse
+from redis.exceptions import ConnectionError
+from rest_framework.request import Request
+
+from core import db_router, health_check, metrics
+from core.cache import FallbackRedisCache
+from core.throttling import GCRAThrottle, LocalLimiter, parse_limit
+from core.middleware import ReplicaRoutingMiddleware
+
+REPLICA = 'replica_1'
+
+
+def authenticated(pk: int = 1):
+    return SimpleNamespace(pk=pk, is_authenticated=True)
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRouterTests(SimpleTestCase):
+    """Routing decisions only, no query reaches a database."""
+
+    def setUp(self):
+        cache.clear()
+        self.router = db_router.ReplicaRouter()
+        self.factory = RequestFactory()
+        patcher = mock.patch.object(db_router.monitor, 'is_healthy', return_value=True)
+        self.is_healthy = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def read_alias(self, request):
+        token = db_router.current.set(db_router.ReadRouting(request))
+        try:
+            return self.router.db_for_read(None)
+        finally:
+            db_router.current.reset(token)
+
+    def test_reads_outside_a_request_go_to_the_primary(self):
+        self.assertEqual(self.router.db_for_read(None), DEFAULT_DB_ALIAS)
+
+    def test_safe_request_reads_from_a_replica(self):
+        self.assertEqual(self.read_alias(self.factory.get('/')), REPLICA)
+
+    def test_unsafe_request_reads_from_the_primary(self):
+        self.assertEqual(self.read_alias(self.factory.post('/')), DEFAULT_DB_ALIAS)
+
+    def test_writes_go_to_the_primary(self):
+        token = db_router.current.set(db_router.ReadRouting(self.factory.get('/')))
+        try:
+            self.assertEqual(self.router.db_for_write(None), DEFAULT_DB_ALIAS)
+        finally:
+            db_router.current.reset(token)
+
+    def test_unhealthy_replica_is_skipped(self):
+        self.is_healthy.return_value = False
+        self.assertEqual(self.read_alias(self.factory.get('/')), DEFAULT_DB_ALIAS)
+
+    def test_reads_in_a_transaction_go_to_the_primary(self):
+        with mock.patch.object(db_router.connections[DEFAULT_DB_ALIAS], 'in_atomic_block', True):
+            self.assertEqual(self.read_alias(self.factory.get('/')), DEFAULT_DB_ALIAS)
+
+    def test_user_who_wrote_reads_from_the_primary(self):
+        request = self.factory.get('/')
+        request.user = authenticated()
+        db_router.mark_sticky(request.user.pk)
+        self.assertEqual(self.read_alias(request), DEFAULT_DB_ALIAS)
+
+        other = self.factory.get('/')
+        other.user = authenticated(2)
+        self.assertEqual(self.read_alias(other), REPLICA)
+
+    def test_stickiness_is_decided_once_authenticated(self):
+        request = self.factory.get('/')
+        routing = db_router.ReadRouting(request)
+        self.assertEqual(routing.alias(), REPLICA)
+        db_router.mark_sticky(1)
+        request.user = authenticated()
+        self.assertEqual(routing.alias(), DEFAULT_DB_ALIAS)
+
+    def test_only_the_primary_is_migrated(self):
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'friends'))
+        self.assertFalse(self.router.allow_migrate(REPLICA, 'friends'))
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def serve(self, request, status=200, replica_reads=True):
+        middleware = ReplicaRoutingMiddleware(HttpResponse)
+        view = mock.Mock(view_class=type('View', (), {'replica_reads': replica_reads}))
+        token = db_router.current.set(db_router.ReadRouting(request))
+        try:
+            middleware.process_view(request, view, (), {})
+            routing = db_router.current.get()
+        finally:
+            db_router.current.reset(token)
+        request.user = authenticated()
+        return middleware.finish(request, HttpResponse(status=status), routing)
+
+    def test_successful_write_makes_the_user_sticky(self):
+        self.serve(self.factory.post('/'))
+        self.assertTrue(cache.get(db_router.sticky_key(1)))
+
+    def test_failed_write_does_not_make_the_user_sticky(self):
+        self.serve(self.factory.post('/'), status=400)
+        self.assertIsNone(cache.get(db_router.sticky_key(1)))
+
+    def test_safe_request_does_not_make_the_user_sticky(self):
+        self.serve(self.factory.get('/'))
+        self.assertIsNone(cache.get(db_router.sticky_key(1)))
+
+    def test_view_writing_on_a_safe_method_makes_the_user_sticky(self):
+        self.serve(self.factory.get('/'), replica_reads=False)
+        self.assertTrue(cache.get(db_router.sticky_key(1)))
+
+
+class ReplicaMonitorTests(SimpleTestCase):
+    databases = {DEFAULT_DB_ALIAS}
+
+    def lag(self, value):
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value.fetchone.return_value = (value,)
+        return {REPLICA: mock.Mock(cursor=mock.Mock(return_value=cursor))}
+
+    def test_replica_within_max_lag_is_healthy(self):
+        with mock.patch.object(db_router, 'connections', self.lag(db_router.REPLICA_MAX_LAG / 2)):
+            self.assertTrue(db_router.ReplicaMonitor().check(REPLICA))
+
+    def test_lagging_replica_is_unhealthy(self):
+        with mock.patch.object(db_router, 'connections', self.lag(db_router.REPLICA_MAX_LAG + 1)):
+            self.assertFalse(db_router.ReplicaMonitor().check(REPLICA))
+
+    def test_primary_is_never_lagging(self):
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute(db_router.LAG_SQL)
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_replica_without_a_replayed_transaction_is_unhealthy(self):
+        with mock.patch.object(db_router, 'connections', self.lag(None)):
+            self.assertFalse(db_router.ReplicaMonitor().check(REPLICA))
+
+    def test_unreachable_replica_is_unhealthy(self):
+        connection = mock.Mock(cursor=mock.Mock(side_effect=DatabaseError("connection refused")))
+        with mock.patch.object(db_router, 'connections', {REPLICA: connection}):
+            self.assertFalse(db_router.ReplicaMonitor().check(REPLICA))
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA])
+    def test_lag_is_checked_once_per_interval(self):
+        monitor = db_router.ReplicaMonitor()
+        with mock.patch.object(monitor, 'check', return_value=True) as check:
+            self.assertEqual(monitor.pick(), REPLICA)
+            self.assertEqual(monitor.pick(), REPLICA)
+        check.assert_called_once_with(REPLICA)
+
+
+class MetricsViewTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(metrics, 'COLLECTORS', [mock.Mock(__qualname__='collector')])
+        self.collector, = patcher.start()
+        self.addCleanup(patcher.stop)
+        metrics.collected_at = float('-inf')
+
+    def test_token_is_required_when_configured(self):
+        with mock.patch.object(health_check, 'METRICS_TOKEN', 'secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        self.collector.assert_called_once_with()
+
+    def test_collectors_run_once_per_interval(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+        self.collector.assert_called_once_with()
+        metrics.collected_at -= metrics.COLLECT_INTERVAL
+        self.client.get(reverse('metrics'))
+        self.assertEqual(self.collector.call_count, 2)
+
+
+def pool_exhausted(*args, **kwargs):
+    # What BlockingConnectionPool raises when no connection frees up in time
+    try:
+        raise Empty
+    except Empty:
+        raise ConnectionError("No connection available.")
+
+
+class FallbackRedisCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = FallbackRedisCache('redis://localhost:6379/0', {'OPTIONS': {'FALLBACK_RETRY_INTERVAL': 30}})
+        self.redis = {}
+        for method in ('get', 'delete', 'delete_many'):
+            patcher = mock.patch.object(RedisCache, method)
+            self.redis[method] = patcher.start()
+            self.addCleanup(patcher.stop)
+        self.redis['get'].return_value = None
+
+    def replayed(self) -> list:
+        return sorted(key for call in self.redis['delete_many'].call_args_list for key in call.args[0])
+
+    def test_keys_deleted_during_an_outage_are_deleted_once_redis_is_back(self):
+        self.redis['get'].side_effect = ConnectionError("connection refused")
+        with self.assertLogs(level='WARNING'):
+            self.cache.get('friend_graph_1')
+        self.assertFalse(self.cache.available)
+        self.cache.delete('friend_graph_1')
+        self.cache.delete_many(['blocked_by_1', 'blocked_by_2'])
+        self.redis['delete'].assert_not_called()
+        self.redis['delete_many'].assert_not_called()
+
+        self.redis['get'].side_effect = None
+        self.cache._down_until = 0.0
+        self.cache.get('friend_graph_1')
+        self.assertEqual(self.replayed(), ['blocked_by_1', 'blocked_by_2', 'friend_graph_1'])
+        self.redis['get'].assert_called()
+
+        self.cache.get('friend_graph_1')
+        self.assertEqual(self.redis['delete_many'].call_count, 1)
+
+    def test_exhausted_pool_does_not_trip_the_fallback(self):
+        self.redis['delete'].side_effect = pool_exhausted
+        self.cache.delete('friend_graph_1')
+        self.assertTrue(self.cache.available)
+
+        self.cache.get('friend_graph_1')
+        self.assertEqual(self.replayed(), ['friend_graph_1'])
+
+    def test_failed_replay_is_retried(self):
+        self.redis['delete'].side_effect = pool_exhausted
+        self.cache.delete('friend_graph_1')
+        self.redis['delete_many'].side_effect = pool_exhausted
+        self.cache.get('friend_graph_1')
+        self.redis['get'].assert_not_called()
+
+        self.redis['delete_many'].side_effect = None
+        self.cache.get('friend_graph_1')
+        self.assertEqual(self.replayed(), ['friend_graph_1', 'friend_graph_1'])
+        self.redis['get'].assert_called_once()
+
+
+class ParseLimitTests(SimpleTestCase):
+    def test_burst_defaults_to_the_whole_allowance(self):
+        self.assertEqual(parse_limit('10/second'), (0.1, 1.0))
+        self.assertEqual(parse_limit('3/hour'), (1200, 3600))
+
+    def test_burst(self):
+        interval, tolerance = parse_limit('100/minute:10')
+        self.assertAlmostEqual(interval, 0.6)
+        self.assertAlmostEqual(tolerance, 6.0)
+
+
+class LocalLimiterTests(SimpleTestCase):
+    # One request a second, bursts of three
+    LIMITS = [('client', *parse_limit('60/minute:3'))]
+
+    def test_burst_then_refuse(self):
+        limiter = LocalLimiter()
+        self.assertEqual([limiter.acquire(self.LIMITS, 0) <= 0 for _ in range(4)], [True, True, True, False])
+        self.assertEqual(limiter.wait(self.LIMITS, 0), 1)
+        self.assertLessEqual(limiter.acquire(self.LIMITS, 1), 0)
+        self.assertGreater(limiter.acquire(self.LIMITS, 1), 0)
+
+    def test_every_limit_must_have_room(self):
+        limiter = LocalLimiter()
+        limits = self.LIMITS + [('address', *parse_limit('60/minute:1'))]
+        self.assertLessEqual(limiter.acquire(limits, 0), 0)
+        self.assertEqual(limiter.acquire(limits, 0), 1)
+        # The refused request did not count against the limit that had room
+        self.assertEqual(limiter.tats['client'], 1)
+
+    def test_record_mirrors_a_refusal_of_redis(self):
+        limiter = LocalLimiter()
+        limiter.record(self.LIMITS, 10, 5)
+        self.assertEqual(limiter.wait(self.LIMITS, 10), 5)
+        self.assertLessEqual(limiter.wait(self.LIMITS, 15), 0)
+
+    def test_record_mirrors_an_allowed_request(self):
+        limiter, acquired = LocalLimiter(), LocalLimiter()
+        limiter.record(self.LIMITS, 0, 0)
+        acquired.acquire(self.LIMITS, 0)
+        self.assertEqual(limiter.tats, acquired.tats)
+
+    def test_state_starts_over_past_max_entries(self):
+        limiter = LocalLimiter(max_entries=2)
+        for key in ('a', 'b', 'c'):
+            limiter.acquire([(key, 1, 1)], 0)
+        self.assertEqual(list(limiter.tats), ['c'])
+
+
+class GCRAThrottleTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(GCRAThrottle, 'local', LocalLimiter())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.view = SimpleNamespace(throttle_scope='benchmark')
+        self.request = Request(RequestFactory().get('/', REMOTE_ADDR='10.0.0.1'))
+        self.request.user = AnonymousUser()
+
+    def throttle(self):
+        throttle = GCRAThrottle()
+        throttle.THROTTLE_RATES = {'benchmark': '60/minute:2'}
+        return throttle
+
+    def test_local_limiter_decides_when_redis_cannot_be_asked(self):
+        with mock.patch.object(GCRAThrottle, 'check', return_value=None) as check:
+            throttles = [self.throttle() for _ in range(3)]
+            self.assertEqual([throttle.allow_request(self.request, self.view) for throttle in throttles], [True, True, False])
+        # The third is refused by the local state before asking
+        self.assertEqual(check.call_count, 2)
+        self.assertAlmostEqual(throttles[-1].wait(), 1, places=2)
+
+    def test_local_cache_without_a_client_cannot_be_asked(self):
+        self.assertIsNone(self.throttle().check([('client', 1, 1)]))
+
+    def test_refusal_of_redis_is_answered_locally_afterwards(self):
+        with mock.patch.object(GCRAThrottle, 'check', return_value=30.0) as check:
+            self.assertFalse(self.throttle().allow_request(self.request, self.view))
+            throttle = self.throttle()
+            self.assertFalse(throttle.allow_request(self.request, self.view))
+        check.assert_called_once()
+        self.assertGreater(throttle.wait(), 0)
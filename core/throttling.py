@@ -0,0 +1,145 @@
+import os, threading, time
+from django.core.cache import cache
+from redis.exceptions import ConnectionError, TimeoutError
+from rest_framework.throttling import ScopedRateThrottle
+
+# Keys a worker keeps local throttle state for before it starts over
+THROTTLE_LOCAL_ENTRIES = int(os.getenv("THROTTLE_LOCAL_ENTRIES", 10000))
+
+# GCRA over every key at once, in milliseconds of the Redis clock: a request
+# is allowed only if each key has room, and then counts against all of them.
+# ARGV holds the emission interval and tolerance of each key in turn.
+GCRA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local tats = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local interval = tonumber(ARGV[2 * i - 1])
+    local tolerance = tonumber(ARGV[2 * i])
+    local tat = math.max(tonumber(redis.call('GET', key) or now), now) + interval
+    wait = math.max(wait, tat - now - tolerance)
+    tats[i] = tat
+end
+if wait > 0 then
+    return {0, tostring(wait)}
+end
+for i, key in ipairs(KEYS) do
+    redis.call('SET', key, tostring(tats[i]), 'PX', math.ceil(tats[i] - now))
+end
+return {1, '0'}
+"""
+
+
+def parse_limit(rate: str) -> tuple:
+    """
+    Parses ``<requests>/<period>[:<burst>]``, ``100/minute:10`` allowing
+    bursts of 10 requests, into the GCRA emission interval and tolerance in
+    seconds. Without a burst the whole allowance may be used at once.
+    """
+    rate, _, burst = rate.partition(':')
+    num, period = rate.split('/')
+    duration = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+    interval = duration / int(num)
+    return interval, interval * int(burst or num)
+
+
+class LocalLimiter:
+    """
+    GCRA state kept in the memory of the worker. It only sees the requests
+    the worker served and the refusals Redis returned to it, so it never
+    refuses a request Redis would allow and saves the round trip for
+    clients already over their limit. Serves as the limiter itself when
+    Redis is not configured or unreachable.
+    """
+
+    def __init__(self, max_entries: int = THROTTLE_LOCAL_ENTRIES):
+        self.max_entries = max_entries
+        self.tats = {}
+        self.lock = threading.Lock()
+
+    def wait(self, limits: list, now: float) -> float:
+        return max(max(self.tats.get(key, now), now) + interval - now - tolerance for key, interval, tolerance in limits)
+
+    def acquire(self, limits: list, now: float) -> float:
+        """Counts a request against ``limits`` if each has room, returns the seconds to wait otherwise."""
+        with self.lock:
+            wait = self.wait(limits, now)
+            if wait <= 0:
+                self.advance(limits, now)
+            return wait
+
+    def advance(self, limits: list, now: float) -> None:
+        if len(self.tats) >= self.max_entries:
+            self.tats.clear()
+        for key, interval, _ in limits:
+            self.tats[key] = max(self.tats.get(key, now), now) + interval
+
+    def record(self, limits: list, now: float, wait: float) -> None:
+        """Mirrors the answer of Redis: the request counted, or must wait ``wait`` seconds."""
+        with self.lock:
+            if wait <= 0:
+                self.advance(limits, now)
+            else:
+                for key, interval, tolerance in limits:
+                    self.tats[key] = max(self.tats.get(key, now), now + wait + tolerance - interval)
+
+
+class GCRAThrottle(ScopedRateThrottle):
+    """
+    Drop-in replacement for ``ScopedRateThrottle`` checking the generic cell
+    rate algorithm in a single Lua script round trip, so limits hold exactly
+    across workers and each check is O(1) whatever the rate.
+
+    Requests are limited per user, or per IP address when anonymous. A
+    ``<scope>_ip`` rate, when set, also limits authenticated users per IP
+    address. Rates accept a burst, see ``parse_limit``. A local limiter
+    refuses clients known to be over their limit without asking Redis, and
+    decides alone while Redis is down, like the cache fallback.
+    """
+    local = LocalLimiter()
+    script = None
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+
+        limits = [(self.get_cache_key(request, view), *parse_limit(self.rate))]
+        ip_rate = self.THROTTLE_RATES.get(f'{self.scope}_ip')
+        if ip_rate and request.user and request.user.is_authenticated:
+            ident = self.cache_format % {'scope': f'{self.scope}_ip', 'ident': self.get_ident(request)}
+            limits.append((ident, *parse_limit(ip_rate)))
+
+        now = time.monotonic()
+        self.wait_seconds = self.local.wait(limits, now)
+        if self.wait_seconds > 0:
+            return False
+        self.wait_seconds = self.check(limits)
+        if self.wait_seconds is None:
+            self.wait_seconds = self.local.acquire(limits, now)
+        else:
+            self.local.record(limits, now, self.wait_seconds)
+        return self.wait_seconds <= 0
+
+    def check(self, limits: list):
+        """Returns the seconds to wait according to Redis, or None if it cannot be asked."""
+        get_client = getattr(cache, 'get_client', None)
+        client = get_client(write=True) if get_client is not None else None
+        if client is None:
+            return None
+        if GCRAThrottle.script is None:
+            GCRAThrottle.script = client.register_script(GCRA_SCRIPT)
+        args = [str(value * 1000) for _, interval, tolerance in limits for value in (interval, tolerance)]
+        try:
+            _, wait = self.script(keys=[cache.make_key(key) for key, _, _ in limits], args=args, client=client)
+        except (ConnectionError, TimeoutError) as e:
+            cache.connection_error(e)
+            return None
+        return float(wait) / 1000
+
+    def wait(self):
+        return max(self.wait_seconds, 0)
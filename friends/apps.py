@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class FriendsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'friends'
+
+    def ready(self):
+        # Connects the signal receivers and registers the table metrics
+        from friends import retention, signals  # noqa: F401
@@ -0,0 +1,71 @@
+import asyncio, json, time
+from django.http import StreamingHttpResponse
+from friends import counters, graph, notifications
+from friends.models import FriendRequest, Friendship
+from friends.serializers import FriendRequestSerializer, friendship_values
+from core.async_views import AsyncAPIView
+from utils.pagination import KeysetPagination, KeysetPaginationMixin
+
+class AsyncFriendListAPIView(KeysetPaginationMixin, AsyncAPIView):
+    keyset_ordering = ('friend__first_name', 'friend__last_name', 'id')
+
+    async def get(self, request):
+        paginator = self.get_paginator()
+        keyset = isinstance(paginator, KeysetPagination)
+
+        search_query = request.query_params.get('q', '')
+        if not search_query and not keyset:
+            friend_graph = await graph.aget_graph(request.user.id)
+            friendship_ids = paginator.paginate_queryset(friend_graph['order'], request)
+            friendships = {row['id']: row async for row in friendship_values.values(Friendship.objects.filter(id__in=friendship_ids))}
+            page = [friendships[pk] for pk in friendship_ids if pk in friendships]
+        else:
+            count = None if search_query else counters.areader(request.user, counters.FRIENDS)
+            page = await paginator.apaginate_queryset(friendship_values.values(Friendship.objects.friends_of(request.user.id, search_query)), request, count=count)
+
+        return self.render(paginator.get_paginated_response(friendship_values.many(page)).data)
+
+class AsyncPendingFriendRequestAPIView(KeysetPaginationMixin, AsyncAPIView):
+    keyset_ordering = ('-created_at', 'id')
+
+    async def get(self, request):
+        search_query = request.query_params.get('q', '')
+        pending_requests = FriendRequest.objects.pending_for(request.user.id, search_query)
+
+        paginator = self.get_paginator()
+        count = None if search_query else counters.areader(request.user, counters.PENDING_INCOMING)
+        page = await paginator.apaginate_queryset(pending_requests, request, count=count)
+        serializer = FriendRequestSerializer(page, many=True)
+        return self.render(paginator.get_paginated_response(serializer.data).data)
+
+class FriendRequestStreamAPIView(AsyncAPIView):
+    """
+    Server-Sent Events stream of the friend requests a user receives and
+    the answers to those they sent, replacing polling of the pending list.
+
+    The stream ends when the access token expires, EventSource reconnects
+    and the client passes a fresh token. Events missed while disconnected
+    are not replayed, clients list their pending requests on reconnect.
+    """
+    token_query_param = 'token'
+
+    async def get(self, request):
+        response = StreamingHttpResponse(self.stream(request.user.id, self.token['exp']), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, user_id, expires_at):
+        broker = notifications.get_broker()
+        queue = await broker.subscribe(user_id)
+        try:
+            yield ': connected\n\n'
+            while (remaining := expires_at - time.time()) > 0:
+                try:
+                    event = await asyncio.wait_for(queue.get(), min(remaining, notifications.NOTIFICATIONS_HEARTBEAT_INTERVAL))
+                except TimeoutError:
+                    yield ': heartbeat\n\n'
+                    continue
+                yield f"id: {event['id']}\nevent: {event['topic']}\ndata: {json.dumps(event['payload'])}\n\n"
+        finally:
+            await broker.unsubscribe(user_id, queue)
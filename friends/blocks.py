@@ -0,0 +1,47 @@
+import os
+from django.apps import apps
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+BLOCKED_BY_CACHE_TIMEOUT = int(os.getenv("BLOCKED_BY_CACHE_TIMEOUT", 60 * 60))
+
+
+def _cache_key(user_id: int) -> str:
+    return f"blocked_by_{user_id}"
+
+
+def _rows(user_id: int):
+    # Served by blocked_reverse_idx, on the primary like friends.graph
+    BlockedUser = apps.get_model('friends', 'BlockedUser')
+    return BlockedUser.objects.using(DEFAULT_DB_ALIAS).filter(blocked_user_id=user_id).order_by('user_id').values_list('user_id', flat=True)
+
+
+def blocked_by(user_id: int) -> frozenset:
+    """
+    Returns the ids of the users who blocked ``user_id``, who must not
+    appear in the user listings and searches of ``user_id``.
+
+    Cached as a sorted tuple per user, building it on a miss, and dropped
+    by ``invalidate`` whenever a block is stored or removed.
+    """
+    key = _cache_key(user_id)
+    user_ids = cache.get(key)
+    if user_ids is None:
+        user_ids = tuple(_rows(user_id))
+        cache.set(key, user_ids, BLOCKED_BY_CACHE_TIMEOUT)
+    return frozenset(user_ids)
+
+
+async def ablocked_by(user_id: int) -> frozenset:
+    """Async variant of ``blocked_by`` for ASGI views."""
+    key = _cache_key(user_id)
+    user_ids = await cache.aget(key)
+    if user_ids is None:
+        user_ids = tuple([row async for row in _rows(user_id)])
+        await cache.aset(key, user_ids, BLOCKED_BY_CACHE_TIMEOUT)
+    return frozenset(user_ids)
+
+
+def invalidate(*user_ids: int) -> None:
+    """Drops the cached blocked-by sets of the users who were blocked or unblocked."""
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
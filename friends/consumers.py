@@ -0,0 +1,69 @@
+import logging
+from friends import blocks, graph, notifications, outbox
+
+logger = logging.getLogger()
+
+# Events changing whose friends a user has, or who they blocked
+GRAPH_TOPICS = {outbox.FRIENDSHIP_CREATED, outbox.FRIENDSHIP_REMOVED, outbox.USER_BLOCKED, outbox.USER_UNBLOCKED}
+
+# Pushed to the user who has something to act on or to learn about
+NOTIFIED_USER_KEYS = {
+    outbox.FRIEND_REQUEST_SENT: 'receiver_id',
+    outbox.FRIEND_REQUEST_ACCEPTED: 'sender_id',
+    outbox.FRIEND_REQUEST_REJECTED: 'sender_id',
+}
+
+USER_KEYS = ('user_id', 'friend_id', 'sender_id', 'receiver_id', 'blocked_user_id')
+
+
+def users_of(event: dict) -> set:
+    return {event['payload'][key] for key in USER_KEYS if key in event['payload']}
+
+
+def invalidate_friend_graphs(events: list) -> None:
+    """
+    Drops the cached friend graphs of the users whose friendships or blocks
+    changed once more, after the managers did on commit, in case a listing
+    running concurrently cached a graph from before the change.
+    """
+    user_ids = set()
+    for event in events:
+        if event['topic'] in GRAPH_TOPICS:
+            user_ids |= users_of(event)
+    if user_ids:
+        graph.invalidate(*user_ids)
+
+
+def invalidate_blocked_by(events: list) -> None:
+    """
+    Drops the blocked-by sets of blocked and unblocked users once more,
+    after the block paths did on commit, in case a listing running
+    concurrently cached the set from before the change.
+    """
+    user_ids = {event['payload']['blocked_user_id'] for event in events if event['topic'] in (outbox.USER_BLOCKED, outbox.USER_UNBLOCKED)}
+    if user_ids:
+        blocks.invalidate(*user_ids)
+
+
+def notify_users(events: list) -> None:
+    """
+    Pushes friend request events to the streams of the users concerned.
+    Delivery is best effort, a batch relayed again notifies again; clients
+    deduplicate on the event ``id``.
+    """
+    broker = notifications.get_broker()
+    if broker is None:
+        return
+    for event in events:
+        key = NOTIFIED_USER_KEYS.get(event['topic'])
+        if key is not None:
+            try:
+                broker.publish(event['payload'][key], event)
+            except Exception as e:
+                logger.warning("Could not push %s event %s: %s", event['topic'], event['id'], e)
+
+
+# Run by relay_outbox on every batch before it reaches the sink, each of them
+# idempotent since a failed batch is handed over again. Counters are kept
+# exact by the writing transactions, drift is repaired by reconcile_counters
+CONSUMERS = [invalidate_friend_graphs, invalidate_blocked_by, notify_users]
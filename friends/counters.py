@@ -0,0 +1,112 @@
+from collections import Counter
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+FRIENDS = 'friend_count'
+PENDING_INCOMING = 'pending_incoming_count'
+BLOCKED = 'blocked_count'
+
+COUNTER_FIELDS = (FRIENDS, PENDING_INCOMING, BLOCKED)
+
+USERS_SQL = "SELECT id FROM users_appuser u WHERE {users}"
+
+# Locks the rows of the batch, once their advisory locks are held, so the
+# counts below are taken after every in-flight change to their counters committed
+LOCK_SQL = "SELECT id FROM users_appuser u WHERE {users} ORDER BY id FOR UPDATE"
+
+RECONCILE_SQL = """
+    UPDATE users_appuser u
+    SET friend_count = c.friend_count, pending_incoming_count = c.pending_incoming_count, blocked_count = c.blocked_count
+    FROM (
+        SELECT u.id,
+            (SELECT COUNT(*) FROM friends_friendship f WHERE f.user_id = u.id) AS friend_count,
+            (SELECT COUNT(*) FROM friends_friendrequest r WHERE r.receiver_id = u.id AND r.status = 'PENDING') AS pending_incoming_count,
+            (SELECT COUNT(*) FROM friends_blockeduser b WHERE b.user_id = u.id) AS blocked_count
+        FROM users_appuser u
+        WHERE {users}
+    ) c
+    WHERE u.id = c.id
+    AND (u.friend_count, u.pending_incoming_count, u.blocked_count)
+        IS DISTINCT FROM (c.friend_count, c.pending_incoming_count, c.blocked_count)
+"""
+
+
+def adjust(field: str, deltas) -> None:
+    """
+    Adds ``deltas`` to the ``field`` counter of users with ``F()``
+    expressions, one ``UPDATE`` per distinct delta.
+
+    Must run in the transaction that changed the counted rows.
+
+    Args:
+        field (str): One of ``COUNTER_FIELDS``.
+        deltas (dict): User id mapped to the amount to add, negative to subtract.
+    """
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    user_ids = {}
+    for user_id, delta in deltas.items():
+        if delta:
+            user_ids.setdefault(delta, []).append(user_id)
+    for delta, ids in user_ids.items():
+        # Clamped so a counter that drifted cannot violate its constraint, reconcile fixes it
+        User.objects.filter(id__in=ids).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def increment(field: str, *user_ids) -> None:
+    """Adds one to ``field`` for every occurrence of a user id in ``user_ids``."""
+    adjust(field, Counter(user_ids))
+
+
+def decrement(field: str, *user_ids) -> None:
+    """Subtracts one from ``field`` for every occurrence of a user id in ``user_ids``."""
+    adjust(field, {user_id: -count for user_id, count in Counter(user_ids).items()})
+
+
+def reader(user, field: str):
+    """Returns a callable reading the ``field`` counter of ``user``, for a paginator ``count``."""
+    return lambda: getattr(user, field)
+
+
+def areader(user, field: str):
+    """Async variant of ``reader``, loading the counter if it is deferred."""
+    async def read():
+        if field in user.get_deferred_fields():
+            await user.arefresh_from_db(fields=[field])
+        return getattr(user, field)
+    return read
+
+
+def _reconcile(users: str, params: dict) -> int:
+    # Imported here, the managers import this module
+    from friends.managers import lock_users
+    with connection.cursor() as cursor:
+        # The advisory locks first and in id order, like the request paths
+        # take them before moving counters, or the two would deadlock
+        cursor.execute(USERS_SQL.format(users=users), params)
+        lock_users(user_id for user_id, in cursor.fetchall())
+        cursor.execute(LOCK_SQL.format(users=users), params)
+        cursor.execute(RECONCILE_SQL.format(users=users), params)
+        return cursor.rowcount
+
+
+def reconcile(first_id: int, last_id: int) -> int:
+    """
+    Recounts the counters of the users with ids in ``[first_id, last_id]``.
+
+    Must run in a transaction, which keeps the users of the batch locked
+    until it ends, so batches are best kept short.
+
+    Returns:
+        int: The number of users whose counters were wrong.
+    """
+    return _reconcile('u.id BETWEEN %(first)s AND %(last)s', {'first': first_id, 'last': last_id})
+
+
+def reconcile_users(user_ids: list) -> int:
+    """Recounts the counters of the users in ``user_ids``, like ``reconcile``."""
+    if not user_ids:
+        return 0
+    return _reconcile('u.id = ANY(%(ids)s)', {'ids': list(user_ids)})
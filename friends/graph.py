@@ -0,0 +1,77 @@
+import os
+from bisect import bisect_left
+from django.core.cache import cache
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS
+
+GRAPH_CACHE_TIMEOUT = int(os.getenv("FRIEND_GRAPH_CACHE_TIMEOUT", 60 * 60))
+
+
+def _cache_key(user_id: int) -> str:
+    return f"friend_graph_{user_id}"
+
+
+def _rows(user_id: int):
+    # Read from the primary, a lagging replica would cache a stale graph for its whole timeout
+    Friendship = apps.get_model('friends', 'Friendship')
+    return (
+        Friendship.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id)
+        .order_by('friend__first_name', 'friend__last_name', 'id')
+        .values_list('id', 'friend_id')
+    )
+
+
+def _build(rows: list) -> dict:
+    return {
+        # Friendship ids in display order, used for listing and counting
+        'order': [friendship_id for friendship_id, _ in rows],
+        # Friend ids sorted numerically, used for membership checks
+        'ids': sorted(friend_id for _, friend_id in rows),
+    }
+
+
+def get_graph(user_id: int) -> dict:
+    """
+    Returns the cached adjacency entry of a user, building it on a miss.
+
+    Args:
+        user_id (int): Id of the user whose friends are requested.
+
+    Returns:
+        dict: ``order`` holds friendship ids sorted by friend name and
+        ``ids`` holds the friend ids sorted ascending.
+    """
+    key = _cache_key(user_id)
+    graph = cache.get(key)
+    if graph is None:
+        graph = _build(list(_rows(user_id)))
+        cache.set(key, graph, GRAPH_CACHE_TIMEOUT)
+    return graph
+
+
+async def aget_graph(user_id: int) -> dict:
+    """Async variant of ``get_graph`` for ASGI views."""
+    key = _cache_key(user_id)
+    graph = await cache.aget(key)
+    if graph is None:
+        graph = _build([row async for row in _rows(user_id)])
+        await cache.aset(key, graph, GRAPH_CACHE_TIMEOUT)
+    return graph
+
+
+def friend_ids(user_id: int) -> list:
+    return get_graph(user_id)['ids']
+
+
+def friend_count(user_id: int) -> int:
+    return len(get_graph(user_id)['ids'])
+
+
+def is_friend(user_id: int, other_id: int) -> bool:
+    ids = get_graph(user_id)['ids']
+    index = bisect_left(ids, other_id)
+    return index < len(ids) and ids[index] == other_id
+
+
+def invalidate(*user_ids: int) -> None:
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
@@ -0,0 +1,67 @@
+import logging, time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError
+from django.utils import timezone
+from friends import retention
+
+logger = logging.getLogger()
+
+MAX_RETRIES = 5
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves friend requests resolved more than --days ago to the monthly partitioned archive, "
+        "in short batches, then drops archive partitions older than --keep-months"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=retention.FRIEND_REQUEST_RETENTION_DAYS, help="Days resolved requests stay in the live table")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Requests moved per transaction")
+        parser.add_argument('--pause', type=float, default=0.05, help="Seconds to wait between batches, leaving room to vacuum and replicate")
+        parser.add_argument('--lock-timeout', default=retention.FRIEND_REQUEST_ARCHIVE_LOCK_TIMEOUT, help="Longest a batch waits for a table lock, e.g. 1s")
+        parser.add_argument('--keep-months', type=int, default=retention.FRIEND_REQUEST_ARCHIVE_MONTHS, help="Months of archive kept, 0 to keep everything")
+        parser.add_argument('--vacuum', action='store_true', help="Vacuum the live table afterwards")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        lock_timeout = options['lock_timeout']
+        batch_size = options['batch_size']
+
+        for name in retention.create_partitions(cutoff, lock_timeout):
+            logger.info("Created archive partition %s", name)
+
+        moved = batches = retries = 0
+        while True:
+            try:
+                count = retention.archive(cutoff, batch_size, lock_timeout)
+            except OperationalError as e:
+                retries += 1
+                if retries > MAX_RETRIES:
+                    raise CommandError(f"Gave up archiving after {moved} friend requests: {e}")
+                logger.warning("Archiving batch did not get its locks, retrying: %s", e)
+                time.sleep(retries)
+                continue
+            retries = 0
+            moved += count
+            batches += 1
+            if count < batch_size:
+                break
+            time.sleep(options['pause'])
+
+        dropped = []
+        if options['keep_months']:
+            before = retention.month_start(timezone.now())
+            for _ in range(options['keep_months']):
+                before = retention.month_start(before - timedelta(days=1))
+            dropped = retention.drop_partitions(before, lock_timeout)
+            for name in dropped:
+                logger.info("Dropped archive partition %s", name)
+
+        if options['vacuum']:
+            retention.vacuum()
+
+        logger.info("Archived %d friend requests in %d batches in %.1fs", moved, batches, time.monotonic() - started)
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} friend requests, dropped {len(dropped)} archive partitions."))
@@ -0,0 +1,56 @@
+import statistics
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from core.benchmark import timed
+from friends.models import BlockedUser, Friendship
+from friends.serializers import BlockedUserSerializer, FriendshipSerializer, blocked_user_values, friendship_values
+from users.serializer import AppUserSerializer, user_values
+from utils.renderers import ORJSONRenderer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the ModelSerializer and JSONRenderer path of the list endpoints with their .values() fast "
+        "path and ORJSONRenderer, after checking both render the same bytes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10, 100], help="Rows per page to serialize")
+        parser.add_argument('--repeat', type=int, default=200, help="Renders per serializer and page size, the median is reported")
+
+    def handle(self, *args, **options):
+        size = max(options['rows'])
+        # (endpoint, serializer, queryset, fast path), ordered alike so both render the same page
+        cases = [
+            ('users', AppUserSerializer, User.objects.order_by('id'), user_values),
+            ('friends', FriendshipSerializer, Friendship.objects.select_related('friend').order_by('id'), friendship_values),
+            ('blocked', BlockedUserSerializer, BlockedUser.objects.select_related('blocked_user').order_by('id'), blocked_user_values),
+        ]
+        json_renderer, orjson_renderer = JSONRenderer(), ORJSONRenderer()
+
+        self.stdout.write(f"{'endpoint':<10} {'rows':>6} {'serializer ms':>14} {'values ms':>10} {'speedup':>8}")
+        for name, serializer_class, queryset, fast_path in cases:
+            instances = list(queryset[:size])
+            rows = list(fast_path.values(queryset)[:size])
+            if not instances:
+                self.stdout.write(f"{name:<10} no rows to serialize")
+                continue
+            for count in options['rows']:
+                # Pages larger than the table repeat its rows
+                page = (instances * (count // len(instances) + 1))[:count]
+                values_page = (rows * (count // len(rows) + 1))[:count]
+
+                def slow():
+                    return json_renderer.render(serializer_class(page, many=True).data)
+
+                def fast():
+                    return orjson_renderer.render(fast_path.many(values_page))
+
+                if slow() != fast():
+                    raise CommandError(f"The {name} fast path does not render the same bytes as {serializer_class.__name__}")
+                slow_ms = statistics.median(timed(slow, options['repeat'])) * 1000
+                fast_ms = statistics.median(timed(fast, options['repeat'])) * 1000
+                self.stdout.write(f"{name:<10} {count:>6} {slow_ms:>14.3f} {fast_ms:>10.3f} {slow_ms / fast_ms:>7.1f}x")
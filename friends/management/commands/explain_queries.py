@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from friends.models import FriendRequest, Friendship, BlockedUser
+from users import search
+from utils.pagination import KeysetPagination
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN on the hot query of each friends/users view and checks the expected index is used"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Id of the user the queries run for (defaults to the first user)")
+        parser.add_argument('--analyze', action='store_true', help="Run EXPLAIN ANALYZE instead of a plain EXPLAIN")
+        parser.add_argument('--check', action='store_true', help="Fail if a query does not use its expected indexes")
+        parser.add_argument('--search', default='john', help="Search query of UserSearchAPIView, at least 3 characters to use the trigram indexes")
+        parser.add_argument('--no-seqscan', action='store_true', help="Disable sequential scans, for development tables too small to favour an index")
+
+    def queries(self, user_id, search_query='john'):
+        # (name, queryset, indexes expected in the plan), listings read one page like the views
+        page = KeysetPagination.page_size + 1
+        search_indexes = ['users_search_vector_idx']
+        if len(search_query) >= search.MIN_TRIGRAM_LENGTH:
+            search_indexes += ['users_email_trgm_idx']
+            if search.plan_search(search_query) != 'email':
+                search_indexes += ['users_first_name_trgm_idx', 'users_last_name_trgm_idx']
+        return [
+            ('FriendListAPIView', Friendship.objects.filter(user_id=user_id).select_related('friend')
+                .order_by('friend__first_name', 'friend__last_name', 'id')[:page], []),
+            ('PendingFriendRequestAPIView', FriendRequest.objects.filter(receiver_id=user_id, status='PENDING')
+                .order_by('-created_at', 'id')[:page], ['friendreq_pending_recv_idx']),
+            ('BlockedUserListAPIView', BlockedUser.objects.filter(user_id=user_id).select_related('blocked_user')
+                .order_by('-created_at', 'id')[:page], ['blocked_user_created_idx']),
+            ('UsersAPIView (blocked by)', BlockedUser.objects.filter(blocked_user_id=user_id)
+                .values_list('user', flat=True), ['blocked_reverse_idx']),
+            ('FriendRequestAPIView (eligibility)', FriendRequest.objects.eligibility_queryset(user_id, [user_id + 1]), []),
+            ('UserSearchAPIView', search.search_users(User.objects.all(), search_query, search.plan_search(search_query))
+                .order_by('-rank', 'id')[:page], search_indexes),
+        ]
+
+    def handle(self, *args, **options):
+        user_id = options['user'] or User.objects.order_by('id').values_list('id', flat=True).first()
+        if user_id is None:
+            raise CommandError("There are no users to run the queries for.")
+
+        missing = []
+        with transaction.atomic():
+            if options['no_seqscan']:
+                # Tiny development tables always favour sequential scans; ask whether the index is usable
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for name, queryset, indexes in self.queries(user_id, options['search']):
+                plan = queryset.explain(analyze=options['analyze'])
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self.stdout.write(plan + '\n')
+                missing += [f"{name} does not use {index}" for index in indexes if index not in plan]
+
+        if options['check'] and missing:
+            raise CommandError('\n'.join(missing))
+        if options['check']:
+            self.stdout.write(self.style.SUCCESS("Every query uses its expected indexes."))
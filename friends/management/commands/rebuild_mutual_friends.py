@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from friends import suggestions
+
+
+class Command(BaseCommand):
+    help = "Recomputes the mutual friend counts used for friend suggestions from the friendship table"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            pairs = suggestions.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt mutual friend counts for {pairs} user pairs."))
@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from friends import counters
+
+
+class Command(BaseCommand):
+    help = "Recounts the friend, pending request and blocked counters of every user, in batches of users"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Users recounted per transaction")
+
+    def handle(self, *args, **options):
+        bounds = get_user_model().objects.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write("No users to reconcile.")
+            return
+        batch_size = options['batch_size']
+        corrected = 0
+        for first_id in range(bounds['first'], bounds['last'] + 1, batch_size):
+            with transaction.atomic():
+                corrected += counters.reconcile(first_id, first_id + batch_size - 1)
+        self.stdout.write(self.style.SUCCESS(f"Reconciled counters, {corrected} users were out of date."))
@@ -0,0 +1,46 @@
+import logging, signal, time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from friends import outbox
+from friends.consumers import CONSUMERS
+
+logger = logging.getLogger()
+
+
+class Command(BaseCommand):
+    help = "Relays friendship, friend request and block events from the outbox to the consumers and the configured sink"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Events relayed per transaction")
+        parser.add_argument('--interval', type=float, default=0.2, help="Seconds to wait when the outbox is empty")
+        parser.add_argument('--once', action='store_true', help="Drain the outbox and exit")
+
+    def handle(self, *args, **options):
+        sink = outbox.get_sink()
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        retry_delay = options['interval']
+        while self.running:
+            # Long running, so connections are recycled like after a request
+            close_old_connections()
+            try:
+                relayed = outbox.relay(sink, CONSUMERS, options['batch_size'])
+            except Exception:
+                if options['once']:
+                    raise
+                logger.exception("Relaying outbox events failed, retrying in %ss", retry_delay)
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 30)
+                continue
+            retry_delay = options['interval']
+            if relayed:
+                logger.debug("Relayed %d outbox events", relayed)
+            if relayed < options['batch_size']:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+
+    def stop(self, signum, frame):
+        # Finishes the batch in progress
+        self.running = False
@@ -0,0 +1,342 @@
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from friends import blocks, counters, graph, outbox, suggestions
+
+# Serializes the relationship changes of a user: sending, accepting and
+# blocking take the locks of the users involved, in id order, before reading
+# or writing their rows, so the mutual friend counts, which depend on the
+# friends of both users, and the counters see every committed change
+USER_LOCK_SQL = """
+    SELECT pg_advisory_xact_lock(hashtextextended('friends:' || locked.id, 0))
+    FROM (SELECT DISTINCT id FROM unnest(%s::bigint[]) AS input(id) ORDER BY id) locked
+"""
+
+# Blocking as one statement: removes the friendship and the pending requests
+# of the pair, stores the block, moves the counters of both users and writes
+# the outbox events
+BLOCK_SQL = """
+    WITH target AS (
+        SELECT id FROM users_appuser WHERE id = %(b)s
+    ), removed_friendships AS (
+        DELETE FROM friends_friendship
+        WHERE (user_id = %(a)s AND friend_id = %(b)s) OR (user_id = %(b)s AND friend_id = %(a)s)
+        RETURNING user_id
+    ), removed_requests AS (
+        DELETE FROM friends_friendrequest
+        WHERE status = 'PENDING' AND (
+            (sender_id = %(a)s AND receiver_id = %(b)s) OR (sender_id = %(b)s AND receiver_id = %(a)s)
+        )
+        RETURNING id, sender_id, receiver_id
+    ), blocked AS (
+        INSERT INTO friends_blockeduser (user_id, blocked_user_id, created_at)
+        SELECT %(a)s, id, NOW() FROM target
+        ON CONFLICT (user_id, blocked_user_id) DO NOTHING
+        RETURNING user_id
+    ), counted AS (
+        UPDATE users_appuser u SET
+            friend_count = GREATEST(u.friend_count - (SELECT COUNT(*) FROM removed_friendships r WHERE r.user_id = u.id), 0),
+            pending_incoming_count = GREATEST(u.pending_incoming_count - (SELECT COUNT(*) FROM removed_requests r WHERE r.receiver_id = u.id), 0),
+            blocked_count = u.blocked_count + (SELECT COUNT(*) FROM blocked b WHERE b.user_id = u.id)
+        WHERE u.id IN (%(a)s, %(b)s)
+    ), events AS (
+        INSERT INTO friends_outboxevent (topic, payload, created_at)
+        SELECT 'user.blocked', jsonb_build_object('user_id', %(a)s::bigint, 'blocked_user_id', %(b)s::bigint), NOW() FROM blocked
+        UNION ALL
+        SELECT 'friendship.removed', jsonb_build_object('user_id', %(a)s::bigint, 'friend_id', %(b)s::bigint), NOW()
+        WHERE EXISTS (SELECT 1 FROM removed_friendships)
+        UNION ALL
+        SELECT 'friend_request.deleted', jsonb_build_object('request_id', id, 'sender_id', sender_id, 'receiver_id', receiver_id), NOW()
+        FROM removed_requests
+    )
+    SELECT
+        EXISTS (SELECT 1 FROM target),
+        EXISTS (SELECT 1 FROM removed_friendships),
+        EXISTS (SELECT 1 FROM blocked)
+"""
+
+UNBLOCK_SQL = """
+    WITH removed AS (
+        DELETE FROM friends_blockeduser WHERE user_id = %(a)s AND blocked_user_id = %(b)s
+        RETURNING user_id
+    ), events AS (
+        INSERT INTO friends_outboxevent (topic, payload, created_at)
+        SELECT 'user.unblocked', jsonb_build_object('user_id', %(a)s::bigint, 'blocked_user_id', %(b)s::bigint), NOW() FROM removed
+    )
+    UPDATE users_appuser u SET blocked_count = GREATEST(u.blocked_count - 1, 0)
+    FROM removed WHERE u.id = removed.user_id
+"""
+
+
+def lock_users(user_ids) -> None:
+    """
+    Takes the transaction-level advisory locks of the users, held until
+    the transaction ends.
+
+    Must run in a transaction, before the relationships of the users are
+    read or written.
+    """
+    user_ids = list(user_ids)
+    if user_ids:
+        with connection.cursor() as cursor:
+            cursor.execute(USER_LOCK_SQL, [user_ids])
+
+
+class FriendRequestManager(models.Manager):
+    """
+    Custom manager for friend requests, answering every precondition of a
+    new request in one query and creating requests without races.
+    """
+
+    def pending_for(self, receiver_id: int, search_query: str = ''):
+        pending_requests = self.filter(receiver_id=receiver_id, status='PENDING').order_by('-created_at')
+        if search_query:
+            pending_requests = pending_requests.filter(
+                Q(sender__email__icontains=search_query) |
+                Q(sender__first_name__icontains=search_query) |
+                Q(sender__last_name__icontains=search_query)
+            )
+        return pending_requests
+
+    def eligibility_queryset(self, sender_id: int, receiver_ids: list):
+        User = apps.get_model(settings.AUTH_USER_MODEL)
+        BlockedUser = apps.get_model('friends', 'BlockedUser')
+        Friendship = apps.get_model('friends', 'Friendship')
+
+        return User.objects.filter(id__in=receiver_ids).annotate(
+            is_blocked=Exists(BlockedUser.objects.filter(user=OuterRef('pk'), blocked_user_id=sender_id)),
+            pending_sent=Exists(self.filter(sender_id=sender_id, receiver=OuterRef('pk'), status='PENDING')),
+            pending_received=Exists(self.filter(sender=OuterRef('pk'), receiver_id=sender_id, status='PENDING')),
+            are_friends=Exists(Friendship.objects.filter(user_id=sender_id, friend=OuterRef('pk'))),
+        ).values('id', 'email', 'is_blocked', 'pending_sent', 'pending_received', 'are_friends')
+
+    def eligibility(self, sender_id: int, receiver_ids: list) -> dict:
+        """
+        Looks up the receivers together with every reason a request to them
+        could be refused, in a single annotated query.
+
+        Args:
+            sender_id (int): Id of the user sending the requests.
+            receiver_ids (list): Ids of the candidate receivers.
+
+        Returns:
+            dict: Receiver id mapped to a dict with the receiver ``email`` and
+            the ``is_blocked``, ``pending_sent``, ``pending_received`` and
+            ``are_friends`` flags. Unknown receivers are missing from it.
+        """
+        rows = self.eligibility_queryset(sender_id, receiver_ids)
+        return {row['id']: row for row in rows}
+
+    def send(self, sender_id: int, receiver_ids: list) -> list:
+        """
+        Creates pending requests with ``INSERT ... ON CONFLICT``.
+
+        A resolved request between the same pair is reopened instead of
+        raising an ``IntegrityError``, and two concurrent sends of the same
+        request collapse into one row. The pending counts of the receivers
+        grow by the requests that became pending.
+
+        Args:
+            sender_id (int): Id of the user sending the requests.
+            receiver_ids (list): Ids of receivers that passed validation.
+
+        Returns:
+            list: The created or reopened friend requests, without those
+            that were already pending or whose receiver blocked the sender.
+        """
+        if not receiver_ids:
+            return []
+        table = self.model._meta.db_table
+        fields = ['id', 'sender_id', 'receiver_id', 'status', 'created_at', 'updated_at']
+        placeholders = ', '.join(['(%s::bigint, %s::bigint)'] * len(receiver_ids))
+        with transaction.atomic(), connection.cursor() as cursor:
+            lock_users([sender_id, *receiver_ids])
+            # Checked again under the locks, a block may have landed since validation
+            cursor.execute(
+                f"INSERT INTO {table} (sender_id, receiver_id, status, created_at, updated_at) "
+                f"SELECT pair.sender_id, pair.receiver_id, 'PENDING', NOW(), NOW() FROM (VALUES {placeholders}) pair (sender_id, receiver_id) "
+                "WHERE NOT EXISTS (SELECT 1 FROM friends_blockeduser b WHERE b.user_id = pair.receiver_id AND b.blocked_user_id = pair.sender_id) "
+                "ON CONFLICT (sender_id, receiver_id) DO UPDATE "
+                "SET status = EXCLUDED.status, created_at = EXCLUDED.created_at, updated_at = EXCLUDED.updated_at "
+                f"WHERE {table}.status <> 'PENDING' RETURNING {', '.join(fields)}",
+                [value for receiver_id in receiver_ids for value in (sender_id, receiver_id)],
+            )
+            friend_requests = [self.model.from_db(self.db, fields, row) for row in cursor.fetchall()]
+            counters.increment(counters.PENDING_INCOMING, *(friend_request.receiver_id for friend_request in friend_requests))
+            outbox.record([
+                (outbox.FRIEND_REQUEST_SENT, outbox.request_payload(friend_request.id, sender_id, friend_request.receiver_id))
+                for friend_request in friend_requests
+            ])
+        return friend_requests
+
+    def resolve(self, request_ids: list, status: str) -> list:
+        """
+        Sets the status of friend requests, lowering the pending counts of
+        the receivers of those that were pending.
+
+        Returns:
+            list: The ids of the requests updated, without those that no
+            longer exist.
+        """
+        with transaction.atomic():
+            # Locked so a concurrent resolve of the same request does not count it twice
+            rows = list(self.filter(id__in=request_ids).select_for_update().values_list('id', 'sender_id', 'receiver_id', 'status'))
+            resolved = [pk for pk, _, _, _ in rows]
+            self.filter(id__in=resolved).update(status=status, updated_at=timezone.now())
+            counters.decrement(counters.PENDING_INCOMING, *(receiver_id for _, _, receiver_id, old_status in rows if old_status == 'PENDING'))
+            topic = f'friend_request.{status.lower()}'
+            outbox.record([(topic, outbox.request_payload(*row[:3])) for row in rows])
+        return resolved
+
+    def discard(self, condition: Q) -> int:
+        """
+        Deletes the friend requests matching ``condition``, lowering the
+        pending counts of the receivers of those that were pending.
+
+        Returns:
+            int: The number of requests deleted.
+        """
+        with transaction.atomic():
+            rows = list(self.filter(condition).select_for_update().values_list('id', 'sender_id', 'receiver_id', 'status'))
+            if not rows:
+                return 0
+            deleted, _ = self.filter(id__in=[pk for pk, _, _, _ in rows]).delete()
+            counters.decrement(counters.PENDING_INCOMING, *(receiver_id for _, _, receiver_id, old_status in rows if old_status == 'PENDING'))
+            outbox.record([(outbox.FRIEND_REQUEST_DELETED, outbox.request_payload(*row[:3])) for row in rows])
+        return deleted
+
+
+class FriendshipManager(models.Manager):
+    """
+    Custom manager keeping friendships symmetric: every friendship is stored
+    as exactly two rows, ``(a, b)`` and ``(b, a)``, written and removed in a
+    single statement so both "list my friends" and "are we friends" are one
+    lookup on the ``(user, friend)`` index. Callers run it inside a
+    transaction so the mutual friend counts and the friend counters change
+    atomically with it.
+    """
+
+    def friends_of(self, user_id: int, search_query: str = ''):
+        friendships = self.filter(user_id=user_id).select_related('friend')
+        if search_query:
+            friendships = friendships.filter(
+                Q(friend__email__icontains=search_query) |
+                Q(friend__first_name__icontains=search_query) |
+                Q(friend__last_name__icontains=search_query)
+            )
+        return friendships.order_by('friend__first_name', 'friend__last_name')
+
+    def befriend_many(self, pairs: list) -> list:
+        """
+        Stores both directions of every ``(user_id, friend_id)`` pair in one
+        ``INSERT``, ignoring pairs that are already friends or blocked one
+        another, and updates the mutual friend counts and friend counters
+        of the new friendships.
+
+        Returns:
+            list: The ``(user_id, friend_id)`` pairs that were not friends yet.
+        """
+        if not pairs:
+            return []
+        rows = []
+        for user_id, friend_id in pairs:
+            rows += [(user_id, friend_id), (friend_id, user_id)]
+        placeholders = ', '.join(['(%s::bigint, %s::bigint)'] * len(rows))
+        lock_users(user_id for pair in pairs for user_id in pair)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.model._meta.db_table} (user_id, friend_id, created_at) "
+                f"SELECT pair.user_id, pair.friend_id, NOW() FROM (VALUES {placeholders}) pair (user_id, friend_id) "
+                # Users who blocked one another cannot become friends
+                "WHERE NOT EXISTS (SELECT 1 FROM friends_blockeduser b WHERE "
+                "(b.user_id = pair.user_id AND b.blocked_user_id = pair.friend_id) OR (b.user_id = pair.friend_id AND b.blocked_user_id = pair.user_id)) "
+                "ON CONFLICT (user_id, friend_id) DO NOTHING RETURNING user_id, friend_id",
+                [value for row in rows for value in row],
+            )
+            created = [(user_id, friend_id) for user_id, friend_id in cursor.fetchall() if user_id < friend_id]
+
+        suggestions.friendships_added(created)
+        counters.increment(counters.FRIENDS, *(user_id for pair in created for user_id in pair))
+        if created:
+            # Raw SQL skips the signals, the outbox consumers only catch up later
+            transaction.on_commit(lambda: graph.invalidate(*(user_id for pair in created for user_id in pair)))
+        outbox.record([(outbox.FRIENDSHIP_CREATED, {'user_id': user_id, 'friend_id': friend_id}) for user_id, friend_id in created])
+        return created
+
+    def befriend(self, user_id: int, friend_id: int) -> bool:
+        return bool(self.befriend_many([(user_id, friend_id)]))
+
+    def unfriend(self, user_id: int, friend_id: int) -> int:
+        """
+        Removes both directions of a friendship in one ``DELETE``.
+
+        Returns:
+            int: The number of rows deleted, 0 if they were not friends.
+        """
+        lock_users([user_id, friend_id])
+        deleted, _ = self.filter(
+            Q(user_id=user_id, friend_id=friend_id) | Q(user_id=friend_id, friend_id=user_id)
+        ).delete()
+        if deleted:
+            suggestions.friendship_removed(user_id, friend_id)
+            counters.decrement(counters.FRIENDS, user_id, friend_id)
+            # The delete signals dropped the graphs before commit, a concurrent read may have cached them again
+            transaction.on_commit(lambda: graph.invalidate(user_id, friend_id))
+            outbox.record([(outbox.FRIENDSHIP_REMOVED, {'user_id': user_id, 'friend_id': friend_id})])
+        return deleted
+
+
+class BlockedUserManager(models.Manager):
+    """
+    Custom manager blocking and unblocking users in single statements, so
+    a block never leaves a friendship or a pending request of the pair
+    behind, even when it races with an accept.
+    """
+
+    def block(self, user_id: int, blocked_user_id: int):
+        """
+        Blocks a user: removes the friendship and the pending friend
+        requests between the two users and stores the block, with the
+        counters of both users, in one writable CTE run under the locks of
+        both users. Blocking twice is a no-op. Being raw SQL it skips the
+        signals, so the friend graphs of both users and the blocked-by set
+        of the blocked user are dropped once it commits.
+
+        Args:
+            user_id (int): Id of the user blocking.
+            blocked_user_id (int): Id of the user being blocked.
+
+        Returns:
+            bool: Whether a new block was stored, or None if the user to
+            block does not exist.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            lock_users([user_id, blocked_user_id])
+            cursor.execute(BLOCK_SQL, {'a': user_id, 'b': blocked_user_id})
+            exists, unfriended, blocked = cursor.fetchone()
+            if unfriended:
+                suggestions.friendship_removed(user_id, blocked_user_id)
+            if unfriended or blocked:
+                transaction.on_commit(lambda: graph.invalidate(user_id, blocked_user_id))
+            if blocked:
+                # Hides the blocker from the listings of the blocked user right away
+                transaction.on_commit(lambda: blocks.invalidate(blocked_user_id))
+        return blocked if exists else None
+
+    def unblock(self, user_id: int, blocked_user_id: int) -> bool:
+        """
+        Removes a block and lowers the blocked counter in one statement.
+        Unblocking a user who is not blocked is a no-op.
+
+        Returns:
+            bool: Whether a block was removed.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(UNBLOCK_SQL, {'a': user_id, 'b': blocked_user_id})
+            unblocked = cursor.rowcount > 0
+            if unblocked:
+                transaction.on_commit(lambda: graph.invalidate(user_id, blocked_user_id))
+                transaction.on_commit(lambda: blocks.invalidate(blocked_user_id))
+        return unblocked
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blockeduser',
+            index=models.Index(fields=['blocked_user', 'user'], name='blocked_reverse_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blockeduser',
+            index=models.Index(fields=['user', '-created_at', 'id'], name='blocked_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendrequest',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['receiver', '-created_at', 'id'], name='friendreq_pending_recv_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['friend', 'user'], name='friendship_reverse_idx'),
+        ),
+    ]
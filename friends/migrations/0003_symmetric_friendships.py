@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0002_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Accepting a request used to store only the receiver -> sender row
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO friends_friendship (user_id, friend_id, created_at)
+                SELECT friend_id, user_id, created_at FROM friends_friendship
+                ON CONFLICT (user_id, friend_id) DO NOTHING
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='friendship',
+            constraint=models.CheckConstraint(condition=models.Q(('user', models.F('friend')), _negated=True), name='friendship_not_self'),
+        ),
+    ]
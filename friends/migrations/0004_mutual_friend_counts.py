@@ -0,0 +1,41 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0003_symmetric_friendships'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MutualFriendCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-count', 'other'], name='mutual_user_count_idx')],
+                'unique_together': {('user', 'other')},
+            },
+        ),
+        # Seed the counts from the existing friendships
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO friends_mutualfriendcount (user_id, other_id, count)
+                SELECT f1.user_id, f2.friend_id, COUNT(*)
+                FROM friends_friendship f1
+                JOIN friends_friendship f2 ON f2.user_id = f1.friend_id
+                WHERE f2.friend_id <> f1.user_id
+                GROUP BY f1.user_id, f2.friend_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0005_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendRequestArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('sender_id', models.BigIntegerField()),
+                ('receiver_id', models.BigIntegerField()),
+                ('status', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'friends_friendrequestarchive',
+                'managed': False,
+            },
+        ),
+        # Partitioned tables cannot be described to the ORM, partitions are
+        # created by archive_friend_requests as rows reach them
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE friends_friendrequestarchive (
+                    id bigint NOT NULL,
+                    sender_id bigint NOT NULL,
+                    receiver_id bigint NOT NULL,
+                    status varchar(20) NOT NULL,
+                    created_at timestamp with time zone NOT NULL,
+                    updated_at timestamp with time zone NOT NULL,
+                    archived_at timestamp with time zone NOT NULL,
+                    PRIMARY KEY (id, updated_at)
+                ) PARTITION BY RANGE (updated_at);
+                CREATE INDEX friendreq_archive_sender_idx ON friends_friendrequestarchive (sender_id);
+                CREATE INDEX friendreq_archive_receiver_idx ON friends_friendrequestarchive (receiver_id);
+            """,
+            reverse_sql="DROP TABLE friends_friendrequestarchive",
+        ),
+        migrations.AddIndex(
+            model_name='friendrequest',
+            index=models.Index(condition=models.Q(('status', 'PENDING'), _negated=True), fields=['updated_at'], name='friendreq_resolved_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from friends.managers import BlockedUserManager, FriendRequestManager, FriendshipManager
 
 class FriendRequest(models.Model):
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='sent_requests', on_delete=models.CASCADE)
@@ -12,22 +13,94 @@ class FriendRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = FriendRequestManager()
+
     class Meta:
         unique_together = ('sender', 'receiver')
+        indexes = [
+            # Incoming pending requests, newest first (PendingFriendRequestAPIView)
+            models.Index(
+                fields=['receiver', '-created_at', 'id'],
+                condition=models.Q(status='PENDING'),
+                name='friendreq_pending_recv_idx',
+            ),
+            # Resolved requests, oldest first, for archive_friend_requests
+            models.Index(
+                fields=['updated_at'],
+                condition=~models.Q(status='PENDING'),
+                name='friendreq_resolved_idx',
+            ),
+        ]
+
+class FriendRequestArchive(models.Model):
+    """
+    Resolved friend requests moved out of ``FriendRequest`` by
+    ``archive_friend_requests``, in a table range partitioned by month of
+    ``updated_at``, created with its partitions by ``friends.retention``.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    sender_id = models.BigIntegerField()
+    receiver_id = models.BigIntegerField()
+    status = models.CharField(max_length=20)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'friends_friendrequestarchive'
 
 class Friendship(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='friendships', on_delete=models.CASCADE)
-    friend = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Neither indexed nor constrained: every lookup by friend is served by the
+    # reverse row through the (user, friend) index, deletes included (see friends.signals)
+    friend = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_index=False, db_constraint=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Every friendship is stored in both directions, see FriendshipManager
+    objects = FriendshipManager()
+
     class Meta:
         unique_together = ('user', 'friend')
+        constraints = [
+            models.CheckConstraint(condition=~models.Q(user=models.F('friend')), name='friendship_not_self'),
+        ]
 
 class BlockedUser(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='blocked_users', on_delete=models.CASCADE)
-    blocked_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Indexed as the leading column of blocked_reverse_idx
+    blocked_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = BlockedUserManager()
+
     class Meta:
         unique_together = ('user', 'blocked_user')
+        indexes = [
+            # Users who blocked a given user (UsersAPIView, UserSearchAPIView)
+            models.Index(fields=['blocked_user', 'user'], name='blocked_reverse_idx'),
+            # Blocked list, newest first (BlockedUserListAPIView)
+            models.Index(fields=['user', '-created_at', 'id'], name='blocked_user_created_idx'),
+        ]
+
+class MutualFriendCount(models.Model):
+    """Number of friends two users have in common, stored for both orderings of the pair."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    other = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        unique_together = ('user', 'other')
+        indexes = [
+            # Suggestions of a user, most mutual friends first
+            models.Index(fields=['user', '-count', 'other'], name='mutual_user_count_idx'),
+        ]
+
+class OutboxEvent(models.Model):
+    """
+    A change to friendships, friend requests or blocks, written in the
+    transaction that made it and moved downstream by ``relay_outbox``.
+    """
+    topic = models.CharField(max_length=64)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,178 @@
+import asyncio, json, logging, os, threading
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger()
+
+# "redis" fans out through Redis pub/sub, "memory" only reaches listeners of
+# the same process and "none" turns notifications off; anything else is the
+# dotted path of a broker class
+NOTIFICATIONS_BROKER = os.getenv("NOTIFICATIONS_BROKER", "redis" if settings.REDIS_HOST else "none")
+NOTIFICATIONS_CHANNEL_PREFIX = os.getenv("NOTIFICATIONS_CHANNEL_PREFIX", "friends:notify:")
+# Events a slow listener may fall behind by before newer ones are dropped for it
+NOTIFICATIONS_QUEUE_SIZE = int(os.getenv("NOTIFICATIONS_QUEUE_SIZE", 100))
+NOTIFICATIONS_RECONNECT_INTERVAL = float(os.getenv("NOTIFICATIONS_RECONNECT_INTERVAL", 1))
+# Seconds between comments keeping idle streams open through proxies
+NOTIFICATIONS_HEARTBEAT_INTERVAL = float(os.getenv("NOTIFICATIONS_HEARTBEAT_INTERVAL", 15))
+
+
+def deliver(queue: asyncio.Queue, event: dict) -> None:
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        logger.warning("Dropped %s event %s for a listener that fell behind", event['topic'], event['id'])
+
+
+class MemoryBroker:
+    """
+    Delivers events to the listeners of the current process, for tests; it
+    cannot serve streams, see ``streams_enabled``. ``publish`` may be called
+    from any thread, events are handed to each listener on its own event loop.
+    """
+
+    def __init__(self):
+        self.listeners = {}
+        self.lock = threading.Lock()
+
+    def publish(self, user_id: int, event: dict) -> None:
+        with self.lock:
+            listeners = list(self.listeners.get(user_id, ()))
+        for loop, queue in listeners:
+            loop.call_soon_threadsafe(deliver, queue, event)
+
+    async def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(NOTIFICATIONS_QUEUE_SIZE)
+        with self.lock:
+            self.listeners.setdefault(user_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    async def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        with self.lock:
+            listeners = self.listeners.get(user_id, set())
+            listeners.discard((asyncio.get_running_loop(), queue))
+            if not listeners:
+                self.listeners.pop(user_id, None)
+
+
+class RedisBroker:
+    """
+    Fans events out through Redis pub/sub, one channel per user.
+
+    Each worker holds a single pub/sub connection, subscribed to the
+    channels of the users it has listeners for, and a reader task handing
+    messages to their queues; idle listeners cost a queue, not a
+    connection. Events published while the connection is down are lost,
+    clients catch up by listing their pending requests when they reconnect.
+    """
+
+    def __init__(self, url: str = None, prefix: str = NOTIFICATIONS_CHANNEL_PREFIX):
+        import redis
+        url = url or os.getenv("NOTIFICATIONS_REDIS_URL") or settings.CACHES['default'].get('LOCATION')
+        if not url or not url.startswith('redis'):
+            raise ImproperlyConfigured("The redis notifications broker needs REDIS_HOST or NOTIFICATIONS_REDIS_URL")
+        self.url = url
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url)
+        self.listeners = {}
+        self.pubsub = None
+        self.reader = None
+
+    def channel(self, user_id: int) -> str:
+        return f'{self.prefix}{user_id}'
+
+    def publish(self, user_id: int, event: dict) -> None:
+        self.client.publish(self.channel(user_id), json.dumps(event, default=str))
+
+    async def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(NOTIFICATIONS_QUEUE_SIZE)
+        listeners = self.listeners.setdefault(user_id, set())
+        listeners.add(queue)
+        if len(listeners) == 1:
+            try:
+                await self.connect()
+                await self.pubsub.subscribe(self.channel(user_id))
+            except Exception:
+                self.listeners.pop(user_id, None)
+                raise
+        if self.reader is None or self.reader.done():
+            self.reader = asyncio.create_task(self.read())
+        return queue
+
+    async def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        listeners = self.listeners.get(user_id, set())
+        listeners.discard(queue)
+        if not listeners and self.listeners.pop(user_id, None) is not None and self.pubsub is not None:
+            try:
+                await self.pubsub.unsubscribe(self.channel(user_id))
+            except Exception as e:
+                logger.warning("Could not unsubscribe from notifications of user %s: %s", user_id, e)
+
+    async def connect(self) -> None:
+        if self.pubsub is None:
+            import redis.asyncio
+            self.pubsub = redis.asyncio.Redis.from_url(self.url).pubsub(ignore_subscribe_messages=True)
+
+    async def read(self) -> None:
+        # Returns once the last channel is unsubscribed, the next subscribe starts it again
+        while True:
+            try:
+                async for message in self.pubsub.listen():
+                    if message['type'] == 'message':
+                        user_id = int(message['channel'][len(self.prefix):])
+                        event = json.loads(message['data'])
+                        for queue in list(self.listeners.get(user_id, ())):
+                            deliver(queue, event)
+            except Exception as e:
+                logger.warning("Lost the notifications connection, reconnecting: %s", e)
+            if not self.listeners:
+                return
+            await asyncio.sleep(NOTIFICATIONS_RECONNECT_INTERVAL)
+            await self.resubscribe()
+
+    async def resubscribe(self) -> None:
+        pubsub, self.pubsub = self.pubsub, None
+        try:
+            await pubsub.aclose()
+        except Exception:
+            pass
+        await self.connect()
+        if self.listeners:
+            try:
+                await self.pubsub.subscribe(*(self.channel(user_id) for user_id in self.listeners))
+            except Exception as e:
+                logger.warning("Could not resubscribe to notifications: %s", e)
+
+
+BROKERS = {'memory': MemoryBroker, 'redis': RedisBroker}
+
+_broker = None
+
+
+def streams_enabled() -> bool:
+    """
+    Whether friend request streams are served.
+
+    Events are published by ``relay_outbox``, which runs as a process of its
+    own, so the memory broker would never reach the listeners of the ASGI
+    workers; serving streams with it is refused rather than silently mute.
+
+    Raises:
+        ImproperlyConfigured: When the memory broker is configured.
+    """
+    if NOTIFICATIONS_BROKER == 'memory':
+        raise ImproperlyConfigured(
+            "Friend request streams cannot use the memory notifications broker, relay_outbox publishes from "
+            "another process; set REDIS_HOST or NOTIFICATIONS_REDIS_URL, or NOTIFICATIONS_BROKER=none"
+        )
+    return NOTIFICATIONS_BROKER != 'none'
+
+
+def get_broker():
+    """Returns the broker of this process, created on first use, or None when notifications are off."""
+    global _broker
+    if NOTIFICATIONS_BROKER == 'none':
+        return None
+    if _broker is None:
+        _broker = BROKERS[NOTIFICATIONS_BROKER]() if NOTIFICATIONS_BROKER in BROKERS else import_string(NOTIFICATIONS_BROKER)()
+    return _broker
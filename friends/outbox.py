@@ -0,0 +1,132 @@
+import json, logging, os
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger()
+
+# "redis" appends to a Redis stream, "file" to a JSON lines file, "none" only
+# runs the consumers; anything else is the dotted path of a sink class
+OUTBOX_SINK = os.getenv("OUTBOX_SINK", "redis" if settings.REDIS_HOST else "file")
+OUTBOX_STREAM = os.getenv("OUTBOX_STREAM", "friends:events")
+OUTBOX_STREAM_MAXLEN = int(os.getenv("OUTBOX_STREAM_MAXLEN", 100000))
+OUTBOX_FILE = os.getenv("OUTBOX_FILE", os.path.join(settings.BASE_DIR, 'logs', 'events.jsonl'))
+
+FRIEND_REQUEST_SENT = 'friend_request.sent'
+FRIEND_REQUEST_ACCEPTED = 'friend_request.accepted'
+FRIEND_REQUEST_REJECTED = 'friend_request.rejected'
+FRIEND_REQUEST_DELETED = 'friend_request.deleted'
+FRIENDSHIP_CREATED = 'friendship.created'
+FRIENDSHIP_REMOVED = 'friendship.removed'
+USER_BLOCKED = 'user.blocked'
+USER_UNBLOCKED = 'user.unblocked'
+
+# Hands out the oldest events, skipping those another relay is working on;
+# they are only gone once the transaction that published them commits
+CLAIM_SQL = """
+    DELETE FROM friends_outboxevent
+    WHERE id IN (SELECT id FROM friends_outboxevent ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED)
+    RETURNING id, topic, payload, created_at
+"""
+
+
+def record(events: list) -> None:
+    """
+    Writes ``(topic, payload)`` events to the outbox.
+
+    Must run in the transaction that made the changes they describe, so an
+    event is relayed if and only if its change committed.
+    """
+    if events:
+        OutboxEvent = apps.get_model('friends', 'OutboxEvent')
+        OutboxEvent.objects.bulk_create([OutboxEvent(topic=topic, payload=payload) for topic, payload in events])
+
+
+def request_payload(request_id: int, sender_id: int, receiver_id: int) -> dict:
+    return {'request_id': request_id, 'sender_id': sender_id, 'receiver_id': receiver_id}
+
+
+class FileSink:
+    """
+    Appends events to a JSON lines file, a stand-in for a broker in
+    development. The file is never rotated, ``OUTBOX_SINK=none`` skips it.
+    """
+
+    def __init__(self, path: str = OUTBOX_FILE):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def publish(self, events: list) -> None:
+        with open(self.path, 'a', encoding='utf-8') as stream:
+            stream.write(''.join(json.dumps(event, default=str) + '\n' for event in events))
+
+
+class RedisStreamSink:
+    """
+    Appends events to a Redis stream, trimmed to about ``OUTBOX_STREAM_MAXLEN``
+    entries. Events may be appended twice if the relay fails after
+    publishing, consumers deduplicate on the event ``id``.
+    """
+
+    def __init__(self, url: str = None, stream: str = OUTBOX_STREAM, maxlen: int = OUTBOX_STREAM_MAXLEN):
+        import redis
+        url = url or os.getenv("OUTBOX_REDIS_URL") or settings.CACHES['default'].get('LOCATION')
+        if not url or not url.startswith('redis'):
+            raise ImproperlyConfigured("The redis outbox sink needs REDIS_HOST or OUTBOX_REDIS_URL")
+        self.client = redis.Redis.from_url(url)
+        self.stream = stream
+        self.maxlen = maxlen
+
+    def publish(self, events: list) -> None:
+        pipeline = self.client.pipeline(transaction=False)
+        for event in events:
+            pipeline.xadd(self.stream, {
+                'id': event['id'],
+                'topic': event['topic'],
+                'payload': json.dumps(event['payload']),
+                'created_at': event['created_at'],
+            }, maxlen=self.maxlen, approximate=True)
+        pipeline.execute()
+
+
+class NullSink:
+    def publish(self, events: list) -> None:
+        pass
+
+
+SINKS = {'file': FileSink, 'redis': RedisStreamSink, 'none': NullSink}
+
+
+def get_sink(name: str = OUTBOX_SINK):
+    return SINKS[name]() if name in SINKS else import_string(name)()
+
+
+def relay(sink, consumers: list, batch_size: int = 500) -> int:
+    """
+    Moves the oldest events of the outbox to the consumers and the sink.
+
+    Events are deleted in the transaction that hands them over, so a batch
+    that fails is relayed again; consumers and sinks must be idempotent.
+    Several relays can run at once, each claiming different events.
+
+    Args:
+        sink: Object with a ``publish(events)`` method.
+        consumers (list): Callables receiving the batch of events.
+        batch_size (int): Maximum number of events moved.
+
+    Returns:
+        int: The number of events relayed.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(CLAIM_SQL, [batch_size])
+        events = [
+            {'id': pk, 'topic': topic, 'payload': payload if isinstance(payload, dict) else json.loads(payload), 'created_at': created_at.isoformat()}
+            for pk, topic, payload, created_at in sorted(cursor.fetchall())
+        ]
+        if events:
+            for consumer in consumers:
+                consumer(events)
+            sink.publish(events)
+    return len(events)
@@ -0,0 +1,164 @@
+import logging, os
+from datetime import datetime, timedelta, timezone
+from django.db import connection, transaction
+from core import metrics
+
+logger = logging.getLogger()
+
+# Days a resolved friend request stays in the live table
+FRIEND_REQUEST_RETENTION_DAYS = int(os.getenv("FRIEND_REQUEST_RETENTION_DAYS", 30))
+# Months of archived friend requests kept, 0 to keep them forever
+FRIEND_REQUEST_ARCHIVE_MONTHS = int(os.getenv("FRIEND_REQUEST_ARCHIVE_MONTHS", 0))
+# Longest a batch waits for a table lock, such as one held by a migration
+FRIEND_REQUEST_ARCHIVE_LOCK_TIMEOUT = os.getenv("FRIEND_REQUEST_ARCHIVE_LOCK_TIMEOUT", "1s")
+
+LIVE_TABLE = 'friends_friendrequest'
+ARCHIVE_TABLE = 'friends_friendrequestarchive'
+
+OLDEST_SQL = "SELECT MIN(updated_at) FROM friends_friendrequest WHERE status <> 'PENDING'"
+
+# Rows are claimed with SKIP LOCKED, so a batch never waits on requests
+# being answered or reopened, and stay locked only until the batch commits
+MOVE_SQL = """
+    WITH moved AS (
+        DELETE FROM friends_friendrequest
+        WHERE id IN (
+            SELECT id FROM friends_friendrequest
+            WHERE status <> 'PENDING' AND updated_at < %(cutoff)s
+            ORDER BY updated_at
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, sender_id, receiver_id, status, created_at, updated_at
+    )
+    INSERT INTO friends_friendrequestarchive (id, sender_id, receiver_id, status, created_at, updated_at, archived_at)
+    SELECT id, sender_id, receiver_id, status, created_at, updated_at, NOW() FROM moved
+"""
+
+PARTITIONS_SQL = """
+    SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'friends_friendrequestarchive'::regclass
+"""
+
+# Partitions are reported as their parent table
+TABLE_STATS_SQL = """
+    SELECT COALESCE(parent.relname, s.relname), SUM(s.n_live_tup), SUM(s.n_dead_tup),
+        SUM(pg_total_relation_size(s.relid)), SUM(s.n_tup_ins)
+    FROM pg_stat_user_tables s
+    LEFT JOIN pg_inherits i ON i.inhrelid = s.relid
+    LEFT JOIN pg_class parent ON parent.oid = i.inhparent
+    WHERE s.relname = 'friends_friendrequest' OR parent.relname = 'friends_friendrequestarchive'
+    GROUP BY 1
+"""
+
+
+def month_start(moment: datetime) -> datetime:
+    moment = moment.astimezone(timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def partition_name(month: datetime) -> str:
+    return f'{ARCHIVE_TABLE}_p{month:%Y_%m}'
+
+
+def set_lock_timeout(cursor, lock_timeout: str) -> None:
+    cursor.execute("SELECT set_config('lock_timeout', %s, true)", [lock_timeout])
+
+
+def create_partitions(cutoff: datetime, lock_timeout: str = FRIEND_REQUEST_ARCHIVE_LOCK_TIMEOUT) -> list:
+    """
+    Creates the monthly archive partitions the requests resolved before
+    ``cutoff`` belong to.
+
+    Returns:
+        list: The names of the partitions created.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(OLDEST_SQL)
+        oldest = cursor.fetchone()[0]
+        if oldest is None or oldest >= cutoff:
+            return []
+        cursor.execute(PARTITIONS_SQL)
+        existing = {name for name, in cursor.fetchall()}
+    created = []
+    month = month_start(oldest)
+    while month < cutoff:
+        name = partition_name(month)
+        if name not in existing:
+            # Bounds come from datetimes, DDL takes no query parameters
+            with transaction.atomic(), connection.cursor() as cursor:
+                set_lock_timeout(cursor, lock_timeout)
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {ARCHIVE_TABLE} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+                )
+            created.append(name)
+        month = next_month(month)
+    return created
+
+
+def archive(cutoff: datetime, batch_size: int = 1000, lock_timeout: str = FRIEND_REQUEST_ARCHIVE_LOCK_TIMEOUT) -> int:
+    """
+    Moves up to ``batch_size`` of the friend requests resolved before
+    ``cutoff`` to the archive, oldest first, in one short transaction.
+    Their partitions must exist, see ``create_partitions``.
+
+    Raises:
+        OperationalError: A table lock was not granted within ``lock_timeout``.
+
+    Returns:
+        int: The number of requests moved.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        set_lock_timeout(cursor, lock_timeout)
+        cursor.execute(MOVE_SQL, {'cutoff': cutoff, 'limit': batch_size})
+        return cursor.rowcount
+
+
+def drop_partitions(before: datetime, lock_timeout: str = FRIEND_REQUEST_ARCHIVE_LOCK_TIMEOUT) -> list:
+    """
+    Drops the archive partitions holding only requests resolved before
+    ``before``, which frees their space at once, unlike deleting rows.
+
+    Returns:
+        list: The names of the partitions dropped.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(PARTITIONS_SQL)
+        names = sorted(name for name, in cursor.fetchall())
+    dropped = []
+    for name in names:
+        month = datetime.strptime(name[-7:], '%Y_%m').replace(tzinfo=timezone.utc)
+        if next_month(month) <= before:
+            with transaction.atomic(), connection.cursor() as cursor:
+                set_lock_timeout(cursor, lock_timeout)
+                cursor.execute(f"DROP TABLE {name}")
+            dropped.append(name)
+    return dropped
+
+
+def vacuum() -> None:
+    """Makes the space of the archived rows reusable and refreshes planner statistics of the live table."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"VACUUM (ANALYZE) {LIVE_TABLE}")
+
+
+table_rows = metrics.Gauge('db_table_rows', 'Estimated rows of the table by state, dead rows are bloat until vacuumed.', ('table', 'state'))
+table_size = metrics.Gauge('db_table_size_bytes', 'Size of the table with its indexes and TOAST data.', ('table',))
+archived_rows = metrics.Gauge('friend_requests_archived', 'Friend requests moved to the archive since statistics were last reset.', ())
+
+
+def collect_table_stats() -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(TABLE_STATS_SQL)
+        stats = cursor.fetchall()
+    table_rows.replace({(table, state): int(value) for table, live, dead, _, _ in stats for state, value in (('live', live), ('dead', dead))})
+    table_size.replace({(table,): int(size) for table, _, _, size, _ in stats})
+    archived_rows.replace({(): int(inserted) for table, _, _, _, inserted in stats if table == ARCHIVE_TABLE})
+
+
+metrics.register(table_rows, table_size, archived_rows, collector=collect_table_stats)
@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from friends.models import FriendRequest, Friendship, BlockedUser
+from friends.models import FriendRequest, Friendship, BlockedUser, MutualFriendCount
 from users.serializer import AppUserSerializer
+from utils.serializers import ValuesSerializer
 
 User = get_user_model()
 
@@ -24,3 +25,15 @@ class BlockedUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = BlockedUser
         fields = ['id', 'blocked_user', 'created_at']
+
+class FriendSuggestionSerializer(serializers.ModelSerializer):
+    user = AppUserSerializer(source='other')
+    mutual_friends = serializers.IntegerField(source='count')
+
+    class Meta:
+        model = MutualFriendCount
+        fields = ['user', 'mutual_friends']
+
+# Read-only fast paths of the list endpoints, fed with .values() rows
+friendship_values = ValuesSerializer(FriendshipSerializer)
+blocked_user_values = ValuesSerializer(BlockedUserSerializer)
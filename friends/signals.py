@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from friends import blocks, counters, graph, suggestions
+from friends.models import FriendRequest, FriendRequestArchive, Friendship, BlockedUser
+
+
+@receiver([post_save, post_delete], sender=Friendship)
+def invalidate_friend_graph(sender, instance, **kwargs):
+    graph.invalidate(instance.user_id, instance.friend_id)
+
+
+@receiver([post_save, post_delete], sender=BlockedUser)
+def invalidate_blocked_friend_graph(sender, instance, **kwargs):
+    graph.invalidate(instance.user_id, instance.blocked_user_id)
+    blocks.invalidate(instance.blocked_user_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_friend_order(sender, instance, created, update_fields=None, **kwargs):
+    # Friend lists are ordered by name, so a rename reorders the lists it appears in
+    if created or (update_fields is not None and not {'first_name', 'last_name'} & set(update_fields)):
+        return
+    user_ids = Friendship.objects.filter(user=instance).values_list('friend_id', flat=True)
+    graph.invalidate(*user_ids)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def release_counters(sender, instance, **kwargs):
+    # The cascade deletes the user's rows with plain queries, so the counters
+    # of the users on the other side are lowered here
+    counters.decrement(counters.FRIENDS, *Friendship.objects.filter(user=instance).values_list('friend_id', flat=True))
+    counters.decrement(counters.PENDING_INCOMING, *FriendRequest.objects.filter(sender=instance, status='PENDING').values_list('receiver_id', flat=True))
+    counters.decrement(counters.BLOCKED, *BlockedUser.objects.filter(blocked_user=instance).values_list('user_id', flat=True))
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def release_mutual_friend_counts(sender, instance, **kwargs):
+    # The user was a mutual friend of every pair of their friends
+    suggestions.user_removed(instance.pk)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def forget_archived_requests(sender, instance, **kwargs):
+    # The archive has no foreign keys, so it is not part of the cascade
+    FriendRequestArchive.objects.filter(Q(sender_id=instance.pk) | Q(receiver_id=instance.pk)).delete()
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def delete_reverse_friendships(sender, instance, **kwargs):
+    # Friendship.friend is not part of the cascade, the rows naming the user
+    # as a friend are found through the reverse of their own rows
+    friend_ids = list(Friendship.objects.filter(user=instance).values_list('friend_id', flat=True))
+    Friendship.objects.filter(user_id__in=friend_ids, friend=instance).delete()
@@ -0,0 +1,134 @@
+from django.db import connection
+
+# Pairs whose mutual friend count changes when user %(a)s and user %(b)s
+# stop being friends: a with every friend of b and b with every friend of
+# a, in both directions.
+AFFECTED_PAIRS_SQL = """
+    SELECT %(a)s AS user_id, f.friend_id AS other_id FROM friends_friendship f WHERE f.user_id = %(b)s AND f.friend_id <> %(a)s
+    UNION ALL
+    SELECT f.friend_id, %(a)s FROM friends_friendship f WHERE f.user_id = %(b)s AND f.friend_id <> %(a)s
+    UNION ALL
+    SELECT %(b)s, f.friend_id FROM friends_friendship f WHERE f.user_id = %(a)s AND f.friend_id <> %(b)s
+    UNION ALL
+    SELECT f.friend_id, %(b)s FROM friends_friendship f WHERE f.user_id = %(a)s AND f.friend_id <> %(b)s
+"""
+
+# The affected pairs of a whole batch of new friendships, %(a)s and %(b)s
+# being the arrays of their two ends, counted once per new friendship
+INCREMENT_SQL = """
+    WITH added AS (
+        SELECT a, b FROM unnest(%(a)s::bigint[], %(b)s::bigint[]) AS added(a, b)
+        UNION ALL
+        SELECT b, a FROM unnest(%(a)s::bigint[], %(b)s::bigint[]) AS added(a, b)
+    )
+    INSERT INTO friends_mutualfriendcount (user_id, other_id, count)
+    SELECT pair.user_id, pair.other_id, COUNT(*) FROM (
+        SELECT added.a AS user_id, f.friend_id AS other_id FROM added JOIN friends_friendship f ON f.user_id = added.b AND f.friend_id <> added.a
+        UNION ALL
+        SELECT f.friend_id, added.a FROM added JOIN friends_friendship f ON f.user_id = added.b AND f.friend_id <> added.a
+    ) pair
+    GROUP BY pair.user_id, pair.other_id
+    ON CONFLICT (user_id, other_id) DO UPDATE SET count = friends_mutualfriendcount.count + EXCLUDED.count
+"""
+
+DECREMENT_SQL = f"""
+    UPDATE friends_mutualfriendcount m SET count = m.count - 1
+    FROM ({AFFECTED_PAIRS_SQL}) pair
+    WHERE m.user_id = pair.user_id AND m.other_id = pair.other_id
+"""
+
+# Takes back counts made twice within a batch, %s being the user_id and
+# other_id arrays of the pairs, a pair repeated once per extra count
+OVERCOUNT_SQL = """
+    UPDATE friends_mutualfriendcount m SET count = m.count - extra.n
+    FROM (
+        SELECT user_id, other_id, COUNT(*) AS n
+        FROM unnest(%s::bigint[], %s::bigint[]) AS pair(user_id, other_id)
+        GROUP BY user_id, other_id
+    ) extra
+    WHERE m.user_id = extra.user_id AND m.other_id = extra.other_id
+"""
+
+# Pairs of friends of user %(a)s, who stop having a as a mutual friend when a is deleted
+USER_REMOVED_SQL = """
+    UPDATE friends_mutualfriendcount m SET count = m.count - 1
+    FROM friends_friendship f1
+    JOIN friends_friendship f2 ON f2.user_id = f1.user_id AND f2.friend_id <> f1.friend_id
+    WHERE f1.user_id = %(a)s AND m.user_id = f1.friend_id AND m.other_id = f2.friend_id
+"""
+
+USER_REMOVED_PRUNE_SQL = """
+    DELETE FROM friends_mutualfriendcount
+    WHERE count <= 0 AND user_id IN (SELECT friend_id FROM friends_friendship WHERE user_id = %(a)s)
+"""
+
+PRUNE_SQL = """
+    DELETE FROM friends_mutualfriendcount
+    WHERE count <= 0 AND (user_id IN (%(a)s, %(b)s) OR other_id IN (%(a)s, %(b)s))
+"""
+
+REBUILD_SQL = """
+    INSERT INTO friends_mutualfriendcount (user_id, other_id, count)
+    SELECT f1.user_id, f2.friend_id, COUNT(*)
+    FROM friends_friendship f1
+    JOIN friends_friendship f2 ON f2.user_id = f1.friend_id
+    WHERE f2.friend_id <> f1.user_id
+    GROUP BY f1.user_id, f2.friend_id
+"""
+
+
+def friendships_added(pairs: list) -> None:
+    """
+    Updates the mutual friend counts after a batch of friendships was
+    stored in one statement, in one query whatever the size of the batch.
+
+    Each friendship of the batch sees all of the others, so two new
+    friendships sharing a user count their other ends as mutual friends
+    twice; the extra counts are taken back.
+    """
+    if not pairs:
+        return
+    new_friends = {}
+    for user_id, friend_id in pairs:
+        new_friends.setdefault(user_id, []).append(friend_id)
+        new_friends.setdefault(friend_id, []).append(user_id)
+    extra = [(a, b) for friends in new_friends.values() for a in friends for b in friends if a != b]
+    with connection.cursor() as cursor:
+        cursor.execute(INCREMENT_SQL, {'a': [a for a, _ in pairs], 'b': [b for _, b in pairs]})
+        if extra:
+            cursor.execute(OVERCOUNT_SQL, [[a for a, _ in extra], [b for _, b in extra]])
+
+
+def friendship_removed(user_id: int, friend_id: int) -> None:
+    """
+    Updates the mutual friend counts after two users stopped being friends.
+
+    Must run in the transaction that removed the friendship.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(DECREMENT_SQL, {'a': user_id, 'b': friend_id})
+        cursor.execute(PRUNE_SQL, {'a': user_id, 'b': friend_id})
+
+
+def user_removed(user_id: int) -> None:
+    """
+    Updates the mutual friend counts before a user is deleted, while their
+    friendships still exist. The counts of the user's own pairs go with the
+    cascade.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(USER_REMOVED_SQL, {'a': user_id})
+        cursor.execute(USER_REMOVED_PRUNE_SQL, {'a': user_id})
+
+
+def rebuild() -> int:
+    """
+    Recomputes every mutual friend count from the friendship table.
+
+    Returns:
+        int: The number of user pairs with at least one mutual friend.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM friends_mutualfriendcount')
+        cursor.execute(REBUILD_SQL)
+        return cursor.rowcount
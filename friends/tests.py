@@ -1,3 +1,523 @@
-from django.test import TestCase
+import asyncio, json, threading
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models import Q
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import db_router
+from friends import blocks, consumers, counters, graph, notifications, outbox, suggestions
+from friends.async_views import FriendRequestStreamAPIView
+from friends.management.commands.explain_queries import Command as ExplainQueriesCommand
+from friends.models import BlockedUser, FriendRequest, Friendship, MutualFriendCount, OutboxEvent
+from users.tokens import refresh_token_for
+from utils.pagination import KeysetPagination
+from utils.testing import assert_query_budget
+
+User = get_user_model()
+
+
+def create_users(count: int) -> list:
+    return [
+        User.objects.create_user(f'user{index}@example.com', None, first_name=f'First{index}', last_name=f'Last{index}')
+        for index in range(count)
+    ]
+
+
+class BulkFriendRequestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sender, self.pending, self.blocking, self.receiver = create_users(4)
+        self.client = APIClient()
+        self.client.force_authenticate(self.sender)
+
+    def test_receivers_refused_after_validation_get_their_own_result(self):
+        FriendRequest.objects.send(self.sender.id, [self.pending.id])
+        BlockedUser.objects.block(self.blocking.id, self.sender.id)
+        receiver_ids = [self.pending.id, self.blocking.id, self.receiver.id]
+
+        # As if the request and the block landed between validation and the insert
+        with mock.patch('friends.views.friend_request_error', return_value=None):
+            response = self.client.post(reverse('bulk-friend-requests'), {'receivers': receiver_ids}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['receiver'] for result in results], receiver_ids)
+        self.assertEqual([result['status'] for result in results], [400, 403, 201])
+
+
+class QueryPlanTests(TestCase):
+    """
+    Checks with EXPLAIN, under default planner settings, that the hot query
+    of each view uses its index once the tables hold more than a few rows.
+    Search plans are checked in users.tests.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(email=f'member{index}@example.com', first_name=f'First{index}', last_name=f'Last{index}')
+            for index in range(2000)
+        )
+        cls.user_id = users[0].id
+        ids = [user.id for user in users]
+        pairs = [(ids[index], ids[(index + offset) % len(ids)]) for index in range(len(ids)) for offset in range(1, 11)]
+        # The user the queries run for is a popular one, with pages of requests and blocks to read
+        pairs += [(user_id, cls.user_id) for user_id in ids[11:-10]] + [(cls.user_id, user_id) for user_id in ids[11:-10]]
+        FriendRequest.objects.bulk_create(
+            FriendRequest(sender_id=sender_id, receiver_id=receiver_id, status='PENDING' if index % 4 else 'ACCEPTED')
+            for index, (sender_id, receiver_id) in enumerate(pairs)
+        )
+        BlockedUser.objects.bulk_create(BlockedUser(user_id=user_id, blocked_user_id=blocked_user_id) for user_id, blocked_user_id in pairs)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE friends_friendrequest, friends_blockeduser, users_appuser")
+
+    def test_views_use_their_indexes(self):
+        for name, queryset, indexes in ExplainQueriesCommand().queries(self.user_id):
+            if name == 'UserSearchAPIView':
+                continue
+            with self.subTest(name):
+                plan = queryset.explain()
+                for index in indexes:
+                    self.assertIn(index, plan)
+
+    def test_command_explains_each_view(self):
+        out = StringIO()
+        call_command('explain_queries', user=self.user_id, search='first1', stdout=out)
+        for name, _, _ in ExplainQueriesCommand().queries(self.user_id):
+            self.assertIn(name, out.getvalue())
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Queries per request of the friends endpoints, which must not grow with
+    the number of rows listed or written. Reads are measured with warm
+    caches.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, *others = create_users(71)
+        friends, senders, blocked, strangers = others[:20], others[20:40], others[40:60], others[60:]
+        Friendship.objects.befriend_many([(cls.user.id, friend.id) for friend in friends])
+        Friendship.objects.befriend_many([(friend.id, stranger.id) for friend in friends[:10] for stranger in strangers])
+        for sender in senders:
+            FriendRequest.objects.send(sender.id, [cls.user.id])
+        for user in blocked:
+            BlockedUser.objects.block(cls.user.id, user.id)
+        cls.friend_id, cls.request_id = friends[0].id, FriendRequest.objects.filter(receiver=cls.user).values_list('id', flat=True).first()
+        cls.stranger_ids = [stranger.id for stranger in strangers]
+
+    def setUp(self):
+        cache.clear()
+        # Authentication loads the user with their counters, as they are now
+        self.user.refresh_from_db()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertBudget(self, budget, method, name, data=None, **kwargs):
+        path = reverse(name, kwargs=kwargs)
+        if method == 'get':
+            # The first request fills the caches the budgets assume
+            self.client.get(path, data)
+        response = assert_query_budget(self.client, method, path, budget, data=data, **({} if method == 'get' else {'format': 'json'}))
+        self.assertLess(response.status_code, 400, response.content)
+
+    def test_listings(self):
+        for budget, name in [(1, 'friend-list'), (1, 'pending-friend-requests'), (1, 'blocked-user-list'), (2, 'friend-suggestions')]:
+            with self.subTest(name):
+                self.assertBudget(budget, 'get', name)
+
+    def test_listings_by_page(self):
+        for budget, name in [(1, 'friend-list'), (1, 'pending-friend-requests'), (1, 'blocked-user-list'), (2, 'friend-suggestions')]:
+            with self.subTest(name):
+                self.assertBudget(budget, 'get', name, {'page': 2, 'page_size': 5})
+
+    def test_listings_by_cursor(self):
+        for budget, name in [(1, 'friend-list'), (1, 'pending-friend-requests'), (1, 'blocked-user-list'), (2, 'friend-suggestions')]:
+            with self.subTest(name):
+                self.assertBudget(budget, 'get', name, {'pagination': 'cursor', 'page_size': 5})
+
+    def test_searches(self):
+        self.assertBudget(2, 'get', 'friend-list', {'q': 'first'})
+        self.assertBudget(2, 'get', 'pending-friend-requests', {'q': 'first'})
+
+    def test_mutual_friends(self):
+        self.assertBudget(1, 'get', 'mutual-friends', user_id=self.friend_id)
+
+    def test_sending_requests(self):
+        self.assertBudget(9, 'post', 'bulk-friend-requests', {'receivers': self.stranger_ids})
+
+    def test_answering_requests(self):
+        self.assertBudget(8, 'post', 'friend-request-action', {'action': 'reject'}, pk=self.request_id)
+        self.assertBudget(19, 'post', 'bulk-friend-request-action', {'action': 'accept', 'requests': list(
+            FriendRequest.objects.filter(receiver=self.user, status='PENDING').values_list('id', flat=True))})
+
+    def test_blocking(self):
+        self.assertBudget(4, 'get', 'block-user', user_id=self.friend_id)
+        self.assertBudget(3, 'delete', 'block-user', user_id=self.friend_id)
+
+
+class FriendGraphInvalidationTests(TestCase):
+    """The raw SQL write paths drop cached graphs on commit, without waiting for the outbox relay."""
+
+    def setUp(self):
+        cache.clear()
+        self.alice, self.bob = create_users(2)
+
+    def write(self, func, *args):
+        graph.friend_ids(self.alice.id), graph.friend_ids(self.bob.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            func(*args)
+
+    def test_befriend_and_unfriend(self):
+        self.write(Friendship.objects.befriend, self.alice.id, self.bob.id)
+        self.assertEqual(graph.friend_ids(self.alice.id), [self.bob.id])
+        self.assertEqual(graph.friend_ids(self.bob.id), [self.alice.id])
+
+        self.write(Friendship.objects.unfriend, self.alice.id, self.bob.id)
+        self.assertEqual(graph.friend_ids(self.alice.id), [])
+        self.assertEqual(graph.friend_ids(self.bob.id), [])
+
+    def test_block_and_unblock(self):
+        Friendship.objects.befriend(self.alice.id, self.bob.id)
+        self.write(BlockedUser.objects.block, self.alice.id, self.bob.id)
+        self.assertEqual(graph.friend_ids(self.alice.id), [])
+        self.assertEqual(graph.friend_ids(self.bob.id), [])
+        self.assertEqual(blocks.blocked_by(self.bob.id), {self.alice.id})
+
+        self.write(BlockedUser.objects.unblock, self.alice.id, self.bob.id)
+        self.assertEqual(blocks.blocked_by(self.bob.id), frozenset())
+
+    def test_deleting_a_user_removes_both_directions(self):
+        Friendship.objects.befriend(self.alice.id, self.bob.id)
+        self.write(self.alice.delete)
+        self.assertFalse(Friendship.objects.filter(Q(user_id=self.alice.id) | Q(friend_id=self.alice.id)).exists())
+        self.assertEqual(graph.friend_ids(self.bob.id), [])
+
+
+class MutualFriendCountTests(TestCase):
+    """The incrementally maintained counts match a rebuild from the friendships."""
+
+    def setUp(self):
+        self.users = create_users(5)
+        self.ids = [user.id for user in self.users]
+
+    def assertCountsExact(self):
+        counts = set(MutualFriendCount.objects.values_list('user_id', 'other_id', 'count'))
+        suggestions.rebuild()
+        self.assertEqual(counts, set(MutualFriendCount.objects.values_list('user_id', 'other_id', 'count')))
+
+    def test_batch_sharing_users_counts_each_mutual_friend_once(self):
+        a, b, c, d, e = self.ids
+        Friendship.objects.befriend(a, e)
+        Friendship.objects.befriend_many([(a, b), (a, c), (b, c), (d, a), (d, b)])
+        self.assertCountsExact()
+        self.assertEqual(MutualFriendCount.objects.get(user_id=b, other_id=c).count, 1)
+        self.assertEqual(MutualFriendCount.objects.get(user_id=a, other_id=b).count, 2)
+
+    def test_deleting_a_user_releases_the_counts_they_were_part_of(self):
+        a, b, c, d, _ = self.ids
+        Friendship.objects.befriend_many([(a, b), (a, c), (a, d), (b, c)])
+        self.users[0].delete()
+        self.assertCountsExact()
+        self.assertFalse(MutualFriendCount.objects.filter(user_id=b, other_id=d).exists())
+
+
+class ConcurrentAcceptAndBlockTests(TransactionTestCase):
+    """
+    Accepts, blocks and repeated sends of the same pairs raced from threads,
+    each on its own connection, so the advisory locks and the checks made
+    under them are what keeps the pairs consistent.
+    """
+    PAIRS = 20
+
+    def setUp(self):
+        cache.clear()
+        users = create_users(2 * self.PAIRS)
+        self.pairs = list(zip(users[::2], users[1::2]))
+        self.requests = {sender.id: FriendRequest.objects.send(sender.id, [receiver.id])[0].id for sender, receiver in self.pairs}
+        self.barrier = threading.Barrier(len(self.pairs) * 3)
+
+    def call(self, user, method, name, data=None, **kwargs):
+        client = APIClient()
+        client.force_authenticate(user)
+        self.barrier.wait()
+        try:
+            return getattr(client, method)(reverse(name, kwargs=kwargs), data, format='json').status_code
+        finally:
+            connection.close()
+
+    def test_no_pair_ends_up_both_friends_and_blocked(self):
+        calls = []
+        for sender, receiver in self.pairs:
+            calls += [
+                (receiver, 'post', 'friend-request-action', {'action': 'accept'}, {'pk': self.requests[sender.id]}),
+                (sender, 'get', 'block-user', None, {'user_id': receiver.id}),
+                (receiver, 'post', 'bulk-friend-requests', {'receivers': [sender.id]}, {}),
+            ]
+        with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+            statuses = list(executor.map(lambda args: self.call(*args[:4], **args[4]), calls))
+        self.assertTrue(all(code < 500 for code in statuses), statuses)
+
+        for sender, receiver in self.pairs:
+            with self.subTest(pair=(sender.id, receiver.id)):
+                self.assertTrue(BlockedUser.objects.filter(user=sender, blocked_user=receiver).exists())
+                self.assertFalse(Friendship.objects.filter(user__in=[sender, receiver], friend__in=[sender, receiver]).exists())
+                self.assertFalse(FriendRequest.objects.filter(sender__in=[sender, receiver], receiver__in=[sender, receiver], status='PENDING').exists())
+                self.assertEqual(graph.friend_ids(sender.id), [])
+                self.assertEqual(graph.friend_ids(receiver.id), [])
+
+        with transaction.atomic():
+            self.assertEqual(counters.reconcile_users([user.id for pair in self.pairs for user in pair]), 0)
+        counts = set(MutualFriendCount.objects.values_list('user_id', 'other_id', 'count'))
+        suggestions.rebuild()
+        self.assertEqual(counts, set(MutualFriendCount.objects.values_list('user_id', 'other_id', 'count')))
+
+
+    def reconcile(self, user_ids):
+        self.barrier.wait()
+        try:
+            with transaction.atomic():
+                return counters.reconcile_users(user_ids)
+        finally:
+            connection.close()
+
+    def test_reconcile_does_not_deadlock_with_accepts(self):
+        # Accepting decrements the receiver, whose id is the higher, before incrementing the sender
+        user_ids = [user.id for pair in self.pairs for user in pair]
+        self.barrier = threading.Barrier(len(self.pairs) * 2)
+        with ThreadPoolExecutor(max_workers=len(self.pairs) * 2) as executor:
+            accepts = [
+                executor.submit(self.call, receiver, 'post', 'friend-request-action', {'action': 'accept'}, pk=self.requests[sender.id])
+                for sender, receiver in self.pairs
+            ]
+            reconciles = [executor.submit(self.reconcile, user_ids) for _ in self.pairs]
+            self.assertEqual([future.result() for future in accepts], [200] * len(self.pairs))
+            self.assertEqual([future.result() for future in reconciles], [0] * len(self.pairs))
+        self.assertEqual(Friendship.objects.count(), 2 * len(self.pairs))
+
+
+class OutboxRelayTests(TransactionTestCase):
+    """The claim, consumers, sink and delete cycle, each in a real transaction."""
+
+    def setUp(self):
+        sender, receiver = create_users(2)
+        FriendRequest.objects.send(sender.id, [receiver.id])
+        self.event_ids = list(OutboxEvent.objects.values_list('id', flat=True))
+        self.consumer = mock.Mock()
+        self.sink = mock.Mock()
+
+    def relayed_ids(self) -> list:
+        return [event['id'] for event in self.sink.publish.call_args.args[0]]
+
+    def test_sink_failure_rolls_back_the_claim_and_the_batch_is_relayed_again(self):
+        self.sink.publish.side_effect = ConnectionError("broker down")
+        with self.assertRaises(ConnectionError):
+            outbox.relay(self.sink, [self.consumer])
+        self.consumer.assert_called_once()
+        self.assertEqual(list(OutboxEvent.objects.values_list('id', flat=True)), self.event_ids)
+
+        self.sink.publish.side_effect = None
+        self.assertEqual(outbox.relay(self.sink, [self.consumer]), len(self.event_ids))
+        self.assertEqual(self.relayed_ids(), self.event_ids)
+        self.assertEqual(self.consumer.call_count, 2)
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(outbox.relay(self.sink, [self.consumer]), 0)
+
+    def test_consumer_failure_rolls_back_the_claim(self):
+        self.consumer.side_effect = RuntimeError("consumer failed")
+        with self.assertRaises(RuntimeError):
+            outbox.relay(self.sink, [self.consumer])
+        self.sink.publish.assert_not_called()
+        self.assertEqual(OutboxEvent.objects.count(), len(self.event_ids))
+
+    def test_relay_outbox_drains_the_outbox(self):
+        with mock.patch.object(outbox, 'get_sink', return_value=self.sink):
+            call_command('relay_outbox', once=True, batch_size=1)
+        self.assertEqual(self.sink.publish.call_count, len(self.event_ids))
+        self.assertFalse(OutboxEvent.objects.exists())
+
+@override_settings(DATABASE_REPLICAS=['replica_1'], DATABASE_ROUTERS=['core.db_router.ReplicaRouter'])
+class CacheFillRoutingTests(SimpleTestCase):
+    def test_cache_fills_read_from_the_primary_during_safe_requests(self):
+        token = db_router.current.set(db_router.ReadRouting(RequestFactory().get('/')))
+        try:
+            with mock.patch.object(db_router.monitor, 'is_healthy', return_value=True):
+                self.assertEqual(BlockedUser.objects.all().db, 'replica_1')
+                self.assertEqual(graph._rows(1).db, DEFAULT_DB_ALIAS)
+                self.assertEqual(blocks._rows(1).db, DEFAULT_DB_ALIAS)
+        finally:
+            db_router.current.reset(token)
+
+
+class KeysetCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, = create_users(1)
+
+    def test_cursor_of_the_wrong_types_is_not_found(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for name, position in [('pending-friend-requests', ['yesterday', 1]), ('friend-list', ['a', 'b', 'c'])]:
+            with self.subTest(name):
+                response = client.get(reverse(name), {'cursor': KeysetPagination(()).encode_cursor(position)})
+                self.assertEqual(response.status_code, 404)
+
+
+async def eventually(predicate, timeout: float = 1):
+    async with asyncio.timeout(timeout):
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+
+class FakePubSub:
+    """Stands in for a ``redis.asyncio`` pub/sub connection, messages are fed through ``send``."""
+
+    def __init__(self):
+        self.channels = set()
+        self.messages = asyncio.Queue()
+        self.closed = False
+
+    async def subscribe(self, *channels):
+        self.channels.update(channels)
+
+    async def unsubscribe(self, *channels):
+        self.channels.difference_update(channels)
+
+    async def listen(self):
+        while True:
+            message = await self.messages.get()
+            if isinstance(message, Exception):
+                raise message
+            yield message
+
+    async def aclose(self):
+        self.closed = True
+
+    def send(self, channel: str, event: dict):
+        self.messages.put_nowait({'type': 'message', 'channel': channel.encode(), 'data': json.dumps(event).encode()})
+
+
+class RedisBrokerTests(SimpleTestCase):
+    def setUp(self):
+        self.pubsubs = []
+        client = mock.Mock(pubsub=mock.Mock(side_effect=lambda **kwargs: self.pubsubs.append(FakePubSub()) or self.pubsubs[-1]))
+        for patcher in (
+            mock.patch('redis.asyncio.Redis.from_url', return_value=client),
+            mock.patch.object(notifications, 'NOTIFICATIONS_RECONNECT_INTERVAL', 0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.broker = notifications.RedisBroker('redis://localhost:6379/0')
+
+    def event(self, pk: int) -> dict:
+        return {'id': pk, 'topic': 'friend_request.sent', 'payload': {'receiver_id': 1}}
+
+    async def test_listeners_of_a_user_share_one_subscription(self):
+        try:
+            first, second = await self.broker.subscribe(1), await self.broker.subscribe(1)
+            other = await self.broker.subscribe(2)
+            pubsub, = self.pubsubs
+            self.assertEqual(pubsub.channels, {self.broker.channel(1), self.broker.channel(2)})
+
+            pubsub.send(self.broker.channel(1), self.event(1))
+            self.assertEqual(await asyncio.wait_for(first.get(), 1), self.event(1))
+            self.assertEqual(await asyncio.wait_for(second.get(), 1), self.event(1))
+            self.assertTrue(other.empty())
+
+            await self.broker.unsubscribe(1, first)
+            self.assertIn(self.broker.channel(1), pubsub.channels)
+            await self.broker.unsubscribe(1, second)
+            self.assertEqual(pubsub.channels, {self.broker.channel(2)})
+        finally:
+            self.broker.reader.cancel()
+
+    async def test_lost_connection_resubscribes_the_listened_channels(self):
+        try:
+            queue = await self.broker.subscribe(1)
+            await self.broker.subscribe(2)
+            lost, = self.pubsubs
+            lost.messages.put_nowait(ConnectionError("connection reset"))
+            with self.assertLogs(level='WARNING'):
+                await eventually(lambda: len(self.pubsubs) == 2 and self.pubsubs[1].channels)
+            pubsub = self.pubsubs[1]
+            self.assertTrue(lost.closed)
+            self.assertEqual(pubsub.channels, {self.broker.channel(1), self.broker.channel(2)})
+
+            pubsub.send(self.broker.channel(1), self.event(2))
+            self.assertEqual(await asyncio.wait_for(queue.get(), 1), self.event(2))
+        finally:
+            self.broker.reader.cancel()
+
+    def test_publish_goes_to_the_channel_of_the_user(self):
+        self.broker.client = mock.Mock()
+        self.broker.publish(1, self.event(1))
+        self.broker.client.publish.assert_called_once_with(self.broker.channel(1), json.dumps(self.event(1)))
+
+
+class NotificationsBrokerTests(SimpleTestCase):
+    def test_streams_are_refused_with_the_memory_broker(self):
+        with mock.patch.object(notifications, 'NOTIFICATIONS_BROKER', 'memory'):
+            with self.assertRaises(ImproperlyConfigured):
+                notifications.streams_enabled()
+        with mock.patch.object(notifications, 'NOTIFICATIONS_BROKER', 'redis'):
+            self.assertTrue(notifications.streams_enabled())
+
+    def test_nothing_is_published_when_notifications_are_off(self):
+        with mock.patch.object(notifications, 'NOTIFICATIONS_BROKER', 'none'):
+            self.assertFalse(notifications.streams_enabled())
+            self.assertIsNone(notifications.get_broker())
+            consumers.notify_users([{'id': 1, 'topic': 'friend_request.sent', 'payload': {'receiver_id': 1}}])
+
+
+class FriendRequestStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, = create_users(1)
+
+    def setUp(self):
+        self.broker = notifications.MemoryBroker()
+        for patcher in (
+            mock.patch.object(notifications, 'NOTIFICATIONS_BROKER', 'memory'),
+            mock.patch.object(notifications, '_broker', self.broker),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.view = FriendRequestStreamAPIView.as_view()
+        self.factory = AsyncRequestFactory()
+
+    async def test_token_is_required(self):
+        response = await self.view(self.factory.get('/'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.broker.listeners, {})
+
+    async def test_events_are_streamed_until_the_token_expires(self):
+        token = refresh_token_for(self.user).access_token
+        # exp is truncated to whole seconds, so a 1s lifetime can expire before the request is served
+        token.set_exp(lifetime=timedelta(seconds=2))
+        response = await self.view(self.factory.get('/', {'token': str(token)}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b': connected\n\n')
+        self.assertEqual(len(self.broker.listeners[self.user.id]), 1)
+        self.broker.publish(self.user.id, {'id': 7, 'topic': 'friend_request.sent', 'payload': {'id': 3}})
+        self.assertEqual(await anext(chunks), b'id: 7\nevent: friend_request.sent\ndata: {"id": 3}\n\n')
+
+        # The stream closes itself once the token expires, leaving its subscription
+        async def drain():
+            return [chunk async for chunk in chunks]
+        await asyncio.wait_for(drain(), 4)
+        self.assertEqual(self.broker.listeners, {})
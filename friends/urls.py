@@ -1,19 +1,41 @@
+from django.conf import settings
 from django.urls import path
+from . import notifications
 from .views import (
     FriendRequestAPIView,
+    BulkFriendRequestAPIView,
     FriendRequestActionAPIView,
+    BulkFriendRequestActionAPIView,
     FriendListAPIView,
     BlockUserAPIView,
     BlockedUserListAPIView,
-    PendingFriendRequestAPIView
+    PendingFriendRequestAPIView,
+    FriendSuggestionAPIView,
+    MutualFriendCountAPIView
 )
 
+if settings.ASYNC_VIEWS:
+    from .async_views import (
+        AsyncFriendListAPIView as FriendListAPIView,
+        AsyncPendingFriendRequestAPIView as PendingFriendRequestAPIView,
+        FriendRequestStreamAPIView
+    )
+
 urlpatterns = [
     path('friends', FriendListAPIView.as_view(), name='friend-list'),
     path('friends/requests', FriendRequestAPIView.as_view(), name='friend-requests'),
+    path('friends/requests/bulk', BulkFriendRequestAPIView.as_view(), name='bulk-friend-requests'),
+    path('friends/requests/bulk/action', BulkFriendRequestActionAPIView.as_view(), name='bulk-friend-request-action'),
     path('friends/requests/pending', PendingFriendRequestAPIView.as_view(), name='pending-friend-requests'),
     path('friends/requests/<int:pk>', FriendRequestActionAPIView.as_view(), name='friend-request-action'),
     
     path('friends/block/<int:user_id>', BlockUserAPIView.as_view(), name='block-user'),
     path('friends/blocked', BlockedUserListAPIView.as_view(), name='blocked-user-list'),
+
+    path('friends/suggestions', FriendSuggestionAPIView.as_view(), name='friend-suggestions'),
+    path('friends/mutual/<int:user_id>', MutualFriendCountAPIView.as_view(), name='mutual-friends'),
 ]
+
+if settings.ASYNC_VIEWS and notifications.streams_enabled():
+    # Each open stream would hold a worker thread under WSGI, so they are only served under ASGI
+    urlpatterns.append(path('friends/requests/stream', FriendRequestStreamAPIView.as_view(), name='friend-request-stream'))
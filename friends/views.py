@@ -3,85 +3,162 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
 from django.db import transaction
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.db.models import Q
-from friends.models import FriendRequest, Friendship, BlockedUser
-from friends.serializers import FriendRequestSerializer, FriendshipSerializer, BlockedUserSerializer
+from django.db.models import Q, Exists, OuterRef
+from friends import counters, graph
+from friends.managers import lock_users
+from friends.models import FriendRequest, Friendship, BlockedUser, MutualFriendCount
+from friends.serializers import FriendRequestSerializer, FriendSuggestionSerializer, blocked_user_values, friendship_values
+from utils.pagination import KeysetPagination, KeysetPaginationMixin
 
 logger = logging.getLogger()
 User = get_user_model()
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
-class FriendListAPIView(APIView):
+class FriendListAPIView(KeysetPaginationMixin, APIView):
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    keyset_ordering = ('friend__first_name', 'friend__last_name', 'id')
 
     def get(self, request):
-        friendships = Friendship.objects.filter(user=request.user).select_related('friend')
-        
+        paginator = self.get_paginator()
+        keyset = isinstance(paginator, KeysetPagination)
+
         # Apply search if query parameter is provided
         search_query = request.query_params.get('q', '')
-        if search_query:
-            friendships = friendships.filter(
-                Q(friend__email__icontains=search_query) |
-                Q(friend__first_name__icontains=search_query) |
-                Q(friend__last_name__icontains=search_query)
-            )
-        
-        friendships = friendships.order_by('friend__first_name', 'friend__last_name')
-        
-        paginator = self.pagination_class()
-        paginated_friendships = paginator.paginate_queryset(friendships, request)
+        if not search_query and not keyset:
+            # Page through the cached adjacency list and only load the rows on the page
+            friendship_ids = paginator.paginate_queryset(graph.get_graph(request.user.id)['order'], request)
+            friendships = {row['id']: row for row in friendship_values.values(Friendship.objects.filter(id__in=friendship_ids))}
+            page = [friendships[pk] for pk in friendship_ids if pk in friendships]
+            return paginator.get_paginated_response(friendship_values.many(page))
+
+        friendships = friendship_values.values(Friendship.objects.friends_of(request.user.id, search_query))
+        count = None if search_query else counters.reader(request.user, counters.FRIENDS)
+        paginated_friendships = paginator.paginate_queryset(friendships, request, count=count)
         
-        serializer = FriendshipSerializer(paginated_friendships, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        return paginator.get_paginated_response(friendship_values.many(paginated_friendships))
+
+def cooldown_key(sender_id, receiver_id):
+    return f"friend_request_cooldown_{sender_id}_{receiver_id}"
+
+def cooldown_timeout():
+    return int(os.getenv("FRIEND_REQUEST_COOLDOWN_TIMEOUT", 24 * 60 * 60))  # Default to 24 hours if not set
+
+def bulk_limit():
+    return int(os.getenv("FRIEND_REQUEST_BULK_LIMIT", 100))
+
+def parse_ids(value):
+    """Returns the de-duplicated integer ids of a JSON list, or None if it is not one."""
+    if not isinstance(value, list):
+        return None
+    try:
+        return list(dict.fromkeys(int(item) for item in value))
+    except (TypeError, ValueError):
+        return None
+
+def friend_request_error(sender_id, receiver_id, receiver, on_cooldown):
+    """
+    Returns the ``(detail, status)`` refusing a friend request, or None if it may be sent.
+
+    ``receiver`` is the row returned by ``FriendRequest.objects.eligibility``.
+    """
+    if sender_id == receiver_id:
+        return "You cannot send a friend request to yourself.", status.HTTP_400_BAD_REQUEST
+    if not receiver:
+        return "Receiver not found.", status.HTTP_404_NOT_FOUND
+    if receiver['is_blocked']:
+        return "You cannot send a friend request to this user.", status.HTTP_403_FORBIDDEN
+    if on_cooldown:
+        return "You cannot send a friend request to this user yet. Please try again later.", status.HTTP_429_TOO_MANY_REQUESTS
+    if receiver['pending_sent']:
+        return "A friend request to this user already exists.", status.HTTP_400_BAD_REQUEST
+    if receiver['pending_received']:
+        return "This user has already sent you a friend request.", status.HTTP_400_BAD_REQUEST
+    if receiver['are_friends']:
+        return "You are already friends with this user.", status.HTTP_400_BAD_REQUEST
+    return None
 
 class FriendRequestAPIView(APIView):
     permission_classes = [IsAuthenticated]
     throttle_scope = 'friend_request'
 
     def post(self, request):
-        receiver_id = request.data.get('receiver')
         sender = request.user
+        try:
+            receiver_id = int(request.data.get('receiver'))
+        except (TypeError, ValueError):
+            return Response({"detail": "Receiver not found."}, status=status.HTTP_404_NOT_FOUND)
 
         if sender.id == receiver_id:
             return Response({"detail": "You cannot send a friend request to yourself."}, status=status.HTTP_400_BAD_REQUEST)
 
-        receiver = User.objects.filter(id=receiver_id).first()
-        if not receiver:
-            return Response({"detail": "Receiver not found."}, status=status.HTTP_404_NOT_FOUND)
-
-        if BlockedUser.objects.filter(user=receiver, blocked_user=sender).exists():
-            return Response({"detail": "You cannot send a friend request to this user."}, status=status.HTTP_403_FORBIDDEN)
-
-        cache_key = f"friend_request_cooldown_{sender.id}_{receiver.id}"
-        if cache.get(cache_key):
-            return Response({"detail": "You cannot send a friend request to this user yet. Please try again later."}, status=status.HTTP_429_TOO_MANY_REQUESTS)
-
-        existing_request_from_sender = FriendRequest.objects.filter(sender=sender, receiver=receiver, status='PENDING').first()
-        if existing_request_from_sender:
+        # Every precondition is answered by this single query plus the cooldown lookup
+        receiver = FriendRequest.objects.eligibility(sender.id, [receiver_id]).get(receiver_id)
+        on_cooldown = bool(receiver) and not receiver['is_blocked'] and cache.get(cooldown_key(sender.id, receiver_id))
+        error = friend_request_error(sender.id, receiver_id, receiver, on_cooldown)
+        if error:
+            detail, error_status = error
+            return Response({"detail": detail}, status=error_status)
+
+        friend_requests = FriendRequest.objects.send(sender.id, [receiver_id])
+        if not friend_requests:
+            # A concurrent request to the same user got there first
             return Response({"detail": "A friend request to this user already exists."}, status=status.HTTP_400_BAD_REQUEST)
-
-        existing_request_from_receiver = FriendRequest.objects.filter(sender=receiver, receiver=sender, status='PENDING').first()
-        if existing_request_from_receiver:
-            return Response({"detail": "This user has already sent you a friend request."}, status=status.HTTP_400_BAD_REQUEST)
-
-        if sender.friends.filter(id=receiver.id).exists():
-            return Response({"detail": "You are already friends with this user."}, status=status.HTTP_400_BAD_REQUEST)
-
-        friend_request = FriendRequest.objects.create(sender=sender, receiver=receiver)
+        friend_request, = friend_requests
         serializer = FriendRequestSerializer(friend_request)
 
-        logger.info(f"Friend request sent by {sender.email} to {receiver.email}")
+        logger.info("Friend request sent by %s to %s", sender.email, receiver['email'])
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+class BulkFriendRequestAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'friend_request'
+
+    def post(self, request):
+        sender = request.user
+        receiver_ids = parse_ids(request.data.get('receivers'))
+        if not receiver_ids:
+            return Response({"detail": "Provide a list of receiver ids."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(receiver_ids) > bulk_limit():
+            return Response({"detail": f"You can send at most {bulk_limit()} friend requests at once."}, status=status.HTTP_400_BAD_REQUEST)
+
+        receivers = FriendRequest.objects.eligibility(sender.id, receiver_ids)
+        cooldowns = cache.get_many([cooldown_key(sender.id, receiver_id) for receiver_id in receivers])
+
+        results, sendable = {}, []
+        for receiver_id in receiver_ids:
+            on_cooldown = cooldowns.get(cooldown_key(sender.id, receiver_id))
+            error = friend_request_error(sender.id, receiver_id, receivers.get(receiver_id), on_cooldown)
+            if error:
+                detail, error_status = error
+                results[receiver_id] = {"receiver": receiver_id, "status": error_status, "detail": detail}
+            else:
+                sendable.append(receiver_id)
+
+        with transaction.atomic():
+            friend_requests = FriendRequest.objects.send(sender.id, sendable)
+            sent = {friend_request.receiver_id for friend_request in friend_requests}
+            missing = [receiver_id for receiver_id in sendable if receiver_id not in sent]
+            # Read under the locks taken by send, these blocks landed since validation
+            blocked = set(BlockedUser.objects.filter(user_id__in=missing, blocked_user_id=sender.id).values_list('user_id', flat=True)) if missing else set()
+        for friend_request in friend_requests:
+            results[friend_request.receiver_id] = {
+                "receiver": friend_request.receiver_id,
+                "status": status.HTTP_201_CREATED,
+                "request": FriendRequestSerializer(friend_request).data,
+            }
+        for receiver_id in missing:
+            if receiver_id in blocked:
+                detail, error_status = "You cannot send a friend request to this user.", status.HTTP_403_FORBIDDEN
+            else:
+                # A concurrent request to the same user got there first
+                detail, error_status = "A friend request to this user already exists.", status.HTTP_400_BAD_REQUEST
+            results[receiver_id] = {"receiver": receiver_id, "status": error_status, "detail": detail}
+
+        logger.info("%d friend requests sent by %s", len(friend_requests), sender.email)
+        return Response({"results": [results[receiver_id] for receiver_id in receiver_ids]}, status=status.HTTP_200_OK)
+
 class FriendRequestActionAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -92,92 +169,146 @@ class FriendRequestActionAPIView(APIView):
         if not friend_request:
             return Response({"detail": "Friend request not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        if request.user.friends.filter(id=friend_request.sender.id).exists():
-            friend_request.delete()
+        if graph.is_friend(request.user.id, friend_request.sender_id):
+            FriendRequest.objects.discard(Q(id=friend_request.id))
             return Response({"detail": "You are already friends with this user. Friend request deleted."}, status=status.HTTP_200_OK)
 
         if action == 'accept':
             with transaction.atomic():
-                friend_request.status = 'ACCEPTED'
-                friend_request.save()
-                Friendship.objects.create(user=friend_request.receiver, friend=friend_request.sender)
-            logger.info(f"User {friend_request.receiver} accepted friend request from {friend_request.sender}")
+                # Taken before the request row is locked, in the order blocking takes them
+                lock_users([friend_request.receiver_id, friend_request.sender_id])
+                if not FriendRequest.objects.resolve([friend_request.id], 'ACCEPTED'):
+                    return Response({"detail": "Friend request not found."}, status=status.HTTP_404_NOT_FOUND)
+                Friendship.objects.befriend(friend_request.receiver_id, friend_request.sender_id)
+            logger.info("User %s accepted friend request from user %s", request.user, friend_request.sender_id)
             return Response({"detail": "Friend request accepted."}, status=status.HTTP_200_OK)
         elif action == 'reject':
-            friend_request.status = 'REJECTED'
-            friend_request.save()
+            FriendRequest.objects.resolve([friend_request.id], 'REJECTED')
 
             # Set cooldown period
-            timeout = int(os.getenv("FRIEND_REQUEST_COOLDOWN_TIMEOUT", 24 * 60 * 60))  # Default to 24 hours if not set
-            cache_key = f"friend_request_cooldown_{friend_request.sender.id}_{friend_request.receiver.id}"
-            cache.set(cache_key, True, timeout)
+            cache.set(cooldown_key(friend_request.sender_id, friend_request.receiver_id), True, cooldown_timeout())
 
-            logger.info(f"User {friend_request.receiver} rejected friend request from {friend_request.sender}")
+            logger.info("User %s rejected friend request from user %s", request.user, friend_request.sender_id)
             return Response({"detail": "Friend request rejected."}, status=status.HTTP_200_OK)
         else:
             return Response({"detail": "Invalid action."}, status=status.HTTP_400_BAD_REQUEST)
 
+class BulkFriendRequestActionAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        action = request.data.get('action')
+        request_ids = parse_ids(request.data.get('requests'))
+        if action not in ('accept', 'reject'):
+            return Response({"detail": "Invalid action."}, status=status.HTTP_400_BAD_REQUEST)
+        if not request_ids:
+            return Response({"detail": "Provide a list of friend request ids."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request_ids) > bulk_limit():
+            return Response({"detail": f"You can act on at most {bulk_limit()} friend requests at once."}, status=status.HTTP_400_BAD_REQUEST)
+
+        receiver = request.user
+        senders = dict(FriendRequest.objects.filter(id__in=request_ids, receiver=receiver).values_list('id', 'sender_id'))
+        friend_ids = set(graph.friend_ids(receiver.id))
+        stale = [pk for pk, sender_id in senders.items() if sender_id in friend_ids]
+        actionable = [pk for pk in senders if pk not in stale]
+
+        with transaction.atomic():
+            if action == 'accept':
+                lock_users([receiver.id, *(senders[pk] for pk in actionable)])
+            FriendRequest.objects.discard(Q(id__in=stale))
+            # Requests deleted by a concurrent block are reported as not found
+            actionable = FriendRequest.objects.resolve(actionable, 'ACCEPTED' if action == 'accept' else 'REJECTED')
+            for pk in set(senders) - set(stale) - set(actionable):
+                del senders[pk]
+            if action == 'accept':
+                Friendship.objects.befriend_many([(receiver.id, senders[pk]) for pk in actionable])
+        if action == 'reject':
+            cache.set_many({cooldown_key(senders[pk], receiver.id): True for pk in actionable}, cooldown_timeout())
+
+        results = []
+        for pk in request_ids:
+            if pk not in senders:
+                results.append({"request": pk, "status": status.HTTP_404_NOT_FOUND, "detail": "Friend request not found."})
+            elif pk in stale:
+                results.append({"request": pk, "status": status.HTTP_200_OK, "detail": "You are already friends with this user. Friend request deleted."})
+            else:
+                results.append({"request": pk, "status": status.HTTP_200_OK, "detail": f"Friend request {action}ed."})
+
+        logger.info("User %s %sed %d friend requests", receiver, action, len(actionable))
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
 class BlockUserAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    # Blocking is done with a GET
+    replica_reads = False
 
     def get(self, request, user_id):
-        user_to_block = User.objects.filter(id=user_id).first()
-
-        if not user_to_block:
+        blocked = BlockedUser.objects.block(request.user.id, user_id)
+        if blocked is None:
             return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        # Check if they are friends and remove the friendship
-        if request.user.friends.filter(id=user_to_block.id).exists():
-            Friendship.objects.filter(user=request.user, friend=user_to_block).delete()
-            Friendship.objects.filter(user=user_to_block, friend=request.user).delete()
-
-        # Check if any pending friend requests exist and remove them
-        friend_requests = FriendRequest.objects.filter(
-            (Q(sender=request.user, receiver=user_to_block) | Q(sender=user_to_block, receiver=request.user)),
-            status='PENDING'
-        )
-        if friend_requests.exists():
-            friend_requests.delete()
-
-        BlockedUser.objects.get_or_create(user=request.user, blocked_user=user_to_block)
-        logger.info(f"User {request.user} blocked {user_to_block}")
+        logger.info("User %s blocked user %s", request.user, user_id)
         return Response({"detail": "User blocked successfully."}, status=status.HTTP_200_OK)
 
     def delete(self, request, user_id):
-        BlockedUser.objects.filter(user=request.user, blocked_user_id=user_id).delete()
-        logger.info(f"User {request.user} unblocked {user_id}")
+        if BlockedUser.objects.unblock(request.user.id, user_id):
+            logger.info("User %s unblocked user %s", request.user, user_id)
         return Response({"detail": "User unblocked successfully."}, status=status.HTTP_200_OK)
 
-class BlockedUserListAPIView(APIView):
+class BlockedUserListAPIView(KeysetPaginationMixin, APIView):
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    keyset_ordering = ('-created_at', 'id')
 
     def get(self, request):
-        blocked_users = BlockedUser.objects.filter(user=request.user).select_related('blocked_user')
-        paginator = self.pagination_class()
-        paginated_result = paginator.paginate_queryset(blocked_users, request)
-        serializer = BlockedUserSerializer(paginated_result, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        blocked_users = blocked_user_values.values(BlockedUser.objects.filter(user=request.user).order_by('-created_at'))
+        paginator = self.get_paginator()
+        paginated_result = paginator.paginate_queryset(blocked_users, request, count=counters.reader(request.user, counters.BLOCKED))
+        return paginator.get_paginated_response(blocked_user_values.many(paginated_result))
 
 
-class PendingFriendRequestAPIView(APIView):
+class PendingFriendRequestAPIView(KeysetPaginationMixin, APIView):
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    keyset_ordering = ('-created_at', 'id')
 
     def get(self, request):
-        pending_requests = FriendRequest.objects.filter(receiver=request.user, status='PENDING').order_by('-created_at')
-        
         # Apply search if query parameter is provided
         search_query = request.query_params.get('q', '')
-        if search_query:
-            pending_requests = pending_requests.filter(
-                Q(sender__email__icontains=search_query) |
-                Q(sender__first_name__icontains=search_query) |
-                Q(sender__last_name__icontains=search_query)
-            )
-        
-        paginator = self.pagination_class()
-        paginated_requests = paginator.paginate_queryset(pending_requests, request)
+        pending_requests = FriendRequest.objects.pending_for(request.user.id, search_query)
+
+        paginator = self.get_paginator()
+        count = None if search_query else counters.reader(request.user, counters.PENDING_INCOMING)
+        paginated_requests = paginator.paginate_queryset(pending_requests, request, count=count)
         
         serializer = FriendRequestSerializer(paginated_requests, many=True)
         return paginator.get_paginated_response(serializer.data)
+
+class FriendSuggestionAPIView(KeysetPaginationMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    keyset_ordering = ('-count', 'other_id')
+
+    def get(self, request):
+        user_id = request.user.id
+        # Mutual friend counts are precomputed, so this is a range scan plus indexed anti-joins
+        suggestions = MutualFriendCount.objects.filter(user_id=user_id, count__gt=0).exclude(
+            Exists(Friendship.objects.filter(user_id=user_id, friend=OuterRef('other')))
+        ).exclude(
+            Exists(BlockedUser.objects.filter(user_id=user_id, blocked_user=OuterRef('other')))
+        ).exclude(
+            Exists(BlockedUser.objects.filter(user=OuterRef('other'), blocked_user_id=user_id))
+        ).exclude(
+            Exists(FriendRequest.objects.filter(sender_id=user_id, receiver=OuterRef('other'), status='PENDING'))
+        ).exclude(
+            Exists(FriendRequest.objects.filter(sender=OuterRef('other'), receiver_id=user_id, status='PENDING'))
+        ).select_related('other').order_by('-count', 'other_id')
+
+        paginator = self.get_paginator()
+        paginated_suggestions = paginator.paginate_queryset(suggestions, request)
+        serializer = FriendSuggestionSerializer(paginated_suggestions, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+class MutualFriendCountAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, user_id):
+        count = MutualFriendCount.objects.filter(user_id=request.user.id, other_id=user_id).values_list('count', flat=True).first()
+        return Response({"user": user_id, "mutual_friends": count or 0}, status=status.HTTP_200_OK)
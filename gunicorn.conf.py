@@ -0,0 +1,20 @@
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", 1))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+
+accesslog = '-'
+errorlog = '-'
+
+# uvicorn workers (uvicorn.workers.UvicornWorker) serve the ASGI application,
+# every other worker class the WSGI one
+wsgi_app = 'core.asgi:application' if worker_class.startswith('uvicorn') else 'core.wsgi:application'
+
+
+def post_worker_init(worker):
+    # Samples from the moment the worker is up, so /ready can pass before it
+    # served a request; threads do not survive the fork, hence not in the master
+    from core.health_check import sampler
+    sampler.start()
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from rest_framework import status
+from core.async_views import AsyncAPIView
+from friends import blocks
+from users import search
+from users.serializer import AppUserSerializer, CurrentUserSerializer, user_values
+from utils.pagination import KeysetPaginationMixin
+
+User = get_user_model()
+
+class AsyncCurrentUserAPIView(AsyncAPIView):
+    async def get(self, request):
+        # A user built from token claims has to be loaded before serializing it
+        if request.user.get_deferred_fields():
+            await request.user.arefresh_from_db()
+        return self.render(CurrentUserSerializer(request.user).data)
+
+class AsyncUserSearchAPIView(KeysetPaginationMixin, AsyncAPIView):
+    keyset_ordering = ('-rank', 'id')
+
+    async def get(self, request):
+        search_query = request.query_params.get('q', '')
+        if not search_query:
+            return self.render({"error": "Please provide a search query."}, status.HTTP_400_BAD_REQUEST)
+
+        hidden = await blocks.ablocked_by(request.user.id)
+        plan = search.plan_search(search_query)
+
+        if plan == 'email':
+            exact_email_match = await User.objects.filter(email=search_query.strip().lower()).afirst()
+            if exact_email_match and exact_email_match.id not in hidden:
+                return self.render(AppUserSerializer(exact_email_match).data)
+
+        users = search.search_users(User.objects.all(), search_query, plan).order_by('-rank', 'id')
+
+        paginator = self.get_paginator()
+        page = await paginator.apaginate_queryset(user_values.values(users, 'rank'), request, hidden=hidden)
+        return self.render(paginator.get_paginated_response(user_values.many(page)).data)
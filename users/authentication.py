@@ -0,0 +1,121 @@
+import os, time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from users.tokens import AUTH_TIME_CLAIM, CLAIM_FIELDS
+
+User = get_user_model()
+
+REVOCATION_CHECK_INTERVAL = float(os.getenv("TOKEN_REVOCATION_CHECK_INTERVAL", 5))
+# Tokens issued before a revocation can live at most as long as a refresh token
+REVOCATION_TIMEOUT = int(settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'].total_seconds())
+
+
+def _revocation_key(user_id: int) -> str:
+    return f"tokens_revoked_{user_id}"
+
+
+class RevocationList:
+    """
+    Time after which the tokens of a user are valid again, shared through
+    the cache and memoized per process for ``REVOCATION_CHECK_INTERVAL``
+    seconds, so a revocation takes effect on every worker within that
+    interval without a cache round trip on each request.
+    """
+    max_entries = 10000
+
+    def __init__(self, interval: float = REVOCATION_CHECK_INTERVAL):
+        self.interval = interval
+        self.entries = {}
+
+    def revoked_at(self, user_id: int):
+        entry = self.entries.get(user_id)
+        if entry is not None and time.monotonic() - entry[0] < self.interval:
+            return entry[1]
+        return self.remember(user_id, cache.get(_revocation_key(user_id)))
+
+    async def arevoked_at(self, user_id: int):
+        entry = self.entries.get(user_id)
+        if entry is not None and time.monotonic() - entry[0] < self.interval:
+            return entry[1]
+        return self.remember(user_id, await cache.aget(_revocation_key(user_id)))
+
+    def remember(self, user_id: int, revoked_at):
+        if len(self.entries) >= self.max_entries:
+            self.entries.clear()
+        self.entries[user_id] = (time.monotonic(), revoked_at)
+        return revoked_at
+
+    def revoke(self, *user_ids: int) -> None:
+        """Rejects every token of the users issued up to now."""
+        # Sub-second, like auth_time, so a login right after the revocation is not caught by it
+        revoked_at = time.time()
+        cache.set_many({_revocation_key(user_id): revoked_at for user_id in user_ids}, REVOCATION_TIMEOUT)
+        for user_id in user_ids:
+            self.entries.pop(user_id, None)
+
+
+revocations = RevocationList()
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds ``request.user`` from the token claims
+    instead of loading it from Postgres.
+
+    The user only holds the id and ``CLAIM_FIELDS``; the first access to any
+    other field loads the rest of the row in one query. Tokens issued before
+    the claims were added fall back to the regular database lookup.
+    """
+
+    def get_user(self, validated_token):
+        if AUTH_TIME_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        user = self.get_token_user(validated_token)
+        self.check_revoked(validated_token, revocations.revoked_at(user.pk))
+        return user
+
+    async def aget_user(self, validated_token):
+        """Async variant of ``get_user`` for ``core.async_views.AsyncAPIView``."""
+        if AUTH_TIME_CLAIM not in validated_token:
+            return await self.aget_db_user(validated_token)
+        user = self.get_token_user(validated_token)
+        self.check_revoked(validated_token, await revocations.arevoked_at(user.pk))
+        return user
+
+    async def aget_db_user(self, validated_token):
+        user = await User.objects.filter(**{api_settings.USER_ID_FIELD: self.get_user_id(validated_token)}).afirst()
+        if user is None:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+    def get_token_user(self, validated_token):
+        claims = {api_settings.USER_ID_FIELD: self.get_user_id(validated_token)}
+        for field in CLAIM_FIELDS:
+            try:
+                claims[field] = validated_token[field]
+            except KeyError:
+                raise InvalidToken(f"Token contained no {field} claim")
+        if not claims['is_active']:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+
+        # from_db marks every field missing from the claims as deferred
+        field_names = [field.attname for field in User._meta.concrete_fields if field.attname in claims]
+        user = User.from_db(None, field_names, [claims[name] for name in field_names])
+        user.hydrate_on_access = True
+        return user
+
+    def check_revoked(self, validated_token, revoked_at) -> None:
+        if revoked_at is not None and validated_token[AUTH_TIME_CLAIM] < revoked_at:
+            raise AuthenticationFailed("Token has been revoked", code="token_revoked")
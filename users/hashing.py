@@ -0,0 +1,125 @@
+import logging, os, threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger()
+
+EXECUTOR = os.getenv("PASSWORD_HASHING_EXECUTOR", "thread")
+WORKERS = int(os.getenv("PASSWORD_HASHING_WORKERS", 2))
+QUEUE_DEPTH = int(os.getenv("PASSWORD_HASHING_QUEUE_DEPTH", 8))
+TIMEOUT = float(os.getenv("PASSWORD_HASHING_TIMEOUT", 5))
+RETRY_AFTER = int(os.getenv("PASSWORD_HASHING_RETRY_AFTER", 1))
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    Django's PBKDF2 hasher with the work factor read from
+    ``PASSWORD_HASHING_ITERATIONS``. Hashes made with another iteration
+    count still verify and are upgraded on the next successful login.
+    """
+    iterations = int(os.getenv("PASSWORD_HASHING_ITERATIONS", hashers.PBKDF2PasswordHasher.iterations))
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many concurrent sign-ins, please retry shortly.'
+    default_code = 'hashing_unavailable'
+
+    def __init__(self, detail=None, code=None, wait=RETRY_AFTER):
+        super().__init__(detail, code)
+        # DRF's exception handler turns `wait` into a Retry-After header
+        self.wait = wait
+
+
+def _setup_worker():
+    # Spawned workers start without Django; forked ones already have it
+    import django
+    django.setup()
+
+
+def _verify(password: str, encoded: str) -> tuple:
+    return hashers.verify_password(password, encoded)
+
+
+def _make(password: str) -> str:
+    return hashers.make_password(password)
+
+
+class HashingPool:
+    """
+    Runs password hashing on a bounded executor.
+
+    At most ``WORKERS`` hashes run at once and ``QUEUE_DEPTH`` more may
+    wait; anything beyond that is refused with ``HashingUnavailable``
+    instead of piling up, so a login burst cannot take every worker's CPU
+    away from the rest of the API. The executor is created lazily in the
+    worker process that first uses it.
+    """
+
+    def __init__(self, kind: str = EXECUTOR, workers: int = WORKERS, queue_depth: int = QUEUE_DEPTH):
+        self.kind = kind
+        self.workers = workers
+        self.slots = threading.BoundedSemaphore(workers + queue_depth)
+        self.executor = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def get_executor(self):
+        # A pool inherited through a fork has no live workers in the child
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    if self.kind == 'process':
+                        self.executor = ProcessPoolExecutor(self.workers, initializer=_setup_worker)
+                    else:
+                        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hashing')
+                    self.pid = os.getpid()
+        return self.executor
+
+    def run(self, function, *args):
+        if not self.slots.acquire(blocking=False):
+            logger.warning("Password hashing pool saturated, refusing request")
+            raise HashingUnavailable()
+        try:
+            future = self.get_executor().submit(function, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            return future.result(timeout=TIMEOUT)
+        except TimeoutError:
+            logger.warning("Password hashing took longer than %ss", TIMEOUT)
+            raise HashingUnavailable()
+
+    def check_password(self, user, password: str) -> bool:
+        """
+        Verifies ``password`` against ``user`` on the pool and rehashes it
+        when the hasher or its cost parameters changed since it was stored.
+
+        Args:
+            user (AppUser): The user signing in, or None if the email is
+                unknown, in which case a hash is still computed so both
+                cases take the same time.
+            password (str): The password to verify.
+
+        Returns:
+            bool: Whether the password is correct.
+        """
+        is_correct, must_update = self.run(_verify, password, user.password if user else hashers.UNUSABLE_PASSWORD_PREFIX)
+        if is_correct and must_update:
+            try:
+                user.password = self.run(_make, password)
+                user.save(update_fields=['password'])
+            except HashingUnavailable:
+                # The old hash is still valid, the next login upgrades it
+                logger.info("Skipped rehashing the password of %s", user)
+        return is_correct
+
+    def make_password(self, password: str) -> str:
+        return self.run(_make, password)
+
+
+pool = HashingPool()
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.benchmark import REPORT_HEADER, Load, login, report
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the latency of an endpoint of a running server, the friends list by default, alone and then "
+        "during a storm of logins. Raise AUTH_RATELIMIT on the server first, or the storm is mostly throttled"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', default='http://localhost:8000', help="Base URL of the server")
+        parser.add_argument('--path', default='/api/v1/friends', help="Endpoint whose latency is measured")
+        parser.add_argument('--email', required=True, help="User the endpoint is requested and the logins are sent for")
+        parser.add_argument('--password', required=True, help="Password of --email")
+        parser.add_argument('--concurrency', type=int, default=4, help="Clients requesting the endpoint at once")
+        parser.add_argument('--storm-concurrency', type=int, default=32, help="Clients logging in at once")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds of each phase")
+
+    def handle(self, *args, **options):
+        server = options['server'].rstrip('/')
+        token = login(server, options['email'], options['password'])
+        if token is None:
+            raise CommandError(f"Could not log in as {options['email']}.")
+        url = server + options['path']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        self.stdout.write(REPORT_HEADER)
+        self.stdout.write(report('alone', Load(url, options['concurrency'], headers=headers).run(options['duration'])))
+
+        credentials = {'email': options['email'], 'password': options['password']}
+        storm = Load(f'{server}/api/v1/login', options['storm_concurrency'], 'POST', data=credentials).start()
+        try:
+            during = Load(url, options['concurrency'], headers=headers).run(options['duration'])
+        finally:
+            storm.stop()
+        self.stdout.write(report('during logins', during))
+        self.stdout.write(report('logins', storm))
+        # 503s are logins refused by a saturated hashing pool, 429s by the auth throttle
+        self.stdout.write("Login responses: " + ', '.join(f'{status}: {count}' for status, count in sorted(storm.statuses.items())))
@@ -0,0 +1,62 @@
+import statistics
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from core.benchmark import get_view, seed_users, timed
+from users.views import UsersAPIView
+from utils.pagination import KeysetPagination
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the latency of UsersAPIView pages at increasing depths, paged by number against keyset "
+        "cursors; cursor pages should stay flat however deep they are"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depths', type=int, nargs='+', default=[1, 10, 100, 1000], help="Page numbers to measure")
+        parser.add_argument('--page-size', type=int, default=KeysetPagination.page_size, help="Rows per page")
+        parser.add_argument('--repeat', type=int, default=20, help="Requests per depth and mode, the median is reported")
+        parser.add_argument('--user', type=int, help="Id of the user listing (defaults to the first user)")
+        parser.add_argument('--seed', type=int, help="Create benchmark users until the table holds this many, for development databases")
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.stdout.write(f"Created {seed_users(options['seed'])} users")
+        user = User.objects.filter(pk=options['user']).first() if options['user'] else User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError("There are no users to list with.")
+
+        page_size = options['page_size']
+        depths = [depth for depth in options['depths'] if depth >= 1]
+        ids = list(User.objects.order_by('id').values_list('id', flat=True)[:max(depths) * page_size])
+        view = UsersAPIView.as_view()
+
+        def get(params):
+            response = get_view(view, '/api/v1/users', {'page_size': page_size, **params}, user)
+            if response.status_code != 200:
+                raise CommandError(f"GET /api/v1/users with {params} answered {response.status_code}")
+
+        modes = [
+            ('page', lambda depth: {'page': depth}),
+            ('page count=false', lambda depth: {'page': depth, 'count': 'false'}),
+            ('cursor count=false', lambda depth: self.cursor_params(ids, depth, page_size)),
+        ]
+        self.stdout.write(f"{'depth':>8} " + ' '.join(f"{name + ' ms':>20}" for name, _ in modes))
+        for depth in depths:
+            if (depth - 1) * page_size >= len(ids):
+                self.stdout.write(f"{depth:>8} past the last of {len(ids)} users")
+                continue
+            medians = []
+            for _, params in modes:
+                get(params(depth))
+                medians.append(statistics.median(timed(lambda: get(params(depth)), options['repeat'])) * 1000)
+            self.stdout.write(f"{depth:>8} " + ' '.join(f"{median:>20.2f}" for median in medians))
+
+    def cursor_params(self, ids, depth, page_size):
+        # The cursor a client reaches by following next links down to this page
+        params = {'pagination': 'cursor', 'count': 'false'}
+        if depth > 1:
+            params['cursor'] = KeysetPagination(UsersAPIView.keyset_ordering).encode_cursor([ids[(depth - 1) * page_size - 1]])
+        return params
@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from core.benchmark import get_view, percentiles, seed_users, timed
+from users.search import plan_search
+from users.views import UserSearchAPIView
+
+User = get_user_model()
+
+# One query per search path: exact email, short and long prefixes, a
+# substring only trigrams can find, a full name and a miss
+QUERIES = ['seed500@example.com', 'ma', 'mari', 'arci', 'Maria Garcia', 'zzqxv']
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the latency percentiles of UserSearchAPIView for each search path; seed a development "
+        "database with --seed 1000000 to check that p95 stays under --target-p95"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', nargs='+', default=QUERIES, help="Search queries to measure")
+        parser.add_argument('--repeat', type=int, default=100, help="Requests per query")
+        parser.add_argument('--user', type=int, help="Id of the user searching (defaults to the first user)")
+        parser.add_argument('--seed', type=int, help="Create users until the table holds this many, for development databases")
+        parser.add_argument('--target-p95', type=float, default=20, help="p95 in milliseconds every query should stay under")
+        parser.add_argument('--check', action='store_true', help="Fail if a query misses the p95 target")
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.stdout.write(f"Created {seed_users(options['seed'])} users")
+        user = User.objects.filter(pk=options['user']).first() if options['user'] else User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError("There are no users to search with.")
+
+        view = UserSearchAPIView.as_view()
+
+        def search(search_query):
+            response = get_view(view, '/api/v1/users/search', {'q': search_query}, user)
+            if response.status_code != 200:
+                raise CommandError(f"Searching {search_query!r} answered {response.status_code}")
+
+        self.stdout.write(f"Searching {User.objects.count()} users")
+        self.stdout.write(f"{'query':<24} {'plan':<9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        missed = []
+        for search_query in options['queries']:
+            search(search_query)
+            cuts = percentiles(timed(lambda: search(search_query), options['repeat']))
+            self.stdout.write(f"{search_query:<24} {plan_search(search_query):<9} {cuts['p50']:>9.2f} {cuts['p95']:>9.2f} {cuts['p99']:>9.2f}")
+            if cuts['p95'] > options['target_p95']:
+                missed.append(f"{search_query!r} p95 is {cuts['p95']:.2f} ms")
+
+        if missed:
+            message = f"Over the {options['target_p95']:g} ms p95 target: " + ', '.join(missed)
+            if options['check']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:12
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('friends', '0001_initial'),
+        ('users', '0002_appuser_blocked_appuser_friends'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='appuser',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('first_name', 'last_name', config='simple'), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='appuser',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='users_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appuser',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['first_name'], name='users_first_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='appuser',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['last_name'], name='users_last_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='appuser',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['email'], name='users_email_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0004_mutual_friend_counts'),
+        ('users', '0003_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appuser',
+            name='blocked_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='appuser',
+            name='friend_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='appuser',
+            name='pending_incoming_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE users_appuser u SET
+                    friend_count = (SELECT COUNT(*) FROM friends_friendship f WHERE f.user_id = u.id),
+                    pending_incoming_count = (SELECT COUNT(*) FROM friends_friendrequest r WHERE r.receiver_id = u.id AND r.status = 'PENDING'),
+                    blocked_count = (SELECT COUNT(*) FROM friends_blockeduser b WHERE b.user_id = u.id)
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
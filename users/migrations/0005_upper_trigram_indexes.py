@@ -0,0 +1,39 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:06
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_activity_counters'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='appuser',
+            name='users_first_name_trgm_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='appuser',
+            name='users_last_name_trgm_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='appuser',
+            name='users_email_trgm_idx',
+        ),
+        migrations.AddIndex(
+            model_name='appuser',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('first_name'), name='gin_trgm_ops'), name='users_first_name_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appuser',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('last_name'), name='gin_trgm_ops'), name='users_last_name_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appuser',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('email'), name='gin_trgm_ops'), name='users_email_trgm_idx'),
+        ),
+    ]
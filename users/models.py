@@ -1,8 +1,12 @@
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from friends.counters import COUNTER_FIELDS
 from friends.models  import Friendship, BlockedUser
 
 from users.managers import AppUserManager
@@ -12,24 +16,61 @@ class AppUser(AbstractBaseUser, PermissionsMixin):
     first_name = models.CharField(max_length=255)
     last_name = models.CharField(max_length=255)
 
-    friends = models.ManyToManyField('self', through=Friendship, symmetrical=False)
+    friends = models.ManyToManyField('self', through=Friendship, symmetrical=True)
     blocked = models.ManyToManyField('self', through=BlockedUser, symmetrical=False, related_name='blocked_by')
 
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     date_joined = models.DateTimeField(default=timezone.now)
 
+    # Maintained with F() updates next to the rows they count (friends.counters),
+    # reconciled by the reconcile_counters command
+    friend_count = models.PositiveIntegerField(default=0)
+    pending_incoming_count = models.PositiveIntegerField(default=0)
+    blocked_count = models.PositiveIntegerField(default=0)
+
+    # Maintained by Postgres so search never builds a tsvector per row
+    search_vector = models.GeneratedField(
+        expression=SearchVector('first_name', 'last_name', config='simple'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
 
     objects = AppUserManager()
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='users_search_vector_idx'),
+            # icontains compiles to UPPER(column) LIKE UPPER(pattern), so the
+            # trigram indexes are built on the same expression
+            GinIndex(OpClass(Upper('first_name'), name='gin_trgm_ops'), name='users_first_name_trgm_idx'),
+            GinIndex(OpClass(Upper('last_name'), name='gin_trgm_ops'), name='users_last_name_trgm_idx'),
+            GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='users_email_trgm_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         # Normalize email by stripping spaces and converting to lowercase
         if self.email:
             self.email = self.email.strip().lower()
+        if kwargs.get('update_fields') is None and not self._state.adding:
+            # A full save would write back the counters as they were when the user was loaded
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and not field.generated
+                and field.attname not in COUNTER_FIELDS and field.attname not in deferred
+            ]
         super().save(*args, **kwargs)
 
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Users built from token claims load all their deferred fields at once
+        if fields is not None and getattr(self, 'hydrate_on_access', False):
+            fields = self.get_deferred_fields() | set(fields)
+        super().refresh_from_db(using, fields, from_queryset)
+
     def __str__(self):
         return self.email
 
@@ -0,0 +1,59 @@
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+
+# Trigram GIN indexes can't serve patterns shorter than a trigram
+MIN_TRIGRAM_LENGTH = 3
+
+EMAIL_PATTERN = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def plan_search(search_query: str) -> str:
+    """
+    Picks the cheapest index-backed path able to answer a user search.
+
+    Args:
+        search_query (str): Raw query string sent by the client.
+
+    Returns:
+        str: ``email`` for a complete email address (unique btree lookup),
+        ``prefix`` for a single word (tsvector prefix and trigram lookups)
+        and ``fulltext`` for anything else (tsvector and trigram lookups).
+    """
+    if EMAIL_PATTERN.fullmatch(search_query):
+        return 'email'
+    if len(search_query.split()) == 1:
+        return 'prefix'
+    return 'fulltext'
+
+
+def build_search_query(search_query: str, plan: str) -> SearchQuery:
+    tokens = TOKEN_PATTERN.findall(search_query)
+    if plan == 'prefix' and tokens:
+        # Matches any word of the name starting with the token, e.g. "jo" -> "John"
+        return SearchQuery(' & '.join(f'{token}:*' for token in tokens), search_type='raw', config='simple')
+    return SearchQuery(search_query, search_type='websearch', config='simple')
+
+
+def search_users(queryset, search_query: str, plan: str):
+    """
+    Filters and ranks ``queryset`` for a name or email search.
+
+    Word matches use the GIN index on the stored ``search_vector``. Queries
+    of at least ``MIN_TRIGRAM_LENGTH`` characters also match substrings,
+    which ``icontains`` compiles to ``UPPER(column) LIKE UPPER(pattern)``,
+    served by the ``pg_trgm`` indexes built on that same expression.
+    """
+    query = build_search_query(search_query, plan)
+
+    predicate = Q(search_vector=query)
+    if len(search_query) >= MIN_TRIGRAM_LENGTH:
+        predicate |= Q(email__icontains=search_query)
+        if plan != 'email':
+            predicate |= Q(first_name__icontains=search_query) | Q(last_name__icontains=search_query)
+
+    # ts_rank returns a real, whose text form does not survive the round trip
+    # through a keyset cursor; a double does, so ties on rank compare equal
+    return queryset.filter(predicate).annotate(rank=Cast(SearchRank(F('search_vector'), query), FloatField()))
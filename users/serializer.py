@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from users import hashing
+from utils.serializers import ValuesSerializer
 
 
 # Get the user model
@@ -21,7 +23,7 @@ class RegisterSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         user = User(**validated_data)
-        user.set_password(validated_data['password'])
+        user.password = hashing.pool.make_password(validated_data['password'])
         user.save()
         return user
 
@@ -40,3 +42,12 @@ class AppUserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'email', 'first_name', 'last_name', 'is_active', 'date_joined']
         read_only_fields = ['id', 'date_joined']
+
+class CurrentUserSerializer(AppUserSerializer):
+    class Meta(AppUserSerializer.Meta):
+        # The counters are only shown to the user they belong to
+        fields = AppUserSerializer.Meta.fields + ['friend_count', 'pending_incoming_count', 'blocked_count']
+        read_only_fields = AppUserSerializer.Meta.read_only_fields + ['friend_count', 'pending_incoming_count', 'blocked_count']
+
+# Read-only fast path of the user list endpoints, fed with .values() rows
+user_values = ValuesSerializer(AppUserSerializer)
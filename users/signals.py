@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_delete
+from django.dispatch import receiver
+from users.authentication import revocations
+from users.tokens import CLAIM_FIELDS
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def revoke_stale_claims(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Tokens carry CLAIM_FIELDS, so changing one of them revokes the user's tokens
+    if raw or instance._state.adding:
+        return
+    fields = [field for field in CLAIM_FIELDS if field not in instance.get_deferred_fields()]
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields]
+    if not fields:
+        return
+    stored = sender.objects.filter(pk=instance.pk).values(*fields).first()
+    if stored and any(stored[field] != getattr(instance, field) for field in fields):
+        transaction.on_commit(lambda: revocations.revoke(instance.pk))
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def revoke_deleted_user(sender, instance, **kwargs):
+    transaction.on_commit(lambda: revocations.revoke(instance.pk))
@@ -1,3 +1,160 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+from friends.models import BlockedUser
+from users import authentication, tokens
+from users.authentication import ClaimsJWTAuthentication, revocations
+from users.models import AppUser
+from users.search import plan_search, search_users
+from users.tokens import refresh_token_for
+from utils.pagination import KeysetPagination
+from utils.testing import assert_query_budget
+
+
+FIRST_NAMES = ['Alice', 'Bruno', 'Carla', 'Dmitri', 'Emma', 'Felix', 'Grace', 'Hugo', 'Irene', 'Jonas']
+LAST_NAMES = ['Smith', 'Novak', 'Berg', 'Costa', 'Dubois', 'Evans', 'Fischer', 'Garcia', 'Horvat', 'Ivanov']
+
+
+class SearchPlanTests(TestCase):
+    """Checks with EXPLAIN, under default planner settings, that searches are served by their indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Names repeat like real ones do, so ANALYZE gathers statistics about them
+        AppUser.objects.bulk_create(
+            AppUser(
+                email=f'member{index}@example.com',
+                first_name=f'{FIRST_NAMES[index % 10]}{index % 97}',
+                last_name=LAST_NAMES[index // 10 % 10],
+            )
+            for index in range(20000)
+        )
+        AppUser.objects.create(email='zelda@example.com', first_name='Zelda', last_name='Hyrule')
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE users_appuser")
+
+    def explain(self, search_query: str) -> str:
+        return search_users(AppUser.objects.all(), search_query, plan_search(search_query)).explain()
+
+    def test_substring_search_uses_trigram_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            if cursor.fetchone() is None:
+                self.skipTest("pg_trgm is not installed")
+        plan = self.explain('zelda')
+        self.assertNotIn('Seq Scan', plan)
+        for index in ('users_search_vector_idx', 'users_first_name_trgm_idx', 'users_last_name_trgm_idx', 'users_email_trgm_idx'):
+            self.assertIn(index, plan)
+
+    def test_short_search_uses_search_vector_index(self):
+        plan = self.explain('ze')
+        self.assertNotIn('Seq Scan', plan)
+        self.assertIn('users_search_vector_idx', plan)
+
+
+class QueryBudgetTests(TestCase):
+    """Queries per request of the users endpoints, with warm caches, which must not grow with the rows listed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, *others = [
+            AppUser.objects.create_user(f'user{index}@example.com', None, first_name=f'First{index}', last_name=f'Last{index}')
+            for index in range(40)
+        ]
+        for other in others[:10]:
+            BlockedUser.objects.block(other.id, cls.user.id)
+        cls.other_id = others[-1].id
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertBudget(self, budget, name, data=None, **kwargs):
+        path = reverse(name, kwargs=kwargs)
+        # The first request fills the caches the budgets assume
+        self.client.get(path, data)
+        response = assert_query_budget(self.client, 'get', path, budget, data=data)
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_user_list(self):
+        self.assertBudget(2, 'user-list')
+        self.assertBudget(2, 'user-list', {'page': 2, 'page_size': 5})
+        self.assertBudget(2, 'user-list', {'pagination': 'cursor', 'page_size': 5})
+
+    def test_user_detail(self):
+        self.assertBudget(1, 'user-detail', pk=self.other_id)
+        self.assertBudget(0, 'current-user')
+
+    def test_search(self):
+        for search_query in ('fi', 'first', 'First1 Last1', 'user5@example.com'):
+            with self.subTest(search_query):
+                self.assertBudget(2, 'user_search', {'q': search_query})
+        self.assertBudget(2, 'user_search', {'q': 'first', 'pagination': 'cursor', 'page_size': 5})
+
+
+def cursor(position) -> str:
+    return KeysetPagination(()).encode_cursor(position)
+
+
+class KeysetCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AppUser.objects.create_user('cursor@example.com', None, first_name='Cursor')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cursor_of_the_wrong_types_is_not_found(self):
+        for name, data in [
+            ('user-list', {'cursor': cursor([{}])}),
+            ('user-list', {'cursor': cursor(['x'])}),
+            ('user-list', {'cursor': cursor([None])}),
+            ('user_search', {'q': 'cursor', 'cursor': cursor(['x', {}])}),
+            ('user_search', {'q': 'cursor', 'cursor': cursor([[1], 1])}),
+        ]:
+            with self.subTest(name=name, cursor=data['cursor']):
+                self.assertEqual(self.client.get(reverse(name), data).status_code, 404)
+
+    def test_cursor_of_the_right_types_pages(self):
+        response = self.client.get(reverse('user-list'), {'cursor': cursor([0])})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.user.id])
+
+
+class TokenRevocationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AppUser.objects.create_user('revoked@example.com', None)
+
+    def setUp(self):
+        cache.clear()
+        revocations.entries.clear()
+        self.authenticator = ClaimsJWTAuthentication()
+
+    def token_at(self, issued_at: float):
+        with mock.patch.object(tokens, 'time', mock.Mock(time=mock.Mock(return_value=issued_at))):
+            return refresh_token_for(self.user).access_token
+
+    def revoke_at(self, revoked_at: float):
+        # Only the clock of the revocation, the cache expires entries by the real one
+        with mock.patch.object(authentication, 'time', mock.Mock(time=mock.Mock(return_value=revoked_at))):
+            revocations.revoke(self.user.pk)
+
+    def test_token_issued_before_the_revocation_is_rejected(self):
+        token = self.token_at(1000.25)
+        self.revoke_at(1000.5)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticator.get_user(token)
 
-# Create your tests here.
+    def test_token_issued_after_the_revocation_within_the_same_second_is_accepted(self):
+        self.revoke_at(1000.25)
+        token = self.token_at(1000.5)
+        self.assertEqual(self.authenticator.get_user(token).pk, self.user.pk)
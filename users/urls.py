@@ -1,6 +1,13 @@
+from django.conf import settings
 from django.urls import path
 from .views import RegisterAPIView, LoginAPIView, UserSearchAPIView, UsersAPIView, CurrentUserAPIView
 
+if settings.ASYNC_VIEWS:
+    from .async_views import (
+        AsyncCurrentUserAPIView as CurrentUserAPIView,
+        AsyncUserSearchAPIView as UserSearchAPIView
+    )
+
 urlpatterns = [
     path('register', RegisterAPIView.as_view(), name='register'),
     path('login', LoginAPIView.as_view(), name='login'),
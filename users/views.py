@@ -1,18 +1,17 @@
 import logging
 from django.contrib.auth import get_user_model
-from django.contrib.postgres.search import SearchRank, SearchQuery, SearchVector
-from django.db.models import Q, Exists, OuterRef
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated, BasePermission
 from rest_framework.exceptions import NotFound
-from rest_framework.pagination import PageNumberPagination
-from rest_framework_simplejwt.tokens import RefreshToken
 
-from friends.models import BlockedUser
-from users.serializer import RegisterSerializer, LoginSerializer, AppUserSerializer
+from friends import blocks
+from users import hashing, search
+from users.serializer import RegisterSerializer, LoginSerializer, AppUserSerializer, CurrentUserSerializer, user_values
+from users.tokens import refresh_token_for
+from utils.pagination import KeysetPaginationMixin
 
 logger = logging.getLogger()
 User = get_user_model()
@@ -25,12 +24,12 @@ class RegisterAPIView(APIView):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
+            logger.info("User %s registered successfully", user)
             return Response({
                 'email': user.email, 
                 'first_name': user.first_name, 
                 'last_name': user.last_name
             }, status=status.HTTP_201_CREATED)
-        logger.info(f"User {user} registered succefully")
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -45,17 +44,17 @@ class LoginAPIView(APIView):
             password = serializer.validated_data['password']
             user = User.objects.filter(email=email).first()
             
-            if user and user.check_password(password):
+            if hashing.pool.check_password(user, password):
                 # Update last_login
                 user.last_login = timezone.now()
                 user.save(update_fields=['last_login'])
 
-                refresh = RefreshToken.for_user(user)
+                refresh = refresh_token_for(user)
                 return Response({
                     'access': str(refresh.access_token),
                     'refresh': str(refresh),
                 })
-            logger.info(f"Invalid login attempt for {user}")
+            logger.info("Invalid login attempt for %s", email)
             return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -68,13 +67,8 @@ class IsStaffUser(BasePermission):
     def has_permission(self, request, view):
         return request.user and request.user.is_staff
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
-class UsersAPIView(APIView):
-    pagination_class = StandardResultsSetPagination
+class UsersAPIView(KeysetPaginationMixin, APIView):
+    keyset_ordering = ('id',)
 
     def get_permissions(self):
         if self.request.method in ['GET']:
@@ -94,21 +88,19 @@ class UsersAPIView(APIView):
             except User.DoesNotExist:
                 raise NotFound(detail="User not found")
         else:
-            # If the user is not staff or admin, exclude blocked users
-            users = User.objects.all()
+            # If the user is not staff or admin, hide the users who blocked them
+            users = User.objects.order_by('id')
+            hidden = None
             if not request.user.is_staff and not request.user.is_superuser:
-                blocked_by_users = BlockedUser.objects.filter(blocked_user=request.user).values_list('user', flat=True)
-                users = users.exclude(id__in=blocked_by_users)
+                hidden = blocks.blocked_by(request.user.id)
 
-            paginator = self.pagination_class()
-            page = paginator.paginate_queryset(users, request)
+            paginator = self.get_paginator()
+            page = paginator.paginate_queryset(user_values.values(users), request, hidden=hidden)
             
             if page is not None:
-                serializer = AppUserSerializer(page, many=True)
-                return paginator.get_paginated_response(serializer.data)
+                return paginator.get_paginated_response(user_values.many(page))
         
-        serializer = AppUserSerializer(users, many=True)
-        return Response(serializer.data)
+        return Response(user_values.many(user_values.values(users.exclude(id__in=hidden or ()))))
 
     def post(self, request):
         serializer = AppUserSerializer(data=request.data)
@@ -154,13 +146,13 @@ class CurrentUserAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        serializer = AppUserSerializer(request.user)
+        serializer = CurrentUserSerializer(request.user)
         return Response(serializer.data)
 
 
-class UserSearchAPIView(APIView):
+class UserSearchAPIView(KeysetPaginationMixin, APIView):
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    keyset_ordering = ('-rank', 'id')
 
     def get(self, request):
         search_query = request.query_params.get('q', '')
@@ -168,43 +160,20 @@ class UserSearchAPIView(APIView):
         if not search_query:
             return Response({"error": "Please provide a search query."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Subquery to check if the logged-in user is blocked
-        blocked_subquery = BlockedUser.objects.filter(
-            user=OuterRef('pk'),
-            blocked_user=request.user
-        )
-
-        # Check for exact email match first
-        exact_email_match = User.objects.annotate(
-            is_blocked=Exists(blocked_subquery)
-        ).filter(
-            email__iexact=search_query,
-            is_blocked=False
-        ).first()
-
-        if exact_email_match:
-            serializer = AppUserSerializer(exact_email_match)
-            return Response(serializer.data)
+        hidden = blocks.blocked_by(request.user.id)
+        plan = search.plan_search(search_query)
 
-        # Perform full-text search on name fields
-        vector = SearchVector('first_name', 'last_name')
-        query = SearchQuery(search_query)
-        
-        users = User.objects.annotate(
-            search=vector,
-            rank=SearchRank(vector, query),
-            is_blocked=Exists(blocked_subquery)
-        ).filter(
-            (Q(search=query) | 
-            Q(email__icontains=search_query) |
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query)) &
-            Q(is_blocked=False)
-        ).order_by('-rank')
+        # A complete email address is answered by the unique email index
+        if plan == 'email':
+            exact_email_match = User.objects.filter(email=search_query.strip().lower()).first()
+            if exact_email_match and exact_email_match.id not in hidden:
+                serializer = AppUserSerializer(exact_email_match)
+                return Response(serializer.data)
+
+        users = search.search_users(User.objects.all(), search_query, plan).order_by('-rank', 'id')
 
         # Pagination
-        paginator = self.pagination_class()
-        paginated_users = paginator.paginate_queryset(users, request)
+        paginator = self.get_paginator()
+        paginated_users = paginator.paginate_queryset(user_values.values(users, 'rank'), request, hidden=hidden)
         
-        serializer = AppUserSerializer(paginated_users, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        return paginator.get_paginated_response(user_values.many(paginated_users))
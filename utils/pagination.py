@@ -0,0 +1,270 @@
+import base64, json
+from datetime import datetime
+from functools import reduce
+from operator import and_, or_
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def wants_count(request) -> bool:
+    return request.query_params.get('count', 'true').lower() != 'false'
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    known_count = None
+
+    def paginate_queryset(self, queryset, request, view=None, count=None, hidden=None):
+        """
+        Paginates ``queryset``, counting it unless ``count=false``.
+
+        ``count`` is an optional callable returning the total, such as a
+        maintained counter, used instead of a ``COUNT`` query. ``hidden``
+        holds primary keys left out of the pages; pages are offsets, so
+        they are excluded in SQL.
+        """
+        if hidden:
+            queryset = queryset.exclude(pk__in=hidden)
+        self.include_count = wants_count(request)
+        if self.include_count:
+            self.known_count = count
+            return super().paginate_queryset(queryset, request, view)
+
+        # Without a total we only need to know whether one more row exists
+        self.count = None
+        page_size, offset = self.get_page_bounds(request)
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+    async def apaginate_queryset(self, queryset, request, view=None, count=None, hidden=None):
+        """Async variant for ASGI views, ``count`` being a coroutine function if given."""
+        if hidden:
+            queryset = queryset.exclude(pk__in=hidden)
+        self.include_count = False
+        self.count = await (count or queryset.acount)() if wants_count(request) else None
+        page_size, offset = self.get_page_bounds(request)
+        rows = [row async for row in queryset[offset:offset + page_size + 1]]
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+    def django_paginator_class(self, object_list, per_page):
+        paginator = DjangoPaginator(object_list, per_page)
+        if self.known_count is not None:
+            # Paginator.count is a cached property, setting it skips the COUNT query
+            paginator.count = self.known_count()
+        return paginator
+
+    def get_page_bounds(self, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+            if self.page_number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message.format(page_number=request.query_params.get(self.page_query_param), message='Invalid page.'))
+        return page_size, (self.page_number - 1) * page_size
+
+    def get_paginated_response(self, data):
+        if self.include_count:
+            return super().get_paginated_response(data)
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        response = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return response
+
+    def get_next_link(self):
+        if self.include_count:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.include_count:
+            return super().get_previous_link()
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination over a stable, unique ordering.
+
+    Unlike DRF's ``CursorPagination`` the cursor stores the value of every
+    ordering field, so each page is a single indexed range scan regardless of
+    how deep the client has paged. The total is only counted when requested.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering):
+        self.ordering = tuple(ordering)
+
+    @classmethod
+    def requested(cls, request) -> bool:
+        params = request.query_params
+        return cls.cursor_query_param in params or params.get(cls.mode_query_param) == 'cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None, count=None, hidden=None):
+        """
+        Returns the page after the cursor of the request. Rows whose ``id``
+        is in ``hidden`` are dropped from the fetched rows, so the query
+        stays a plain range scan. Enough extra rows are fetched to make up
+        for up to ``max_page_size`` hidden ones, beyond that the page is
+        backfilled from the following rows.
+        """
+        if wants_count(request):
+            self.count = (count or (queryset.exclude(pk__in=hidden) if hidden else queryset).count)()
+        else:
+            self.count = None
+        queryset, page_size = self.get_page_queryset(queryset, request)
+        limit = self.fetch_limit(page_size, hidden)
+        rows = list(queryset[:limit])
+        page = self.visible(rows, hidden)
+        while len(rows) == limit and len(page) <= page_size:
+            rows = list(queryset.filter(self.after(self.position_of(rows[-1])))[:limit])
+            page += self.visible(rows, hidden)
+        return self.set_page(page, page_size)
+
+    async def apaginate_queryset(self, queryset, request, view=None, count=None, hidden=None):
+        """Async variant for ASGI views, ``count`` being a coroutine function if given."""
+        if wants_count(request):
+            self.count = await (count or (queryset.exclude(pk__in=hidden) if hidden else queryset).acount)()
+        else:
+            self.count = None
+        queryset, page_size = self.get_page_queryset(queryset, request)
+        limit = self.fetch_limit(page_size, hidden)
+        rows = [row async for row in queryset[:limit]]
+        page = self.visible(rows, hidden)
+        while len(rows) == limit and len(page) <= page_size:
+            rows = [row async for row in queryset.filter(self.after(self.position_of(rows[-1])))[:limit]]
+            page += self.visible(rows, hidden)
+        return self.set_page(page, page_size)
+
+    def fetch_limit(self, page_size: int, hidden) -> int:
+        # One row past the page tells whether there is a next one
+        return page_size + 1 + min(len(hidden or ()), self.max_page_size)
+
+    def visible(self, rows: list, hidden) -> list:
+        if not hidden:
+            return rows
+        return [row for row in rows if (row['id'] if isinstance(row, dict) else row.pk) not in hidden]
+
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            try:
+                # Lookups prepare their values here, rejecting ones of the wrong type for their column
+                queryset = queryset.filter(self.after(position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        return queryset, self.get_page_size(request)
+
+    def set_page(self, rows, page_size):
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def after(self, position) -> Q:
+        # (a, b, c) > (x, y, z) expanded so that every field can have its own direction
+        clauses = []
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = [Q(**{other.lstrip('-'): value}) for other, value in zip(self.ordering[:index], position)]
+            clauses.append(reduce(and_, equal + [Q(**{f'{name}__{lookup}': position[index]})]))
+        return reduce(or_, clauses)
+
+    def position_of(self, row) -> list:
+        position = []
+        for field in self.ordering:
+            if isinstance(row, dict):
+                # Rows of .values() hold lookups such as friend__first_name as keys
+                value = row[field.lstrip('-')]
+            else:
+                value = row
+                for attr in field.lstrip('-').split('__'):
+                    value = getattr(value, attr)
+            position.append(value.isoformat() if isinstance(value, datetime) else value)
+        return position
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, position) -> str:
+        return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        cursor = self.encode_cursor(self.position_of(self.page[-1]))
+        url = replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+        return remove_query_param(url, self.mode_query_param)
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        response = {'next': self.get_next_link(), 'previous': None, 'results': data}
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return response
+
+
+class KeysetPaginationMixin:
+    """
+    Lets a list view opt into keyset pagination with ``?pagination=cursor``.
+
+    Views declare ``keyset_ordering`` as a unique ordering backed by an index.
+    """
+    pagination_class = StandardResultsSetPagination
+    keyset_ordering = ('id',)
+
+    def get_paginator(self, ordering=None):
+        if KeysetPagination.requested(self.request):
+            return KeysetPagination(ordering or self.keyset_ordering)
+        return self.pagination_class()
@@ -0,0 +1,43 @@
+from contextlib import contextmanager
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block of code issues more SQL queries than its budget."""
+    def __init__(self, budget: int, queries: list):
+        self.budget = budget
+        self.queries = queries
+        listing = '\n'.join(f"{index}. {query['sql']}" for index, query in enumerate(queries, start=1))
+        super().__init__(f"{len(queries)} queries issued, budget is {budget}:\n{listing}")
+
+@contextmanager
+def query_budget(budget: int, using: str = 'default'):
+    """
+    Fails when the wrapped block issues more than ``budget`` queries, listing
+    them so an N+1 regression is easy to spot.
+
+    Args:
+        budget (int): Maximum number of queries allowed.
+        using (str): Database alias to watch.
+
+    Yields:
+        CaptureQueriesContext: The captured queries, for further assertions.
+
+    Raises:
+        QueryBudgetExceeded: If the block issued more queries than allowed.
+    """
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    if len(context) > budget:
+        raise QueryBudgetExceeded(budget, context.captured_queries)
+
+def assert_query_budget(client, method: str, path: str, budget: int, **kwargs):
+    """
+    Requests ``path`` with the test ``client`` and checks the queries the
+    endpoint issued against ``budget``.
+
+    Returns:
+        HttpResponse: The response, for further assertions.
+    """
+    with query_budget(budget):
+        return getattr(client, method.lower())(path, **kwargs)